@@ -0,0 +1,59 @@
+"""
+原子写文件：先在目标所在目录写临时文件，再用 os.replace 替换目标，失败时目标保持不变
+
+tempfile.mkstemp 创建的文件权限固定为 0600，直接替换会让部署的码表对 Rime 和其他用户不可读，
+因此临时文件创建后即设为被替换文件的权限；目标还不存在时按 umask 取新文件的默认权限。
+"""
+import contextlib
+import os
+import stat
+import tempfile
+from typing import Iterator, Optional, TextIO, Tuple
+
+
+def _default_file_mode() -> int:
+    """open() 新建文件时的权限：0666 去掉 umask"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def copy_target_mode(target_file: str, temp_path: str) -> None:
+    """把目标文件的权限设置到临时文件上，目标不存在时使用新文件的默认权限"""
+    try:
+        mode = stat.S_IMODE(os.stat(target_file).st_mode)
+    except FileNotFoundError:
+        mode = _default_file_mode()
+    os.chmod(temp_path, mode)
+
+
+def mkstemp_for(target_file: str) -> Tuple[int, str]:
+    """在目标所在目录创建权限与目标相同的临时文件，返回 (文件描述符, 路径)"""
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(target_file)}.", suffix=".tmp",
+        dir=os.path.dirname(os.path.abspath(target_file))
+    )
+    try:
+        copy_target_mode(target_file, temp_path)
+    except BaseException:
+        os.close(fd)
+        os.remove(temp_path)
+        raise
+    return fd, temp_path
+
+
+@contextlib.contextmanager
+def atomic_write(target_file: str, newline: Optional[str] = None) -> Iterator[TextIO]:
+    """
+    以 UTF-8 文本方式写入临时文件，with 块正常结束后原子替换目标文件；
+    块内抛出异常时删除临时文件，异常照常传出
+    """
+    fd, temp_path = mkstemp_for(target_file)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline=newline) as f:
+            yield f
+        os.replace(temp_path, target_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
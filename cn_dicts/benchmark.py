@@ -0,0 +1,297 @@
+"""
+词库工具基准测试：生成指定规模的合成词库，测量 replace_weight.py 与 wubi.encoded.py
+中主要函数的耗时，结果以 JSON 输出，便于在不同版本之间比较。
+
+用法:
+    python benchmark.py                                  # 默认规模 10k、100k
+    python benchmark.py --sizes 10000 1000000 10000000   # 最大可到千万行，注意内存占用
+    python benchmark.py --output new.json --compare old.json
+
+合成数据使用 86word-8105-better.txt 中的真实单字和编码：词组由 2-4 个单字随机组成，
+编码按规则一生成，权重为随机整数；除带 Rime 文件头的标准列序外，还生成两种
+没有文件头、列顺序打乱的文件，用于测量列类型检测。
+"""
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import replace_weight
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CHAR_CODES_FILE = os.path.join(SCRIPT_DIR, "86word-8105-better.txt")
+ENCODER_DICT_FILE = os.path.join(SCRIPT_DIR, "..", "wubi.dict.yaml")
+
+DEFAULT_SIZES = [10000, 100000]
+
+# 生成的列顺序：名称 -> (列的排列, 是否带 Rime 文件头)
+LAYOUTS = {
+    'rime': (('text', 'code', 'weight'), True),
+    'weight_first': (('weight', 'text', 'code'), False),
+    'code_first': (('code', 'weight', 'text'), False),
+}
+
+# 参与 generate_wubi_code 测量的规则（规则五为手动输入，不参与）
+ENCODE_RULES = (1, 2, 3, 4, 6)
+
+# --compare 时耗时增加超过这个比例视为性能回退
+REGRESSION_THRESHOLD = 1.2
+
+RIME_HEADER = """# Rime dictionary
+# encoding: utf-8
+---
+name: benchmark
+version: "1"
+sort: by_weight
+columns:
+  - text
+  - code
+  - weight
+...
+"""
+
+
+def load_wubi_encoded() -> Any:
+    """wubi.encoded.py 的文件名不是合法模块名，用 importlib 按路径加载"""
+    spec = importlib.util.spec_from_file_location("wubi_encoded", os.path.join(SCRIPT_DIR, "wubi.encoded.py"))
+    module = importlib.util.module_from_spec(spec)
+    # 先注册再执行，进程池中的函数才能按模块名序列化
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_phrases(chars: List[str], size: int, rng: random.Random) -> List[str]:
+    """生成 size 个互不相同的 2-4 字词组"""
+    phrases = set()
+    while len(phrases) < size:
+        phrases.add("".join(rng.choice(chars) for _ in range(rng.choice((2, 2, 2, 3, 4)))))
+    return sorted(phrases, key=lambda _: rng.random())
+
+
+def write_dict(path: str, rows: List[Tuple[str, str, int]], layout: str) -> None:
+    columns, with_header = LAYOUTS[layout]
+    with open(path, 'w', encoding='utf-8') as f:
+        if with_header:
+            f.write(RIME_HEADER)
+        for text, code, weight in rows:
+            cells = {'text': text, 'code': code, 'weight': str(weight)}
+            f.write("\t".join(cells[name] for name in columns) + "\n")
+
+
+def write_dataset(work_dir: str, size: int, wubi: Any, char_codes: Dict[str, str], seed: int) -> Dict[str, str]:
+    """生成一组规模为 size 的合成文件，返回各文件路径"""
+    rng = random.Random(seed)
+    chars = sorted(char for char in char_codes if len(char) == 1)
+    phrases = generate_phrases(chars, size, rng)
+    rows = [(phrase, wubi.generate_wubi_code(phrase, char_codes, 1), rng.randint(1, 1000)) for phrase in phrases]
+
+    files = {}
+    for layout in LAYOUTS:
+        files[layout] = os.path.join(work_dir, f"dict_{size}_{layout}.dict.yaml")
+        write_dict(files[layout], rows, layout)
+
+    # 基础文件：词组与权重，约十分之一的权重与词库不同
+    files['base'] = os.path.join(work_dir, f"phrase_weight_{size}.txt")
+    with open(files['base'], 'w', encoding='utf-8') as f:
+        for text, _, weight in rows:
+            f.write(f"{text}\t{weight + 1 if rng.random() < 0.1 else weight}\n")
+
+    # 批量编码的输入：一半已在词库中，一半为新词组
+    files['batch'] = os.path.join(work_dir, f"batch_{size}.txt")
+    existing = phrases[:size // 2]
+    with open(files['batch'], 'w', encoding='utf-8') as f:
+        f.writelines(f"{phrase}\n" for phrase in phrases)
+    files['existing'] = os.path.join(work_dir, f"existing_{size}.dict.yaml")
+    with open(files['existing'], 'w', encoding='utf-8') as f:
+        f.writelines(f"{phrase}\tx\t1\n" for phrase in existing)
+    return files
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测函数的输出"""
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(
+    func: Callable[[], Any],
+    repeat: int,
+    setup: Optional[Callable[[], None]] = None
+) -> List[float]:
+    """调用 func repeat 次，返回每次的耗时（秒），setup 不计入耗时"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with quiet():
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def make_result(name: str, size: int, timings: List[float], **extra: Any) -> Dict[str, Any]:
+    best = min(timings)
+    result = {
+        'name': name,
+        'size': size,
+        'seconds': [round(t, 6) for t in timings],
+        'min': round(best, 6),
+        'median': round(statistics.median(timings), 6),
+        'rows_per_sec': round(size / best) if best > 0 else None,
+    }
+    result.update(extra)
+    return result
+
+
+def run_size(size: int, wubi: Any, char_codes: Dict[str, str], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    results = []
+    work_dir = tempfile.mkdtemp(prefix=f"rime_bench_{size}_")
+    old_cwd = os.getcwd()
+    try:
+        print(f"正在生成 {size} 行的合成数据...", file=sys.stderr)
+        files = write_dataset(work_dir, size, wubi, char_codes, args.seed)
+        record_dir = os.path.join(work_dir, "records")
+
+        for layout in LAYOUTS:
+            timings = measure(lambda: replace_weight.load_file_with_column_detection(files[layout]), args.repeat)
+            results.append(make_result("load_file_with_column_detection", size, timings, layout=layout))
+
+        with quiet():
+            _, base_mapping = replace_weight.load_weight_mapping(files['base'])
+        target = os.path.join(work_dir, "target.dict.yaml")
+
+        timings = measure(
+            lambda: replace_weight.replace_weights_direction1(target, base_mapping, record_dir),
+            args.repeat, setup=lambda: shutil.copyfile(files['rime'], target)
+        )
+        results.append(make_result("replace_weights_direction1", size, timings))
+
+        base_copy = os.path.join(work_dir, "phrase_weight.txt")
+        timings = measure(
+            lambda: replace_weight.replace_weights_direction2(files['rime'], base_copy, record_dir),
+            args.repeat, setup=lambda: shutil.copyfile(files['base'], base_copy)
+        )
+        results.append(make_result("replace_weights_direction2", size, timings))
+
+        timings = measure(lambda: wubi.read_phrase_weights(files['base']), args.repeat)
+        results.append(make_result("read_phrase_weights", size, timings))
+
+        with quiet():
+            phrase_weights = wubi.read_phrase_weights(files['base'])
+        with open(files['batch'], 'r', encoding='utf-8') as f:
+            phrases = [line.rstrip('\n') for line in f]
+
+        for rule in ENCODE_RULES:
+            timings = measure(lambda: [wubi.generate_wubi_code(p, char_codes, rule) for p in phrases], args.repeat)
+            results.append(make_result("generate_wubi_code", size, timings, rule=rule))
+
+        # file_batch_mode 读写当前目录下的词库和失败文件，在独立目录中运行
+        batch_dir = os.path.join(work_dir, "batch")
+
+        def reset_batch_dir() -> None:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            os.makedirs(batch_dir)
+            shutil.copyfile(files['existing'], os.path.join(batch_dir, "wubi.user.dict.yaml"))
+            os.chdir(batch_dir)
+
+        timings = measure(
+            lambda: wubi.file_batch_mode(1, char_codes, phrase_weights, files['batch'], args.jobs),
+            args.repeat, setup=reset_batch_dir
+        )
+        results.append(make_result("file_batch_mode", size, timings, rule=1))
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def result_key(result: Dict[str, Any]) -> Tuple[Any, ...]:
+    return result['name'], result['size'], result.get('layout'), result.get('rule')
+
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any]) -> List[Tuple[Tuple[Any, ...], float, float]]:
+    """按最短耗时比较两次结果，返回耗时增加超过阈值的 (测试项, 旧耗时, 新耗时)"""
+    old_results = {result_key(result): result for result in old.get('results', [])}
+    regressions = []
+    for result in new['results']:
+        previous = old_results.get(result_key(result))
+        if previous and previous['min'] > 0 and result['min'] / previous['min'] > REGRESSION_THRESHOLD:
+            regressions.append((result_key(result), previous['min'], result['min']))
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="词库工具基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="合成词库的行数，可指定多个，默认为 10000 100000")
+    parser.add_argument('--repeat', type=int, default=3, help="每项测量的次数，默认3次")
+    parser.add_argument('--seed', type=int, default=0, help="生成合成数据的随机种子")
+    parser.add_argument('--jobs', type=int, default=None, help="file_batch_mode 的进程数，默认为CPU核数")
+    parser.add_argument('--output', metavar='FILE', help="把 JSON 结果写入该文件，默认输出到标准输出")
+    parser.add_argument('--compare', metavar='FILE',
+                        help="与之前的 JSON 结果比较，耗时增加超过20%%的测试项以非零状态退出")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+
+    wubi = load_wubi_encoded()
+    with quiet():
+        char_codes = wubi.read_single_char_codes(CHAR_CODES_FILE)
+    if not char_codes:
+        print(f"错误: 无法读取单字编码表 {CHAR_CODES_FILE}", file=sys.stderr)
+        sys.exit(2)
+    # 规则六的编码规则按相对路径读取，切换工作目录前先加载
+    wubi._dict_encoder_rules = wubi.load_dict_encoder_rules(ENCODER_DICT_FILE)
+
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(size, wubi, char_codes, args))
+
+    report = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"结果已保存到: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare_results(json.load(f), report)
+        for key, old_seconds, new_seconds in regressions:
+            label = " ".join(str(part) for part in key if part is not None)
+            print(f"性能回退: {label}: {old_seconds:.4f}s -> {new_seconds:.4f}s", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
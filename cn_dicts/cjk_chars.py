@@ -0,0 +1,75 @@
+"""
+汉字字符分类：覆盖全部 CJK 统一表意文字区块（基本区、扩展A至I）和兼容表意文字，
+供各脚本判断、提取汉字，取代只覆盖基本区的 [\\u4e00-\\u9fff]。
+
+分类用启动时生成的查找表：每个码位一个字节，判断一个字符只需一次下标访问。
+提取汉字用 str.translate 在 C 层逐字查表，每个字符的结果在第一次遇到时由查找表算出并缓存；
+需要按片段匹配时使用由同一张区间表生成的正则表达式。
+"""
+import re
+from typing import List, Optional, Tuple
+
+# 汉字码位区间（含两端），按码位排列
+HAN_RANGES: List[Tuple[int, int]] = [
+    (0x3007, 0x3007),    # 〇（通用规范汉字表收录）
+    (0x3400, 0x4DBF),    # 扩展A
+    (0x4E00, 0x9FFF),    # 基本区
+    (0xF900, 0xFAFF),    # 兼容表意文字
+    (0x20000, 0x2A6DF),  # 扩展B
+    (0x2A700, 0x2B73F),  # 扩展C
+    (0x2B740, 0x2B81F),  # 扩展D
+    (0x2B820, 0x2CEAF),  # 扩展E
+    (0x2CEB0, 0x2EBEF),  # 扩展F
+    (0x2EBF0, 0x2EE5F),  # 扩展I
+    (0x2F800, 0x2FA1F),  # 兼容表意文字补充
+    (0x30000, 0x3134F),  # 扩展G
+    (0x31350, 0x323AF),  # 扩展H
+]
+
+HAN_LIMIT = HAN_RANGES[-1][1] + 1
+
+
+def _build_table() -> bytes:
+    table = bytearray(HAN_LIMIT)
+    for start, end in HAN_RANGES:
+        table[start:end + 1] = b"\x01" * (end - start + 1)
+    return bytes(table)
+
+
+# 码位 -> 是否为汉字，超出 HAN_LIMIT 的码位都不是汉字
+HAN_TABLE = _build_table()
+
+HAN_CLASS = "".join(
+    f"\\U{start:08x}" if start == end else f"\\U{start:08x}-\\U{end:08x}" for start, end in HAN_RANGES
+)
+
+# 单个汉字和连续汉字片段
+HAN_PATTERN = re.compile(f"[{HAN_CLASS}]")
+HAN_RUN_PATTERN = re.compile(f"[{HAN_CLASS}]+")
+
+
+class _HanFilter(dict):
+    """str.translate 的映射表：汉字映射为自身，其他字符删除；按需从查找表填充"""
+
+    def __missing__(self, code: int) -> Optional[int]:
+        value = code if code < HAN_LIMIT and HAN_TABLE[code] else None
+        self[code] = value
+        return value
+
+
+_HAN_FILTER = _HanFilter()
+
+
+def is_han(char: str) -> bool:
+    code = ord(char)
+    return code < HAN_LIMIT and HAN_TABLE[code] == 1
+
+
+def extract_han(text: str) -> str:
+    """按原顺序取出文本中的全部汉字，忽略标点和其他字符"""
+    return text.translate(_HAN_FILTER)
+
+
+def has_han(text: str) -> bool:
+    """文本中是否含有汉字"""
+    return bool(text.translate(_HAN_FILTER))
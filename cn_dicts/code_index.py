@@ -0,0 +1,156 @@
+"""
+编码重码索引：把 wubi.dict.yaml 及其 import_tables 合并后建立 编码 -> 候选词 的倒排索引，
+用来查看每个编码上有多少候选、首选是否存在并列权重等重码情况。
+
+用法:
+    python code_index.py                   # 报告重码最多的编码、首选冲突和权重并列
+    python code_index.py --prefix aa       # 查看以 aa 开头的编码及其候选
+    python code_index.py --top 50 ../wubi.dict.yaml
+"""
+import argparse
+import bisect
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from rime_dict import RimeDict, load_dict
+
+DEFAULT_DICT_FILE = os.path.join("..", "wubi.dict.yaml")
+
+# 报告中每个编码最多显示的候选数
+REPORT_CANDIDATE_LIMIT = 10
+
+# 候选: (词组, 权重, 来源码表, 载入顺序)
+Candidate = Tuple[str, int, str, int]
+
+
+class CodeIndex:
+    """编码到候选词的倒排索引，候选按权重从高到低排列，权重相同时按载入顺序"""
+
+    def __init__(self) -> None:
+        self._index: Dict[str, List[Candidate]] = {}
+        self._sorted_codes: Optional[List[str]] = None
+        self._order = 0
+
+    def add(self, code: str, phrase: str, weight: int, source: str) -> None:
+        self._index.setdefault(code, []).append((phrase, weight, source, self._order))
+        self._order += 1
+        self._sorted_codes = None
+
+    def add_table(self, table: RimeDict) -> int:
+        """流式读取一个码表的全部词条，返回加入的词条数；权重为空或不是整数时按0处理"""
+        source = os.path.basename(table.path)
+        count = 0
+        for entry in table.iter_body():
+            if entry.text and entry.code:
+                self.add(entry.code, entry.text, entry.weight or 0, source)
+                count += 1
+        return count
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def candidates(self, code: str) -> List[Candidate]:
+        """某个编码上的候选，按 sort: by_weight 的顺序排列"""
+        return sorted(self._index.get(code, []), key=lambda c: (-c[1], c[3]))
+
+    def codes(self) -> List[str]:
+        if self._sorted_codes is None:
+            self._sorted_codes = sorted(self._index)
+        return self._sorted_codes
+
+    def codes_with_prefix(self, prefix: str) -> List[str]:
+        """二分查找以 prefix 开头的全部编码"""
+        codes = self.codes()
+        start = bisect.bisect_left(codes, prefix)
+        end = bisect.bisect_left(codes, prefix + "\U0010ffff")
+        return codes[start:end]
+
+    def items(self) -> Iterator[Tuple[str, List[Candidate]]]:
+        for code in self.codes():
+            yield code, self.candidates(code)
+
+
+def build_code_index(dict_file: str) -> CodeIndex:
+    """读取主词库及其（递归的）import_tables，建立合并后的倒排索引"""
+    index = CodeIndex()
+    for table in load_dict(dict_file).iter_tables():
+        for missing in table.missing_imports():
+            print(f"警告: 码表文件不存在，已跳过: {missing}", file=sys.stderr)
+        index.add_table(table)
+    return index
+
+
+def collision_report(index: CodeIndex) -> Dict[str, list]:
+    """
+    统计重码情况
+    heavy: 按候选数从多到少排列的 (编码, 候选数)
+    first_conflicts: 前两个候选权重相同、首选不确定的编码
+    ties: 首选以外存在权重相同候选的编码
+    """
+    heavy = []
+    first_conflicts = []
+    ties = []
+    for code, candidates in index.items():
+        if len(candidates) < 2:
+            continue
+        heavy.append((code, len(candidates)))
+        weights = [candidate[1] for candidate in candidates]
+        if weights[0] == weights[1]:
+            first_conflicts.append(code)
+        elif len(set(weights[1:])) < len(weights) - 1:
+            ties.append(code)
+
+    heavy.sort(key=lambda item: (-item[1], item[0]))
+    return {'heavy': heavy, 'first_conflicts': first_conflicts, 'ties': ties}
+
+
+def format_candidates(candidates: List[Candidate], limit: Optional[int] = None) -> str:
+    """格式化候选列表，limit 限制显示的候选数"""
+    shown = candidates if limit is None else candidates[:limit]
+    text = "  ".join(f"{i}.{phrase}({weight},{source})" for i, (phrase, weight, source, _) in
+                     enumerate(shown, 1))
+    if len(shown) < len(candidates):
+        text += f"  …共{len(candidates)}个"
+    return text
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="五笔词库重码索引")
+    parser.add_argument('dict_file', nargs='?', default=DEFAULT_DICT_FILE,
+                        help="主词库文件，默认为 ../wubi.dict.yaml")
+    parser.add_argument('--prefix', metavar='CODE', help="列出以该编码开头的全部编码及候选")
+    parser.add_argument('--top', type=int, default=20, help="报告中每类列出的编码数")
+    args = parser.parse_args(argv)
+
+    index = build_code_index(args.dict_file)
+
+    if args.prefix is not None:
+        codes = index.codes_with_prefix(args.prefix)
+        print(f"以 '{args.prefix}' 开头的编码共 {len(codes)} 个")
+        for code in codes:
+            print(f"{code}\t{format_candidates(index.candidates(code))}")
+        return
+
+    report = collision_report(index)
+    print("=" * 60)
+    print(f"编码总数: {len(index)}，有重码的编码: {len(report['heavy'])}")
+    print(f"首选冲突（前两个候选权重相同）: {len(report['first_conflicts'])} 个编码")
+    print(f"其他权重并列: {len(report['ties'])} 个编码")
+
+    print(f"\n## 候选最多的 {args.top} 个编码")
+    for code, count in report['heavy'][:args.top]:
+        print(f"{code}\t{count}\t{format_candidates(index.candidates(code), REPORT_CANDIDATE_LIMIT)}")
+
+    print(f"\n## 首选冲突（前 {args.top} 个）")
+    for code in report['first_conflicts'][:args.top]:
+        print(f"{code}\t{format_candidates(index.candidates(code), REPORT_CANDIDATE_LIMIT)}")
+
+    print(f"\n## 其他权重并列（前 {args.top} 个）")
+    for code in report['ties'][:args.top]:
+        print(f"{code}\t{format_candidates(index.candidates(code), REPORT_CANDIDATE_LIMIT)}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+紧凑的词组权重表：用连续缓冲区和 array 代替每行若干个 Python 对象
+
+WeightStore 是 {词组: 权重字符串} 的只读映射（get、in、len、items 与字典相同），
+由解析时临时构建的字典一次性打包而成，打包后不再为每行保留 str、int 和字典项对象：
+    词组     依次写入同一个字符串，每个词组后跟一个 \\0，另用 array('I') 记录起点
+    权重     规范的 32 位整数权重存入 array('i')；"0100"、"1.5" 之类无法按整数原样还原的
+             权重另存原字符串，保证写回码表时与原文件逐字节一致
+    行号     需要时存入 array('i')，代替单独的 词组 -> 行号 字典
+    索引     按哈希值排序的 array('Q') 和对应的条目号，再按哈希值的高位分桶记录各桶的起点，
+             查找时直接定位到桶，只在哈希相同时才比较词组
+词组全是基本多文种平面（BMP）的字符时，每行的开销约为词组字符数的两倍加 25 字节左右，
+而同样内容的字典每行需要两三百字节。只要有一个词组含扩展 B 及以后的汉字（如 wubi.word、41448 中的生僻字），
+拼接后的整个字符串就按每字 4 字节存放，所有词组的开销都变为字符数的四倍加 25 字节左右。
+"""
+import collections
+import itertools
+import sys
+from array import array
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from table_cache import CompiledTable
+
+_MISSING = -1
+_INT_MIN = -2 ** 31
+_INT_MAX = 2 ** 31 - 1
+
+# 把 hash() 的有符号结果平移为 64 位无符号数，高位即为桶号
+_HASH_OFFSET = 1 << 63
+
+
+def _canonical_int(weight: str) -> Optional[int]:
+    """权重是能原样还原的 32 位整数时返回其数值，否则返回 None"""
+    try:
+        value = int(weight)
+    except ValueError:
+        return None
+    if _INT_MIN <= value <= _INT_MAX and str(value) == weight:
+        return value
+    return None
+
+
+def _pack_weights(values: List[str]) -> Tuple[array, Dict[int, str]]:
+    """把权重字符串打包为 array('i')，不能原样还原的权重以 条目号 -> 原字符串 另存"""
+    try:
+        weights = array('i', map(int, values))
+        if list(map(str, weights)) == values:
+            return weights, {}
+    except (ValueError, OverflowError):
+        pass
+
+    # 存在非规范的权重时逐个处理
+    weights = array('i', bytes(4 * len(values)))
+    raw = {}
+    for entry, weight in enumerate(values):
+        value = _canonical_int(weight)
+        if value is None:
+            raw[entry] = weight
+        else:
+            weights[entry] = value
+    return weights, raw
+
+
+class WeightStore(Mapping[str, str]):
+    """词组 -> 权重字符串的紧凑只读映射，可选地同时记录每个词组所在的行号"""
+
+    __slots__ = ('_keys', '_key_offsets', '_hashes', '_order', '_buckets', '_shift', '_weights', '_raw', '_lines')
+
+    def __init__(self, mapping: Mapping[str, str] = {}, lines: Optional[Mapping[str, int]] = None) -> None:
+        keys = list(mapping)
+        self._pack(keys, list(mapping.values()), [lines[key] for key in keys] if lines is not None else None)
+
+    @classmethod
+    def from_columns(cls, keys: List[str], values: List[str]) -> 'WeightStore':
+        """由一一对应且词组不重复的两个列表直接打包，不经过中间字典"""
+        store = cls.__new__(cls)
+        store._pack(keys, values, None)
+        return store
+
+    def _pack(self, keys: List[str], values: List[str], lines: Optional[List[int]]) -> None:
+        self._keys = "\0".join(keys) + "\0" if keys else ""
+        self._key_offsets = array('I', itertools.accumulate((len(key) + 1 for key in keys), initial=0))
+        self._weights, self._raw = _pack_weights(values)
+        self._lines = array('i', lines) if lines is not None else None
+
+        # 条目保持原顺序，另按哈希值排序建立索引；桶数取条目数向上的 2 的幂，平均每桶不超过一个条目
+        hashes = [hash(key) + _HASH_OFFSET for key in keys]
+        order = sorted(range(len(keys)), key=hashes.__getitem__)
+        self._hashes = array('Q', [hashes[entry] for entry in order])
+        self._order = array('i', order)
+        bits = max(len(keys).bit_length(), 1)
+        self._shift = 64 - bits
+        counts = collections.Counter([key_hash >> self._shift for key_hash in hashes])
+        bucket_count = 1 << bits
+        self._buckets = array('i', itertools.accumulate(
+            map(counts.get, range(bucket_count), itertools.repeat(0, bucket_count)), initial=0
+        ))
+
+    @classmethod
+    def from_compiled(cls, table: CompiledTable) -> 'WeightStore':
+        """由编译表缓存构建，供 load_cached_table 的 convert 参数使用；编译表中的词组本就不重复"""
+        return cls.from_columns(*table.columns())
+
+    def _find(self, key: str) -> int:
+        """返回词组的条目号，不存在时返回 -1"""
+        hashes, offsets = self._hashes, self._key_offsets
+        key_hash = hash(key) + _HASH_OFFSET
+        bucket = key_hash >> self._shift
+        # 哈希相同时才比较词组本身：长度相同且缓冲区在起点处以该词组开头，不切片复制
+        for i in range(self._buckets[bucket], self._buckets[bucket + 1]):
+            if hashes[i] == key_hash:
+                entry = self._order[i]
+                start = offsets[entry]
+                if offsets[entry + 1] - start - 1 == len(key) and self._keys.startswith(key, start):
+                    return entry
+        return _MISSING
+
+    def _value(self, entry: int) -> str:
+        if self._raw and entry in self._raw:
+            return self._raw[entry]
+        return str(self._weights[entry])
+
+    def __getitem__(self, key: str) -> str:
+        entry = self._find(key)
+        if entry == _MISSING:
+            raise KeyError(key)
+        return self._value(entry)
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        # 同步时每个数据行都要查一次，这里展开 _find 和 _value 以减少调用开销
+        hashes, offsets = self._hashes, self._key_offsets
+        key_hash = hash(key) + _HASH_OFFSET
+        bucket = key_hash >> self._shift
+        for i in range(self._buckets[bucket], self._buckets[bucket + 1]):
+            if hashes[i] == key_hash:
+                entry = self._order[i]
+                start = offsets[entry]
+                if offsets[entry + 1] - start - 1 == len(key) and self._keys.startswith(key, start):
+                    if self._raw and entry in self._raw:
+                        return self._raw[entry]
+                    return str(self._weights[entry])
+        return default
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._find(key) != _MISSING
+
+    def int_weight(self, key: str) -> Optional[int]:
+        """词组权重的整数值，词组不存在或权重不是整数时返回 None"""
+        entry = self._find(key)
+        if entry == _MISSING:
+            return None
+        if entry in self._raw:
+            try:
+                return int(self._raw[entry])
+            except ValueError:
+                return None
+        return self._weights[entry]
+
+    @property
+    def tracks_lines(self) -> bool:
+        return self._lines is not None
+
+    def line_of(self, key: str) -> Optional[int]:
+        """词组所在的行号，未记录行号或词组不存在时返回 None"""
+        if self._lines is None:
+            return None
+        entry = self._find(key)
+        return None if entry == _MISSING else self._lines[entry]
+
+    def line_index(self) -> 'LineIndex':
+        """词组 -> 行号 的只读视图，与权重共用同一份词组和索引"""
+        return LineIndex(self)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __iter__(self) -> Iterator[str]:
+        if not self._hashes:
+            return iter(())
+        return iter(self._keys[:-1].split('\0'))
+
+    def items(self) -> Iterator[Tuple[str, str]]:  # type: ignore[override]
+        return zip(self, self.values())
+
+    def values(self) -> Iterator[str]:  # type: ignore[override]
+        if not self._raw:
+            return map(str, self._weights)
+        return (self._value(entry) for entry in range(len(self)))
+
+    def __sizeof__(self) -> int:
+        buffers = [self._keys, self._key_offsets, self._hashes, self._order, self._buckets, self._weights,
+                   self._raw]
+        if self._lines is not None:
+            buffers.append(self._lines)
+        size = object.__sizeof__(self) + sum(sys.getsizeof(buffer) for buffer in buffers)
+        return size + sum(sys.getsizeof(weight) for weight in self._raw.values())
+
+    def __reduce__(self):
+        # 字符串哈希在每个进程中不同，传给子进程时只传内容，由子进程重新打包
+        lines = dict(zip(self, self._lines)) if self._lines is not None else None
+        return WeightStore, (dict(self.items()), lines)
+
+    def __repr__(self) -> str:
+        return f"<WeightStore {len(self)} 个词组>"
+
+
+class LineIndex(Mapping[str, int]):
+    """WeightStore 中 词组 -> 行号 的只读视图，未记录行号时为空"""
+
+    __slots__ = ('_store',)
+
+    def __init__(self, store: WeightStore) -> None:
+        self._store = store
+
+    def __getitem__(self, key: str) -> int:
+        line_num = self._store.line_of(key)
+        if line_num is None:
+            raise KeyError(key)
+        return line_num
+
+    def __len__(self) -> int:
+        return len(self._store) if self._store.tracks_lines else 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store) if self._store.tracks_lines else iter(())
@@ -0,0 +1,270 @@
+"""
+语料词频统计：用合并后的码表（wubi.dict.yaml 及其 import_tables）中的全部词组建立多模式匹配
+自动机（Aho–Corasick），分块流式扫描纯文本语料，统计每个词组出现的次数，生成新的 phrase_weight.txt。
+
+语料按字节切成以换行结尾的块，多个进程并行扫描，每个块只在内存中保留一次，
+同时在处理的块数不超过进程数的两倍，因此语料大小只受磁盘读取速度限制。
+统计的是重叠出现次数：“中华人民”同时计入“中华”“华人”“人民”。
+
+用法:
+    python corpus_count.py corpus1.txt corpus2.txt                     # 输出 phrase_weight.txt
+    python corpus_count.py corpus.txt --dict ../wubi.dict.yaml ../rime_ice.dict.yaml --min-count 5
+    python corpus_count.py corpus.txt --output new_weight.txt --jobs 8 --profile
+"""
+import argparse
+import concurrent.futures
+import itertools
+import os
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from atomic_file import atomic_write
+from profiling import PROFILER
+from rime_dict import load_dict
+
+DEFAULT_DICT_FILE = os.path.join("..", "wubi.dict.yaml")
+DEFAULT_OUTPUT_FILE = "phrase_weight.txt"
+
+# 每个语料块的大小（字节），块在其后第一个换行处结束
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# 语料块: (文件路径, 起始字节, 结束字节)
+CorpusChunk = Tuple[str, int, int]
+
+
+class PhraseAutomaton:
+    """
+    Aho–Corasick 自动机：扫描时每个字符只在到达的状态上计数一次，
+    扫描结束后沿失败链把计数汇总到各词组的终止状态，得到每个词组的出现次数
+    """
+
+    def __init__(self, phrases: List[str]) -> None:
+        self.phrases = phrases
+        self.goto: List[Dict[str, int]] = [{}]
+        self.terminal: Dict[int, int] = {}  # 终止状态 -> 词组序号
+        for index, phrase in enumerate(phrases):
+            state = 0
+            for ch in phrase:
+                next_state = self.goto[state].get(ch)
+                if next_state is None:
+                    next_state = self.goto[state][ch] = len(self.goto)
+                    self.goto.append({})
+                state = next_state
+            self.terminal[state] = index
+
+        # 按广度优先顺序计算失败链，汇总计数时按相反顺序处理
+        self.fail = [0] * len(self.goto)
+        self.order: List[int] = []
+        queue = list(self.goto[0].values())
+        for state in queue:
+            self.order.append(state)
+            for ch, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                queue.append(child)
+
+    def __len__(self) -> int:
+        return len(self.goto)
+
+    def new_counts(self) -> array:
+        return array('q', bytes(8 * len(self.goto)))
+
+    def scan(self, text: str, visits: array) -> None:
+        """扫描一段文本，把经过的状态计入 visits；换行等不在任何词组中的字符会回到初始状态"""
+        goto = self.goto
+        fail = self.fail
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            visits[state] += 1
+
+    def phrase_counts(self, visits: array) -> List[int]:
+        """沿失败链汇总状态计数，返回与 phrases 对应的出现次数"""
+        totals = array('q', visits)
+        fail = self.fail
+        for state in reversed(self.order):
+            totals[fail[state]] += totals[state]
+        counts = [0] * len(self.phrases)
+        for state, index in self.terminal.items():
+            counts[index] = totals[state]
+        return counts
+
+
+def load_phrases(dict_files: List[str]) -> List[str]:
+    """按载入顺序收集各码表（含 import_tables）中不重复的词组"""
+    seen = set()
+    phrases = []
+    for dict_file in dict_files:
+        for table in load_dict(dict_file).iter_tables():
+            for missing in table.missing_imports():
+                print(f"警告: 码表文件不存在，已跳过: {missing}", file=sys.stderr)
+            for entry in table.iter_body():
+                if entry.text and entry.text not in seen:
+                    seen.add(entry.text)
+                    phrases.append(entry.text)
+    return phrases
+
+
+def plan_chunks(corpus_files: List[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[CorpusChunk]:
+    """把语料文件切成以换行结尾的块，块边界不会落在一行（因而也不会落在一个字符）中间"""
+    for file_path in corpus_files:
+        size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    f.seek(end)
+                    f.readline()
+                    end = f.tell()
+                yield file_path, start, end
+                start = end
+
+
+def read_chunk(chunk: CorpusChunk) -> str:
+    file_path, start, end = chunk
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # 文件开头可能带有 BOM；无法解码的字节替换掉，不影响其余文本的匹配
+    return data.decode('utf-8-sig' if start == 0 else 'utf-8', errors='replace')
+
+
+# 并行统计时各工作进程共享的自动机，由进程池初始化函数设置
+_worker_automaton: Optional[PhraseAutomaton] = None
+
+
+def _init_count_worker(automaton: PhraseAutomaton) -> None:
+    """工作进程初始化：每个进程只接收一次自动机"""
+    global _worker_automaton
+    _worker_automaton = automaton
+
+
+def _count_chunk_worker(chunk: CorpusChunk) -> Tuple[int, array]:
+    """在工作进程中扫描一个语料块，返回 (字节数, 状态计数)"""
+    visits = _worker_automaton.new_counts()
+    _worker_automaton.scan(read_chunk(chunk), visits)
+    return chunk[2] - chunk[1], visits
+
+
+def count_corpus(
+    automaton: PhraseAutomaton,
+    corpus_files: List[str],
+    jobs: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> List[int]:
+    """扫描全部语料，返回与 automaton.phrases 对应的出现次数"""
+    total_bytes = sum(os.path.getsize(file_path) for file_path in corpus_files)
+    visits = automaton.new_counts()
+    done_bytes = 0
+
+    def merge(result: Tuple[int, array]) -> None:
+        nonlocal visits, done_bytes
+        size, chunk_visits = result
+        visits = array('q', map(int.__add__, visits, chunk_visits))
+        done_bytes += size
+        print(f"\r已扫描 {done_bytes / 1048576:.1f} / {total_bytes / 1048576:.1f} MiB", end='', file=sys.stderr)
+
+    jobs = jobs or os.cpu_count() or 1
+    chunks = plan_chunks(corpus_files, chunk_size)
+    if jobs <= 1 or total_bytes <= chunk_size:
+        _init_count_worker(automaton)
+        for chunk in chunks:
+            merge(_count_chunk_worker(chunk))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_count_worker,
+            initargs=(automaton,)
+        ) as executor:
+            # 只按需提交任务，控制同时在内存中的语料块数量
+            pending = {executor.submit(_count_chunk_worker, chunk) for chunk in itertools.islice(chunks, jobs * 2)}
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    merge(future.result())
+                for chunk in itertools.islice(chunks, len(done)):
+                    pending.add(executor.submit(_count_chunk_worker, chunk))
+    print(file=sys.stderr)
+
+    return automaton.phrase_counts(visits)
+
+
+def write_phrase_weights(output_file: str, phrases: List[str], counts: List[int], min_count: int = 1) -> int:
+    """
+    按 read_phrase_weights 的格式（词组\\t权重）写出词频，次数从高到低排列，
+    先写临时文件再原子替换；返回写出的词组数
+    """
+    rows = sorted(
+        (item for item in zip(phrases, counts) if item[1] >= min_count),
+        key=lambda item: -item[1]
+    )
+    with atomic_write(output_file) as f:
+        f.writelines(f"{phrase}\t{count}\n" for phrase, count in rows)
+    return len(rows)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="语料词频统计，生成 phrase_weight.txt")
+    parser.add_argument('corpus', nargs='+', help="UTF-8 纯文本语料文件，可指定多个")
+    parser.add_argument('--dict', nargs='+', default=[DEFAULT_DICT_FILE],
+                        help="提供词组的码表，连同 import_tables 一起载入，默认为 ../wubi.dict.yaml")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE, help="输出文件，默认为 phrase_weight.txt")
+    parser.add_argument('--min-count', type=int, default=1, help="出现次数少于该值的词组不写入，默认为1")
+    parser.add_argument('--jobs', type=int, default=None, help="并行扫描的进程数，默认为CPU核数")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="每个语料块的字节数，默认为 8 MiB")
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="统计各阶段的耗时、行数和内存峰值，以 JSON 记录追加到该文件，不指定文件时输出到标准错误")
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace) -> None:
+    for file_path in args.dict + args.corpus:
+        if not os.path.exists(file_path):
+            print(f"错误: 文件不存在: {file_path}")
+            sys.exit(1)
+
+    with PROFILER.stage("load_phrases") as record:
+        phrases = load_phrases(args.dict)
+        record['rows'] = len(phrases)
+    if not phrases:
+        print("错误: 码表中没有词组")
+        sys.exit(1)
+
+    with PROFILER.stage("build_automaton", rows=len(phrases)):
+        automaton = PhraseAutomaton(phrases)
+    print(f"已载入 {len(phrases)} 个词组，自动机共 {len(automaton)} 个状态")
+
+    with PROFILER.stage("count") as record:
+        counts = count_corpus(automaton, args.corpus, args.jobs, args.chunk_size)
+        record['bytes'] = sum(os.path.getsize(file_path) for file_path in args.corpus)
+
+    with PROFILER.stage("write_output", file=args.output) as record:
+        written = write_phrase_weights(args.output, phrases, counts, args.min_count)
+        record['rows'] = written
+    print(f"语料中出现的词组: {sum(1 for count in counts if count)} 个")
+    print(f"已写入 {written} 个词组: {args.output}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.profile is None:
+        run(args)
+        return
+
+    PROFILER.start()
+    try:
+        run(args)
+    finally:
+        PROFILER.write(args.profile, script=os.path.basename(__file__),
+                       argv=sys.argv[1:] if argv is None else argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+码表二进制编译：把 Rime *.dict.yaml 编译成按编码排序、可内存映射的二进制文件，
+查询时按编码二分查找，不需要解析文本。
+
+用法:
+    python dict_binary.py compile ../melt_eng.dict.yaml                # 编译到 .table_cache 目录
+    python dict_binary.py compile ../wubi.dict.yaml --imports          # 连同 import_tables 一起编译
+    python dict_binary.py query 41448.dict.yaml a                      # 查询编码 a 的全部候选
+    python dict_binary.py query ../wubi.dict.yaml --imports aa --prefix --limit 20
+
+二进制格式（小端）：
+    文件头   magic(8) 版本(I) 源文件总大小(Q) 源文件最新修改时间ns(q) 源文件sha256(32) 条目数(I)
+             编译结果总字节数(Q)
+    权重     条目数个 int64，未设置权重的词条为 WEIGHT_NONE
+    编码偏移 (条目数+1) 个 uint32
+    词组偏移 (条目数+1) 个 uint32
+    编码数据 每个编码后跟一个 \0
+    词组数据 每个词组后跟一个 \0
+条目按 (编码的 UTF-8 字节序, 权重从高到低, 载入顺序) 排序，同一编码的候选连续存放且已按
+sort: by_weight 的顺序排列；编译了 import_tables 时，源文件信息由全部码表合并计算。
+打开时核对文件长度与文件头记录的总字节数，截断的编译结果视为无效，查询时自动重新编译。
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+from atomic_file import mkstemp_for
+from rime_dict import load_dict
+from table_cache import CORRUPT_TABLE_ERRORS, cache_path_for, file_digest, refresh_source_mtime
+
+DICT_MAGIC = b"RIMEDIC\0"
+DICT_VERSION = 2
+
+# 文件头的前四项与 table_cache 相同，源文件修改时间可用 refresh_source_mtime 原地更新
+HEADER = struct.Struct("<8sIQq32sIQ")
+
+# 词条没有权重列或权重不是整数时保存的值
+WEIGHT_NONE = -(1 << 63)
+
+# 前缀查询的上界：UTF-8 编码中不会出现 0xff 字节
+PREFIX_END = b"\xff"
+
+
+def source_files(dict_file: str, follow_imports: bool) -> List[str]:
+    """参与编译的码表文件，follow_imports 时包括递归的 import_tables"""
+    if not follow_imports:
+        return [os.path.abspath(dict_file)]
+    return [table.path for table in load_dict(dict_file).iter_tables()]
+
+
+def source_signature(files: List[str]) -> Tuple[int, int, bytes]:
+    """计算 (总大小, 最新修改时间, 内容哈希)；多个文件时对各文件的哈希再做一次哈希"""
+    size = 0
+    mtime_ns = 0
+    digest = hashlib.sha256()
+    for file_path in files:
+        stat = os.stat(file_path)
+        size += stat.st_size
+        mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+        digest.update(file_digest(file_path))
+    return size, mtime_ns, digest.digest()
+
+
+def binary_path_for(dict_file: str, follow_imports: bool = False) -> str:
+    return cache_path_for(dict_file, "merged.dict" if follow_imports else "dict")
+
+
+class CompiledDict:
+    """内存映射的编译码表，按编码和编码前缀二分查找"""
+
+    def __init__(self, binary_file: str):
+        with open(binary_file, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, version, self.source_size, self.source_mtime_ns,
+             self.source_digest, self.count, total_size) = HEADER.unpack_from(self._mm, 0)
+            if magic != DICT_MAGIC or version != DICT_VERSION:
+                raise ValueError(f"不是有效的编译码表文件: {binary_file}")
+            weights_start = HEADER.size
+            codes_offsets_start = weights_start + self.count * 8
+            texts_offsets_start = codes_offsets_start + (self.count + 1) * 4
+            offsets_end = texts_offsets_start + (self.count + 1) * 4
+            if total_size != len(self._mm) or offsets_end > total_size:
+                raise ValueError(f"编译码表文件不完整: {binary_file}")
+        except BaseException:
+            self._mm.close()
+            raise
+
+        view = memoryview(self._mm)
+        self._weights = view[weights_start:codes_offsets_start].cast('q')
+        self._code_offsets = view[codes_offsets_start:texts_offsets_start].cast('I')
+        self._text_offsets = view[texts_offsets_start:offsets_end].cast('I')
+        view.release()
+        self._codes_start = offsets_end
+        self._texts_start = self._codes_start + self._code_offsets[self.count]
+        if self._texts_start + self._text_offsets[self.count] != total_size:
+            self.close()
+            raise ValueError(f"编译码表文件不完整: {binary_file}")
+
+    def close(self) -> None:
+        self._weights.release()
+        self._code_offsets.release()
+        self._text_offsets.release()
+        self._mm.close()
+
+    def __enter__(self) -> 'CompiledDict':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _code_bytes(self, i: int) -> bytes:
+        return self._mm[self._codes_start + self._code_offsets[i]:self._codes_start + self._code_offsets[i + 1] - 1]
+
+    def _text(self, i: int) -> str:
+        start = self._texts_start + self._text_offsets[i]
+        return self._mm[start:self._texts_start + self._text_offsets[i + 1] - 1].decode('utf-8')
+
+    def _weight(self, i: int) -> Optional[int]:
+        weight = self._weights[i]
+        return None if weight == WEIGHT_NONE else weight
+
+    def _lower_bound(self, target: bytes) -> int:
+        """第一个编码不小于 target 的条目位置"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._code_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def entry(self, i: int) -> Tuple[str, str, Optional[int]]:
+        """第 i 个条目的 (编码, 词组, 权重)"""
+        return self._code_bytes(i).decode('utf-8'), self._text(i), self._weight(i)
+
+    def lookup(self, code: str) -> List[Tuple[str, Optional[int]]]:
+        """编码完全相同的全部候选 (词组, 权重)，已按权重排列"""
+        target = code.encode('utf-8')
+        i = self._lower_bound(target)
+        result = []
+        while i < self.count and self._code_bytes(i) == target:
+            result.append((self._text(i), self._weight(i)))
+            i += 1
+        return result
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """编码以 prefix 开头的条目位置范围 [start, end)"""
+        target = prefix.encode('utf-8')
+        return self._lower_bound(target), self._lower_bound(target + PREFIX_END)
+
+    def with_prefix(self, prefix: str, limit: Optional[int] = None) -> Iterator[Tuple[str, str, Optional[int]]]:
+        """按编码顺序产出编码以 prefix 开头的 (编码, 词组, 权重)，最多 limit 条"""
+        start, end = self.prefix_range(prefix)
+        if limit is not None:
+            end = min(end, start + limit)
+        for i in range(start, end):
+            yield self.entry(i)
+
+    def __iter__(self) -> Iterator[Tuple[str, str, Optional[int]]]:
+        for i in range(self.count):
+            yield self.entry(i)
+
+
+def write_compiled_dict(
+    binary_file: str,
+    entries: List[Tuple[str, str, Optional[int]]],
+    signature: Tuple[int, int, bytes]
+) -> None:
+    """把 (编码, 词组, 权重) 列表按编码排序写成编译码表，先写临时文件并落盘再原子替换"""
+    encoded = sorted(
+        (code.encode('utf-8'), -(WEIGHT_NONE if weight is None else weight), order, text.encode('utf-8'))
+        for order, (code, text, weight) in enumerate(entries)
+    )
+
+    weights = array('q', (-negated for _, negated, _, _ in encoded))
+    code_offsets = array('I', [0])
+    text_offsets = array('I', [0])
+    for code, _, _, text in encoded:
+        code_offsets.append(code_offsets[-1] + len(code) + 1)
+        text_offsets.append(text_offsets[-1] + len(text) + 1)
+
+    size, mtime_ns, digest = signature
+    total_size = (HEADER.size + weights.itemsize * len(weights) + 4 * (len(code_offsets) + len(text_offsets))
+                  + code_offsets[-1] + text_offsets[-1])
+    os.makedirs(os.path.dirname(binary_file) or ".", exist_ok=True)
+    fd, temp_path = mkstemp_for(binary_file)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(DICT_MAGIC, DICT_VERSION, size, mtime_ns, digest, len(encoded), total_size))
+            f.write(weights.tobytes())
+            f.write(code_offsets.tobytes())
+            f.write(text_offsets.tobytes())
+            f.write(b"".join(code + b"\0" for code, _, _, _ in encoded))
+            f.write(b"".join(text + b"\0" for _, _, _, text in encoded))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, binary_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def compile_dict(dict_file: str, binary_file: Optional[str] = None, follow_imports: bool = False) -> str:
+    """编译码表（follow_imports 时连同导入的码表），返回编译结果的路径"""
+    binary_file = binary_file or binary_path_for(dict_file, follow_imports)
+    files = source_files(dict_file, follow_imports)
+    signature = source_signature(files)
+
+    entries = []
+    for table in load_dict(dict_file).iter_tables() if follow_imports else [load_dict(dict_file)]:
+        for entry in table.iter_body():
+            if entry.text and entry.code:
+                entries.append((entry.code, entry.text, entry.weight))
+
+    write_compiled_dict(binary_file, entries, signature)
+    return binary_file
+
+
+def open_compiled_dict(dict_file: str, follow_imports: bool = False) -> CompiledDict:
+    """
+    打开码表的编译结果，不存在、已损坏或源文件已变化时重新编译
+    与 table_cache 相同：大小和修改时间一致时直接使用，只有修改时间变化时再比较内容哈希，
+    哈希一致时更新记录的修改时间，之后的查询不必再计算哈希
+    """
+    binary_file = binary_path_for(dict_file, follow_imports)
+    files = source_files(dict_file, follow_imports)
+
+    if os.path.exists(binary_file):
+        try:
+            compiled = CompiledDict(binary_file)
+        except CORRUPT_TABLE_ERRORS:
+            compiled = None
+
+        if compiled is not None:
+            size = sum(os.stat(file_path).st_size for file_path in files)
+            mtime_ns = max(os.stat(file_path).st_mtime_ns for file_path in files)
+            if compiled.source_size == size and compiled.source_mtime_ns == mtime_ns:
+                return compiled
+            if compiled.source_size == size and compiled.source_digest == source_signature(files)[2]:
+                refresh_source_mtime(binary_file, mtime_ns)
+                return compiled
+            compiled.close()
+
+    return CompiledDict(compile_dict(dict_file, binary_file, follow_imports))
+
+
+def format_weight(weight: Optional[int]) -> str:
+    return "" if weight is None else str(weight)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="码表二进制编译与查询")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compile_parser = subparsers.add_parser('compile', help="编译码表")
+    compile_parser.add_argument('dict_file', help="*.dict.yaml 码表文件")
+    compile_parser.add_argument('-o', '--output', help="编译结果路径，默认保存在码表同目录的 .table_cache 下")
+    compile_parser.add_argument('--imports', action='store_true', help="连同 import_tables 一起编译")
+
+    query_parser = subparsers.add_parser('query', help="按编码查询，编译结果过期时自动重新编译")
+    query_parser.add_argument('dict_file', help="*.dict.yaml 码表文件")
+    query_parser.add_argument('code', help="要查询的编码")
+    query_parser.add_argument('--imports', action='store_true', help="查询连同 import_tables 的合并结果")
+    query_parser.add_argument('--prefix', action='store_true', help="列出以该编码开头的全部条目")
+    query_parser.add_argument('--limit', type=int, default=None, help="最多列出的条目数")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.dict_file):
+        print(f"错误: 码表文件不存在: {args.dict_file}")
+        sys.exit(1)
+
+    if args.command == 'compile':
+        binary_file = compile_dict(args.dict_file, args.output, args.imports)
+        with CompiledDict(binary_file) as compiled:
+            print(f"已编译 {len(compiled)} 个词条: {binary_file}")
+        return
+
+    with open_compiled_dict(args.dict_file, args.imports) as compiled:
+        if args.prefix:
+            rows = list(compiled.with_prefix(args.code, args.limit))
+        else:
+            rows = [(args.code, text, weight) for text, weight in compiled.lookup(args.code)][:args.limit]
+        for code, text, weight in rows:
+            print(f"{text}\t{code}\t{format_weight(weight)}")
+        print(f"共 {len(rows)} 条", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+码表格式检查：按各 *.dict.yaml 文件头声明的 columns 逐行检查正文，结果输出为 JSON 或 SARIF，
+发现错误时以非零状态退出，适合在每次部署前运行。
+
+检查的规则：
+    header               文件头缺少 '...' 结束标记，或 columns 中有未知、重复的列（错误）
+    tab-count            Tab 数多于 columns 声明的列数（错误）
+    empty-phrase         词组列为空（错误）
+    weight               权重不是整数（错误）
+    code-case            编码不是以空格分隔的小写字母（警告）
+    trailing-whitespace  行尾有空白字符（警告）
+    duplicate            词组和编码都与本文件中前面的某一行相同（警告）
+
+每个文件按其 columns 编译一个整行匹配的正则表达式，绝大多数正常的行只需一次匹配；
+只有匹配失败的行才逐列检查具体违反了哪些规则。多个文件在独立进程中并行检查。
+
+用法:
+    python dict_lint.py                                   # 检查 ../*.dict.yaml 和 ./*.dict.yaml，输出 JSON
+    python dict_lint.py --format sarif --output lint.sarif
+    python dict_lint.py wubi.phrase.dict.yaml --strict    # 有警告时也以非零状态退出
+"""
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import pathlib
+import re
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from profiling import PROFILER
+from rime_dict import DEFAULT_COLUMNS, parse_header, read_header_lines
+
+DEFAULT_DICT_PATTERNS = [os.path.join("..", "*.dict.yaml"), "*.dict.yaml"]
+
+OUTPUT_FORMATS = ('json', 'sarif')
+
+# 规则 -> (级别, 说明)，级别沿用 SARIF 的 error / warning
+LINT_RULES: Dict[str, Tuple[str, str]] = {
+    'unreadable': ('error', "文件不存在或无法按 UTF-8 读取"),
+    'header': ('error', "文件头缺少 '...' 结束标记，或 columns 中有未知、重复的列"),
+    'tab-count': ('error', "Tab 数多于文件头 columns 声明的列数"),
+    'empty-phrase': ('error', "词组列为空"),
+    'weight': ('error', "权重不是整数"),
+    'code-case': ('warning', "编码不是以空格分隔的小写字母"),
+    'trailing-whitespace': ('warning', "行尾有空白字符"),
+    'duplicate': ('warning', "词组和编码都与本文件中前面的某一行相同"),
+}
+
+# Rime 码表支持的列，以及整行匹配时各列的正则；编码允许用空格分隔音节（拼音码表）
+RIME_COLUMNS = ('text', 'code', 'weight', 'stem')
+CODE_PATTERN = r"[a-z]+(?: [a-z]+)*"
+WEIGHT_PATTERN = r"-?[0-9]+"
+CELL_PATTERNS = {
+    'text': r"[^\t]*?[^\t\s][^\t]*",
+    'code': f"(?:{CODE_PATTERN})?",
+    'weight': f"(?:{WEIGHT_PATTERN})?",
+    'stem': r"[^\t]*",
+}
+
+CODE_RE = re.compile(CODE_PATTERN)
+WEIGHT_RE = re.compile(WEIGHT_PATTERN)
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+
+class Finding(NamedTuple):
+    """一条检查结果，line 和 column 从1开始，column 为 0 表示整行"""
+    rule: str
+    file: str
+    line: int
+    column: int
+    message: str
+
+    @property
+    def level(self) -> str:
+        return LINT_RULES[self.rule][0]
+
+
+class FileResult(NamedTuple):
+    path: str
+    rows: int
+    findings: List[Finding]
+
+
+def compile_line_matcher(columns: List[str]) -> Pattern[str]:
+    """
+    按 columns 编译整行匹配的正则：后面的列都可以省略，各列依次以 Tab 分隔，行尾不能是空白字符
+    已知的列用命名分组，便于匹配成功后直接取出词组和编码
+    """
+    pattern = ""
+    for index in reversed(range(len(columns))):
+        name = columns[index]
+        cell = CELL_PATTERNS.get(name, r"[^\t]*")
+        if name in CELL_PATTERNS and name not in columns[:index]:
+            cell = f"(?P<{name}>{cell})"
+        pattern = f"(?:\\t{cell}{pattern})?"
+    # 第一列不可省略，去掉最外层的可选分组和前导 Tab
+    first = pattern[len("(?:\\t"):-len(")?")]
+    return re.compile(f"{first}(?<!\\s)")
+
+
+def check_header(path: str, header: Dict[str, Any], header_size: int) -> Tuple[List[str], List[Finding]]:
+    """取出 columns 并检查未知、重复的列，返回 (列名, 问题)"""
+    columns = [str(name) for name in header.get('columns') or DEFAULT_COLUMNS]
+    findings = []
+    for index, name in enumerate(columns):
+        if name not in RIME_COLUMNS:
+            findings.append(Finding('header', path, header_size, 0, f"columns 中有未知的列 '{name}'"))
+        elif name in columns[:index]:
+            findings.append(Finding('header', path, header_size, 0, f"columns 中的列 '{name}' 重复"))
+    if 'text' not in columns:
+        findings.append(Finding('header', path, header_size, 0, "columns 中没有 text 列"))
+    return columns, findings
+
+
+def diagnose_line(path: str, line_num: int, line: str, columns: List[str]) -> List[Finding]:
+    """逐列检查一行未通过整行匹配的数据，行尾空白只报告一次，不再计入最后一列"""
+    findings = []
+    content = line.rstrip()
+    if len(content) < len(line):
+        findings.append(Finding('trailing-whitespace', path, line_num, len(content) + 1,
+                                f"行尾有 {len(line) - len(content)} 个空白字符"))
+
+    cells = content.split('\t')
+    if len(cells) > len(columns):
+        findings.append(Finding('tab-count', path, line_num, 0,
+                                f"共有 {len(cells)} 列，文件头 columns 只声明了 {len(columns)} 列"))
+
+    column = 1
+    for name, cell in zip(columns, cells):
+        if name == 'text' and not cell.strip():
+            findings.append(Finding('empty-phrase', path, line_num, column, "词组列为空"))
+        elif name == 'code' and cell and not CODE_RE.fullmatch(cell):
+            findings.append(Finding('code-case', path, line_num, column, f"编码 '{cell}' 不是以空格分隔的小写字母"))
+        elif name == 'weight' and cell and not WEIGHT_RE.fullmatch(cell):
+            findings.append(Finding('weight', path, line_num, column, f"权重 '{cell}' 不是整数"))
+        column += len(cell) + 1
+
+    if 'text' in columns and columns.index('text') >= len(cells):
+        findings.append(Finding('empty-phrase', path, line_num, 0, "缺少词组列"))
+    return findings
+
+
+def row_key(line: str, columns: List[str]) -> Optional[Tuple[str, str]]:
+    """判断重复行用的 (词组, 编码)，没有词组时返回 None"""
+    cells = line.rstrip().split('\t')
+    cell = dict(zip(columns, cells))
+    text = cell.get('text', "")
+    return (text, cell.get('code', "")) if text.strip() else None
+
+
+def lint_file(path: str) -> FileResult:
+    """检查一个码表文件，返回 (文件, 数据行数, 问题列表)"""
+    findings: List[Finding] = []
+    rows = 0
+    with PROFILER.stage("lint", file=path) as record:
+        try:
+            # newline='' 保留 \r，按行去掉一个 \r\n 或 \n，CRLF 文件不算行尾空白
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                header_lines = read_header_lines(f)
+                if header_lines is None:
+                    return FileResult(path, 0, [Finding('header', path, 1, 0, "文件头缺少 '...' 结束标记")])
+
+                columns, findings = check_header(path, parse_header(header_lines), len(header_lines) + 1)
+                matcher = compile_line_matcher(columns)
+                has_text = 'text' in matcher.groupindex
+                has_code = 'code' in matcher.groupindex
+                first_seen: Dict[Tuple[str, str], int] = {}
+
+                for line_num, line in enumerate(f, len(header_lines) + 2):
+                    line = line.rstrip('\n')
+                    if line.endswith('\r'):
+                        line = line[:-1]
+                    if not line or line.startswith('#'):
+                        continue
+                    rows += 1
+
+                    match = matcher.fullmatch(line) if has_text else None
+                    if match is not None and match['text'] is not None:
+                        key = (match['text'], (match['code'] if has_code else None) or "")
+                    else:
+                        findings.extend(diagnose_line(path, line_num, line, columns))
+                        key = row_key(line, columns)
+
+                    if key is not None:
+                        first = first_seen.setdefault(key, line_num)
+                        if first != line_num:
+                            findings.append(Finding('duplicate', path, line_num, 0,
+                                                    f"与第 {first} 行的词组和编码相同: {key[0]} {key[1]}"))
+        except (OSError, UnicodeDecodeError) as e:
+            findings.append(Finding('unreadable', path, 0, 0, str(e)))
+        record['rows'] = rows
+    return FileResult(path, rows, findings)
+
+
+def _init_lint_worker(profile: bool = False) -> None:
+    """工作进程初始化：需要时在进程内开始统计各阶段"""
+    if profile:
+        PROFILER.reset()
+        PROFILER.start()
+
+
+def _lint_file_worker(path: str) -> Tuple[FileResult, List[Dict[str, Any]]]:
+    return lint_file(path), PROFILER.take_records()
+
+
+def lint_files(paths: List[str], jobs: Optional[int] = None) -> List[FileResult]:
+    """并行检查多个文件，结果按 paths 的顺序返回"""
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+    if jobs <= 1:
+        return [lint_file(path) for path in paths]
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_lint_worker,
+        initargs=(PROFILER.enabled,)
+    ) as executor:
+        for result, records in executor.map(_lint_file_worker, paths):
+            results.append(result)
+            PROFILER.add_records(records, worker=True)
+    return results
+
+
+def find_dict_files(patterns: List[str]) -> List[str]:
+    """按通配符查找码表文件，去掉重复的文件并保持顺序"""
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.abspath(path) not in seen:
+                seen.add(os.path.abspath(path))
+                paths.append(path)
+    return paths
+
+
+def relative_paths(paths: List[str]) -> Tuple[str, Dict[str, str]]:
+    """以全部文件所在目录的公共父目录为根，返回 (根目录, 文件 -> 以 / 分隔的相对路径)"""
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return root, {path: pathlib.Path(os.path.relpath(os.path.abspath(path), root)).as_posix() for path in paths}
+
+
+def count_levels(results: List[FileResult]) -> Dict[str, int]:
+    counts = {'error': 0, 'warning': 0}
+    for result in results:
+        for finding in result.findings:
+            counts[finding.level] += 1
+    return counts
+
+
+def to_json(results: List[FileResult]) -> Dict[str, Any]:
+    _, names = relative_paths([result.path for result in results])
+    rule_counts: Dict[str, int] = {}
+    findings = []
+    for result in results:
+        for finding in result.findings:
+            rule_counts[finding.rule] = rule_counts.get(finding.rule, 0) + 1
+            findings.append({
+                'rule': finding.rule,
+                'level': finding.level,
+                'file': names[result.path],
+                'line': finding.line,
+                'column': finding.column,
+                'message': finding.message,
+            })
+    return {
+        'summary': {
+            'files': len(results),
+            'rows': sum(result.rows for result in results),
+            **count_levels(results),
+            'rules': rule_counts,
+        },
+        'files': [{'file': names[result.path], 'rows': result.rows, 'findings': len(result.findings)}
+                  for result in results],
+        'findings': findings,
+    }
+
+
+def to_sarif(results: List[FileResult]) -> Dict[str, Any]:
+    root, names = relative_paths([result.path for result in results])
+    rule_ids = list(LINT_RULES)
+    sarif_results = []
+    for result in results:
+        for finding in result.findings:
+            location: Dict[str, Any] = {'artifactLocation': {'uri': names[result.path], 'uriBaseId': 'SRCROOT'}}
+            if finding.line:
+                region = {'startLine': finding.line}
+                if finding.column:
+                    region['startColumn'] = finding.column
+                location['region'] = region
+            sarif_results.append({
+                'ruleId': finding.rule,
+                'ruleIndex': rule_ids.index(finding.rule),
+                'level': finding.level,
+                'message': {'text': finding.message},
+                'locations': [{'physicalLocation': location}],
+            })
+    return {
+        '$schema': SARIF_SCHEMA,
+        'version': '2.1.0',
+        'runs': [{
+            'tool': {'driver': {
+                'name': 'dict_lint',
+                'rules': [{
+                    'id': rule,
+                    'shortDescription': {'text': description},
+                    'defaultConfiguration': {'level': level},
+                } for rule, (level, description) in LINT_RULES.items()],
+            }},
+            'originalUriBaseIds': {'SRCROOT': {'uri': pathlib.Path(root).as_uri() + '/'}},
+            'artifacts': [{'location': {'uri': names[result.path], 'uriBaseId': 'SRCROOT'}} for result in results],
+            'results': sarif_results,
+        }],
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="码表格式检查，输出 JSON 或 SARIF")
+    parser.add_argument('dict_files', nargs='*', default=DEFAULT_DICT_PATTERNS,
+                        help="要检查的码表文件，可以使用通配符，默认为 ../*.dict.yaml 和 ./*.dict.yaml")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='json', help="输出格式，默认为 json")
+    parser.add_argument('--output', metavar='FILE', help="把结果写入该文件，默认输出到标准输出")
+    parser.add_argument('--strict', action='store_true', help="有警告时也以非零状态退出")
+    parser.add_argument('--jobs', type=int, default=None, help="并行检查的进程数，默认为CPU核数")
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="统计各阶段的耗时、行数和内存峰值，以 JSON 记录追加到该文件，不指定文件时输出到标准错误")
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace) -> int:
+    """执行检查并输出结果，返回退出状态：有错误（--strict 时包括警告）为 1，否则为 0"""
+    paths = find_dict_files(args.dict_files)
+    if not paths:
+        print("错误: 没有找到要检查的码表文件", file=sys.stderr)
+        return 1
+
+    results = lint_files(paths, args.jobs)
+
+    with PROFILER.stage("write_output", file=args.output or "-"):
+        report = to_sarif(results) if args.format == 'sarif' else to_json(results)
+        text = json.dumps(report, ensure_ascii=False, indent=2) + "\n"
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+
+    counts = count_levels(results)
+    print(f"共检查 {len(results)} 个文件 {sum(result.rows for result in results)} 行，"
+          f"错误 {counts['error']} 个，警告 {counts['warning']} 个", file=sys.stderr)
+    return 1 if counts['error'] or (args.strict and counts['warning']) else 0
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.profile is None:
+        sys.exit(run(args))
+
+    PROFILER.start()
+    try:
+        status = run(args)
+    finally:
+        PROFILER.write(args.profile, script=os.path.basename(__file__),
+                       argv=sys.argv[1:] if argv is None else argv)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+跨码表重复词条检查：一次遍历 wubi.dict.yaml 及其全部 import_tables，用哈希表找出
+同一词组、同一编码出现多次的重复词条，以及同一词组在不同码表中使用不同编码的情况。
+
+用法:
+    python dup_check.py                            # 只报告
+    python dup_check.py --fix                      # 删除重复词条，保留最先载入的一条
+    python dup_check.py --fix --keep weight        # 保留权重最高的一条
+    python dup_check.py --fix --prefer wubi.user   # 优先保留 wubi.user 中的一条
+"""
+import argparse
+import os
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+from atomic_file import atomic_write
+from rime_dict import DictEntry, load_dict
+
+DEFAULT_DICT_FILE = os.path.join("..", "wubi.dict.yaml")
+
+# 自动修复时选择保留词条的策略
+KEEP_POLICIES = ('first', 'weight')
+
+
+def table_name(entry: DictEntry) -> str:
+    return os.path.basename(entry.source)
+
+
+def scan_duplicates(dict_file: str) -> Tuple[Dict[Tuple[str, str], List[DictEntry]], Dict[str, Set[str]], int]:
+    """
+    流式读取整个导入图，返回 (重复组, 跨码表多编码词组, 词条总数)
+    重复组的键为 (词组, 编码)，值为按载入顺序排列的全部词条；
+    只有出现多次的键才会保存完整列表，其余只在哈希表中保留第一条
+    """
+    first_seen: Dict[Tuple[str, str], DictEntry] = {}
+    duplicates: Dict[Tuple[str, str], List[DictEntry]] = {}
+    phrase_tables: Dict[str, Dict[str, Set[str]]] = {}
+    total = 0
+
+    for table in load_dict(dict_file).iter_tables():
+        for missing in table.missing_imports():
+            print(f"警告: 码表文件不存在，已跳过: {missing}", file=sys.stderr)
+        for entry in table.iter_body():
+            if not entry.text or not entry.code:
+                continue
+            total += 1
+            key = (entry.text, entry.code)
+            first = first_seen.setdefault(key, entry)
+            if first is not entry:
+                duplicates.setdefault(key, [first]).append(entry)
+            phrase_tables.setdefault(entry.text, {}).setdefault(entry.source, set()).add(entry.code)
+
+    # 同一词组出现在多个码表中，且各码表使用的编码不完全相同
+    multi_code = {}
+    for text, tables in phrase_tables.items():
+        if len(tables) > 1:
+            code_sets = list(tables.values())
+            if any(codes != code_sets[0] for codes in code_sets[1:]):
+                multi_code[text] = {code for codes in code_sets for code in codes}
+
+    return duplicates, multi_code, total
+
+
+def choose_winner(group: List[DictEntry], keep: str, prefer: Optional[str]) -> DictEntry:
+    """从一组重复词条中选出保留的一条，其余词条会被删除"""
+    if prefer:
+        preferred = [entry for entry in group if table_name(entry) == f"{prefer}.dict.yaml"]
+        if preferred:
+            group = preferred
+    if keep == 'weight':
+        # 权重相同时保留先载入的一条
+        return max(enumerate(group), key=lambda item: (
+            item[1].weight if item[1].weight is not None else -1, -item[0]))[1]
+    return group[0]
+
+
+def remove_lines(file_path: str, line_nums: Set[int]) -> None:
+    """流式删除指定行（从0开始）写入临时文件，再原子替换原文件，保留原有的换行符"""
+    with open(file_path, 'r', encoding='utf-8', newline='') as src, atomic_write(file_path, newline='') as dst:
+        for line_num, line in enumerate(src):
+            if line_num not in line_nums:
+                dst.write(line)
+
+
+def fix_duplicates(
+    duplicates: Dict[Tuple[str, str], List[DictEntry]],
+    keep: str,
+    prefer: Optional[str]
+) -> Dict[str, int]:
+    """每组重复词条只保留一条，按文件批量删除其余行，返回各文件删除的行数"""
+    to_remove: Dict[str, Set[int]] = {}
+    for group in duplicates.values():
+        winner = choose_winner(group, keep, prefer)
+        for entry in group:
+            if entry is not winner:
+                to_remove.setdefault(entry.source, set()).add(entry.line_num)
+
+    for file_path, line_nums in to_remove.items():
+        remove_lines(file_path, line_nums)
+    return {file_path: len(line_nums) for file_path, line_nums in to_remove.items()}
+
+
+def format_entry(entry: DictEntry) -> str:
+    weight = "" if entry.weight is None else entry.weight
+    return f"{table_name(entry)}:{entry.line_num + 1}({weight})"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="跨码表重复词条检查")
+    parser.add_argument('dict_file', nargs='?', default=DEFAULT_DICT_FILE,
+                        help="主词库文件，默认为 ../wubi.dict.yaml")
+    parser.add_argument('--top', type=int, default=20, help="报告中每类列出的条目数")
+    parser.add_argument('--fix', action='store_true', help="删除重复词条，每组只保留一条")
+    parser.add_argument('--keep', choices=KEEP_POLICIES, default='first',
+                        help="保留哪一条: first 为最先载入的（默认），weight 为权重最高的")
+    parser.add_argument('--prefer', metavar='TABLE',
+                        help="优先保留该码表中的词条，如 wubi.user")
+    args = parser.parse_args(argv)
+
+    duplicates, multi_code, total = scan_duplicates(args.dict_file)
+
+    # 按码表组合统计重复组数
+    pair_counts: Dict[Tuple[str, ...], int] = {}
+    weight_conflicts = 0
+    for group in duplicates.values():
+        tables = tuple(sorted({table_name(entry) for entry in group}))
+        pair_counts[tables] = pair_counts.get(tables, 0) + 1
+        if len({entry.weight for entry in group}) > 1:
+            weight_conflicts += 1
+
+    print("=" * 60)
+    print(f"词条总数: {total}")
+    print(f"重复词条（词组和编码都相同）: {len(duplicates)} 组，"
+          f"多余 {sum(len(group) - 1 for group in duplicates.values())} 行，其中权重不同 {weight_conflicts} 组")
+    print(f"跨码表使用不同编码的词组: {len(multi_code)} 个")
+
+    print("\n## 重复词条所在码表")
+    for tables, count in sorted(pair_counts.items(), key=lambda item: -item[1]):
+        print(f"  {' + '.join(tables)}: {count} 组")
+
+    print(f"\n## 重复词条（前 {args.top} 组）")
+    for (text, code), group in list(duplicates.items())[:args.top]:
+        print(f"{text}\t{code}\t{'  '.join(format_entry(entry) for entry in group)}")
+
+    print(f"\n## 跨码表使用不同编码的词组（前 {args.top} 个）")
+    for text, codes in list(multi_code.items())[:args.top]:
+        print(f"{text}\t{' '.join(sorted(codes))}")
+    print("=" * 60)
+
+    if args.fix and duplicates:
+        removed = fix_duplicates(duplicates, args.keep, args.prefer)
+        print("\n已删除重复词条:")
+        for file_path, count in removed.items():
+            print(f"  {os.path.basename(file_path)}: {count} 行")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+外存权重同步：用于内存放不下的大权重表。不建立 词组 -> 权重 的字典，
+而是把两个文件按词组分段外部排序后归并连接，再按原行顺序改写目标文件，内存占用只与分段大小有关。
+
+步骤:
+    1. 源文件的 (词组, 行号, 权重) 按每段 run_size 行排序后写入临时文件
+    2. 目标文件的 (词组, 行号) 同样分段排序
+    3. 多路归并两组分段并按词组连接，源文件中同一词组出现多次时取最后一次的权重（与
+       load_weight_mapping 一致），得到 (目标行号, 词组, 新权重)，再按行号分段排序
+    4. 顺序读取目标文件和按行号归并的连接结果，逐行替换权重，写入临时文件后原子替换；
+       修改明细同样逐条写入临时文件，更新记录和历史补丁由此流式写出
+结果、统计和更新记录与 replace_weight.py 的内存模式完全相同。
+
+用法:
+    python external_sync.py huge.dict.yaml                           # 方向1：用 phrase_weight.txt 更新 huge.dict.yaml
+    python external_sync.py huge.dict.yaml --direction 2             # 方向2：用 huge.dict.yaml 更新 phrase_weight.txt
+    python external_sync.py huge.txt --run-size 200000 --temp-dir /mnt/scratch
+"""
+import argparse
+import heapq
+import itertools
+import os
+import sys
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from atomic_file import mkstemp_for
+from profiling import PROFILER
+from replace_weight import (
+    DEFAULT_RECORD_DIR, commit_weight_rewrite, parse_weight_row, patch_weight_line,
+    print_rewrite_stats, resolve_row_columns, scan_file_layout
+)
+
+# 每个排序分段的行数，内存中同时只保留一个分段
+DEFAULT_RUN_SIZE = 1000000
+
+# 一次归并的最多分段数，分段更多时先逐级归并，避免同时打开过多文件
+MERGE_FAN_IN = 64
+
+
+class RunWriter:
+    """把记录分段排序后写入临时目录，每条记录为若干字段组成的元组，各字段中不含 Tab 和换行"""
+
+    def __init__(self, temp_dir: str, name: str, parse: Callable[[List[str]], Tuple], run_size: int) -> None:
+        self.temp_dir = temp_dir
+        self.name = name
+        self.parse = parse
+        self.run_size = run_size
+        self.runs: List[str] = []
+        self.rows = 0
+        self._run_count = 0
+
+    def _write_run(self, records: Iterator[Tuple]) -> None:
+        path = os.path.join(self.temp_dir, f"{self.name}.{self._run_count}.run")
+        self._run_count += 1
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines('\t'.join(map(str, record)) + '\n' for record in records)
+        self.runs.append(path)
+
+    def write_all(self, records: Iterator[Tuple]) -> 'RunWriter':
+        """读完全部记录，每满 run_size 条排序写出一个分段"""
+        while True:
+            buffer = list(itertools.islice(records, self.run_size))
+            if not buffer:
+                break
+            self.rows += len(buffer)
+            buffer.sort()
+            self._write_run(iter(buffer))
+        return self
+
+    def _iter_run(self, path: str) -> Iterator[Tuple]:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield self.parse(line.rstrip('\n').split('\t'))
+
+    def merged(self) -> Iterator[Tuple]:
+        """按排序顺序产出全部记录；分段过多时先分批归并成较大的分段"""
+        while len(self.runs) > MERGE_FAN_IN:
+            batch, self.runs = self.runs[:MERGE_FAN_IN], self.runs[MERGE_FAN_IN:]
+            self._write_run(heapq.merge(*(self._iter_run(path) for path in batch)))
+            for path in batch:
+                os.remove(path)
+        return heapq.merge(*(self._iter_run(path) for path in self.runs))
+
+
+class RecordLog:
+    """
+    只追加的记录文件，代替统计信息中的修改明细列表：append 时直接写入磁盘，之后可按写入顺序多次迭代，
+    内存占用与记录数无关。字符串原样写为一行，元组各字段以 Tab 连接，读回时由 parse 还原
+    """
+
+    def __init__(self, path: str, parse: Callable[[str], Any]) -> None:
+        self.path = path
+        self.parse = parse
+        self._count = 0
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def append(self, record: Any) -> None:
+        self._file.write((record if isinstance(record, str) else '\t'.join(map(str, record))) + '\n')
+        self._count += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Any]:
+        self._file.flush()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield self.parse(line.rstrip('\n'))
+
+
+def parse_change(line: str) -> Tuple[int, str, int, str, str]:
+    """还原 patch_weight_line 记录的 (行号, 词组, 权重列, 旧权重, 新权重)"""
+    line_num, phrase, weight_col, old_weight, new_weight = line.split('\t')
+    return int(line_num), phrase, int(weight_col), old_weight, new_weight
+
+
+def iter_source_records(source_file: str) -> Iterator[Tuple[str, int, str]]:
+    """源文件的 (词组, 行号, 权重)，无效行的警告与内存模式相同"""
+    data_start, column_types = scan_file_layout(source_file)
+    print(f"列类型检测结果: {column_types}")
+    with open(source_file, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f):
+            if line_num < data_start:
+                continue
+            entry = parse_weight_row(line_num, line.rstrip('\n'), column_types)
+            if entry is not None:
+                yield entry[0], line_num, entry[1]
+
+
+def iter_target_records(target_file: str, data_start: int, column_types: Dict[int, str]) -> Iterator[Tuple[str, int]]:
+    """目标文件的 (词组, 行号)；词组列的确定方式与 patch_weight_line 相同，不输出警告"""
+    with open(target_file, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f):
+            line_content = line.rstrip('\n')
+            if line_num < data_start or '\t' not in line_content:
+                continue
+            parts = line_content.split('\t')
+            phrase_col, weight_col, _ = resolve_row_columns(parts, column_types)
+            if phrase_col is not None and weight_col is not None:
+                yield parts[phrase_col].strip(), line_num
+
+
+def merge_join(
+    source_records: Iterator[Tuple[str, int, str]],
+    target_records: Iterator[Tuple[str, int]]
+) -> Iterator[Tuple[int, str, str]]:
+    """按词组连接两个已排序的记录流，产出 (目标行号, 词组, 新权重)"""
+    # 同一词组的源记录按行号排列，取最后一条
+    latest = ((phrase, list(group)[-1][2]) for phrase, group in itertools.groupby(source_records, key=lambda r: r[0]))
+    source = next(latest, None)
+    for phrase, line_num in target_records:
+        while source is not None and source[0] < phrase:
+            source = next(latest, None)
+        if source is None:
+            return
+        if source[0] == phrase:
+            yield line_num, phrase, source[1]
+
+
+def rewrite_in_line_order(
+    target_file: str,
+    data_start: int,
+    column_types: Dict[int, str],
+    joined: Iterator[Tuple[int, str, str]],
+    file_label: str,
+    work_dir: str
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    顺序读取目标文件，逐行用按行号排序的连接结果替换权重，写入同目录下的临时文件
+    修改明细随改写逐条写入 work_dir 中的记录文件，不在内存中累积
+    返回 (统计信息, 临时文件路径)；没有修改时删除临时文件并返回 None
+    """
+    stats = {
+        'data_lines': 0,
+        'updated_count': 0,
+        'not_found_count': 0,
+        'error_count': 0,
+        'modified_lines': RecordLog(os.path.join(work_dir, "modified_lines.log"), str),
+        'changes': RecordLog(os.path.join(work_dir, "changes.log"), parse_change)
+    }
+
+    next_join = next(joined, None)
+    fd, temp_path = mkstemp_for(target_file)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out, open(target_file, 'r', encoding='utf-8') as src:
+            for line_num, original_line in enumerate(src):
+                if line_num < data_start:
+                    out.write(original_line)
+                    continue
+
+                # 本行的新权重只来自连接结果；没有连接结果的行按未找到处理
+                mapping = {}
+                while next_join is not None and next_join[0] <= line_num:
+                    if next_join[0] == line_num:
+                        mapping = {next_join[1]: next_join[2]}
+                    next_join = next(joined, None)
+
+                new_line = patch_weight_line(line_num, original_line, column_types, mapping, stats, file_label)
+                out.write(original_line if new_line is None else new_line)
+    except BaseException:
+        os.remove(temp_path)
+        stats['modified_lines'].close()
+        stats['changes'].close()
+        raise
+
+    if not stats['updated_count']:
+        os.remove(temp_path)
+        temp_path = None
+    return stats, temp_path
+
+
+def external_sync_weights(
+    source_file: str,
+    target_file: str,
+    record_dir: str,
+    file_label: str,
+    target_file_name: str,
+    direction: str,
+    source_file_name: str,
+    run_size: int = DEFAULT_RUN_SIZE,
+    temp_dir: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """用源文件的权重外存排序连接后更新目标文件，返回值与 sync_file_weights 相同"""
+    with tempfile.TemporaryDirectory(prefix="external_sync_", dir=temp_dir) as work_dir:
+        with PROFILER.stage("sort_source", file=source_file) as record:
+            source_runs = RunWriter(work_dir, "source", lambda f: (f[0], int(f[1]), f[2]), run_size)
+            source_runs.write_all(iter_source_records(source_file))
+            record['rows'] = source_runs.rows
+
+        with PROFILER.stage("sort_target", file=target_file) as record:
+            data_start, column_types = scan_file_layout(target_file)
+            print(f"列类型检测结果: {column_types}")
+            target_runs = RunWriter(work_dir, "target", lambda f: (f[0], int(f[1])), run_size)
+            target_runs.write_all(iter_target_records(target_file, data_start, column_types))
+            record['rows'] = target_runs.rows
+
+        with PROFILER.stage("merge_join") as record:
+            joined_runs = RunWriter(work_dir, "joined", lambda f: (int(f[0]), f[1], f[2]), run_size)
+            joined_runs.write_all(merge_join(source_runs.merged(), target_runs.merged()))
+            record['rows'] = joined_runs.rows
+        print(f"源文件 {source_runs.rows} 行，目标文件 {target_runs.rows} 行，"
+              f"匹配 {joined_runs.rows} 行（排序分段 {len(source_runs.runs) + len(target_runs.runs)} 个）")
+
+        try:
+            with PROFILER.stage("rewrite", file=target_file) as record:
+                stats, temp_path = rewrite_in_line_order(
+                    target_file, data_start, column_types, joined_runs.merged(), file_label, work_dir
+                )
+                record['rows'] = stats['data_lines']
+        except Exception as e:
+            print(f"处理{file_label}时发生错误: {str(e)}")
+            return None
+
+        try:
+            if not stats['data_lines']:
+                print(f"错误: {file_label}中没有数据行")
+                return None
+
+            stats['rewritten'] = temp_path is not None
+            # 更新记录和历史补丁从临时目录中的修改明细流式写出，需在临时目录删除前完成
+            if temp_path is not None and not commit_weight_rewrite(
+                target_file, temp_path, stats, record_dir,
+                target_file_name, direction, source_file_name
+            ):
+                return None
+        finally:
+            stats['modified_lines'].close()
+            stats['changes'].close()
+
+    # 修改明细已写入更新记录，随临时目录一起删除
+    stats = {key: value for key, value in stats.items() if key not in ('modified_lines', 'changes')}
+    if not stats['rewritten']:
+        print(f"{file_label}权重无变化，未改写: {target_file}")
+        print_rewrite_stats(stats)
+        return stats
+
+    print(f"成功更新{file_label}: {target_file}")
+    print_rewrite_stats(stats)
+    return stats
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="外存排序归并的权重同步，用于内存放不下的大文件")
+    parser.add_argument('drag_in_file', help="拖入文件（码表或权重表）")
+    parser.add_argument('--base', default="phrase_weight.txt", help="基础文件，默认为 phrase_weight.txt")
+    parser.add_argument('--direction', type=int, choices=(1, 2), default=1,
+                        help="1: 用基础文件替换拖入文件中的权重（默认）；2: 用拖入文件替换基础文件中的权重")
+    parser.add_argument('--run-size', type=int, default=DEFAULT_RUN_SIZE,
+                        help="每个排序分段的行数，决定内存占用，默认为1000000")
+    parser.add_argument('--temp-dir', default=None, help="排序分段的临时目录，默认为系统临时目录")
+    parser.add_argument('--record-dir', default=DEFAULT_RECORD_DIR, help="更新记录和历史补丁的保存目录")
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="统计各阶段的耗时、行数和内存峰值，以 JSON 记录追加到该文件，不指定文件时输出到标准错误")
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace) -> None:
+    for file_path in (args.drag_in_file, args.base):
+        if not os.path.exists(file_path):
+            print(f"错误: 文件不存在: {file_path}")
+            sys.exit(1)
+
+    if args.direction == 1:
+        print("正在执行替换方向1：用基础文件替换拖入文件中的权重（外存模式）")
+        stats = external_sync_weights(
+            args.base, args.drag_in_file, args.record_dir, "拖入文件",
+            os.path.basename(args.drag_in_file), "用基础文件替换拖入文件", "phrase_weight.txt",
+            args.run_size, args.temp_dir
+        )
+    else:
+        print("正在执行替换方向2：用拖入文件替换基础文件中的权重（外存模式）")
+        stats = external_sync_weights(
+            args.drag_in_file, args.base, args.record_dir, "基础文件",
+            "phrase_weight.txt", "用拖入文件替换基础文件", os.path.basename(args.drag_in_file),
+            args.run_size, args.temp_dir
+        )
+    if stats is None:
+        sys.exit(1)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.profile is None:
+        run(args)
+        return
+
+    PROFILER.start()
+    try:
+        run(args)
+    finally:
+        PROFILER.write(args.profile, script=os.path.basename(__file__),
+                       argv=sys.argv[1:] if argv is None else argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+流水线各阶段的耗时与内存统计，供各脚本的 --profile 选项使用
+
+被测代码用 PROFILER.stage("阶段名") 包住一个阶段，用 PROFILER.timed("子阶段名", 函数, 参数...)
+累计逐行调用的小步骤（如逐行验证）的耗时；未启用时两者几乎没有额外开销。
+内存为 tracemalloc 统计的 Python 分配峰值，不包含子进程。
+"""
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class StageProfiler:
+    """按阶段记录墙钟耗时、处理行数和内存峰值，阶段可以嵌套"""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.records: List[Dict[str, Any]] = []
+        self._stack: List[Dict[str, Any]] = []
+        self._started = 0.0
+        self._peak = 0
+
+    def reset(self) -> None:
+        """清空已有记录，用于子进程丢弃从父进程继承的状态"""
+        self.records = []
+        self._stack = []
+        self._peak = 0
+
+    def take_records(self) -> List[Dict[str, Any]]:
+        """取出已完成的记录并清空，用于子进程逐个任务传回统计结果"""
+        records, self.records = self.records, []
+        return records
+
+    def start(self) -> None:
+        """开始统计；启用 tracemalloc 后内存分配会变慢，只在需要时调用"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **info: Any) -> Iterator[Dict[str, Any]]:
+        """
+        统计一个阶段，产出该阶段的记录；阶段内可设置 record['rows'] 为处理的行数
+        未启用时产出一个不会被保存的空记录
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        current, peak_so_far = tracemalloc.get_traced_memory()
+        # 重置峰值之前先把外层阶段和整个进程到目前为止的峰值记下来
+        self._peak = max(self._peak, peak_so_far)
+        if self._stack:
+            self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak_so_far)
+        tracemalloc.reset_peak()
+
+        record = {'stage': name, **info}
+        if self._stack:
+            record['parent'] = self._stack[-1]['stage']
+        record['_start_memory'] = current
+        record['_peak'] = current
+        self.records.append(record)
+        self._stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+            start_memory = record.pop('_start_memory')
+            self._peak = max(self._peak, peak)
+            if self._stack:
+                self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+
+            record['seconds'] = round(seconds, 6)
+            rows = record.get('rows')
+            if rows is not None:
+                record['rows_per_sec'] = round(rows / seconds) if seconds > 0 else None
+            record['peak_bytes'] = peak - start_memory
+            for sub in record.get('substages', {}).values():
+                sub['seconds'] = round(sub['seconds'], 6)
+
+    def timed(self, name: str, func: Callable[..., Any], *args: Any) -> Any:
+        """调用 func(*args)，启用时把耗时和调用次数累计到当前阶段的子阶段 name 中"""
+        if not self.enabled or not self._stack:
+            return func(*args)
+
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            substages = self._stack[-1].setdefault('substages', {})
+            sub = substages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            sub['seconds'] += time.perf_counter() - start
+            sub['calls'] += 1
+
+    def add_records(self, records: List[Dict[str, Any]], **info: Any) -> None:
+        """并入子进程中统计的阶段记录，info 用于标记记录来自哪个任务"""
+        self.records.extend({**record, **info} for record in records)
+
+    def report(self, **meta: Any) -> Dict[str, Any]:
+        total = time.perf_counter() - self._started if self.enabled else 0.0
+        peak = max(self._peak, tracemalloc.get_traced_memory()[1]) if tracemalloc.is_tracing() else None
+        return {
+            **meta,
+            'total_seconds': round(total, 6),
+            'peak_bytes': peak,
+            'stages': self.records,
+        }
+
+    def write(self, target: Optional[str], **meta: Any) -> None:
+        """把统计结果写成一条 JSON 记录，target 为 None 或 '-' 时写到标准错误"""
+        text = json.dumps(self.report(**meta), ensure_ascii=False)
+        if target in (None, '-'):
+            print(text, file=sys.stderr)
+        else:
+            with open(target, 'a', encoding='utf-8') as f:
+                f.write(text + "\n")
+
+
+# 各脚本共用的统计器，由 --profile 启用
+PROFILER = StageProfiler()
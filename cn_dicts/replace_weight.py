@@ -1,44 +1,117 @@
 import os
+import argparse
+import concurrent.futures
+import contextlib
 import datetime
-import re
-from typing import Dict, List, Tuple, Optional, Any
+import gzip
+import hashlib
+import importlib
+import io
+import itertools
+import json
+import random
+import shutil
+import sys
+import tempfile
+from typing import Callable, Dict, Iterator, List, Mapping, Set, Tuple, Optional, Any
+
+from atomic_file import atomic_write, mkstemp_for
+from cjk_chars import has_han
+from compact_store import WeightStore
+from profiling import PROFILER
+from rime_dict import DEFAULT_COLUMNS, RimeDict, load_dict, parse_header
+from sync_journal import file_signature, load_journal, row_hash, save_journal, signature_matches
+from table_cache import (
+    CORRUPT_TABLE_ERRORS, CompiledTable, cache_path_for, file_digest, load_cached_table, write_compiled_table
+)
+
+
+# 列类型检测时最多采样的数据行数，避免对整个文件做统计
+COLUMN_DETECTION_SAMPLE_SIZE = 2000
+
+# 默认的更新记录保存目录
+DEFAULT_RECORD_DIR = r"D:\OneDrive\Backup\RimeSync\update_record"
+
+# 记录目录下保存压缩历史补丁的子目录
+HISTORY_DIR_NAME = "history"
+
+# 仓库根目录，历史补丁按文件相对于它的路径区分同名文件
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 文件头超过这个行数时不再保留，视为没有 Rime 文件头
+HEADER_MAX_LINES = 1000
+
+# Rime 码表的列名与本脚本列类型的对应关系
+RIME_COLUMN_TYPES = {'text': 'phrase', 'code': 'code', 'weight': 'weight'}
+
+# 三方合并时内置的冲突解决策略，也可以用 模块:函数 指定自定义策略
+MERGE_POLICIES = ('max', 'min', 'prefer-newer', 'sum')
+
+# 三方合并时屏幕上列出的冲突数
+MERGE_CONFLICT_SHOW_LIMIT = 20
+
+# 冲突解决函数: (词组, 共同快照中的权重或 None, 基础文件权重, 拖入文件权重) -> 合并后的权重，
+# 返回 None 表示无法解决，冲突保持原样
+MergePolicy = Callable[[str, Optional[int], int, int], Optional[int]]
+
+
+def classify_cell(cell: str) -> str:
+    r"""
+    判断单元格类型，返回 "weight"、"code"、"phrase" 或 "unknown"
+    等价于 -?\d+ 与 [a-z]+ 的 fullmatch，但直接使用字符串方法，不走正则
+    """
+    cell = cell.strip()
+    if not cell:
+        return "unknown"
+
+    # 权重（整数），isdecimal 与正则中的 \d 覆盖同样的字符
+    digits = cell[1:] if cell[0] == '-' else cell
+    if digits.isdecimal():
+        return "weight"
+
+    # 编码/拼音（全小写英文字母）
+    if cell.isascii() and cell.isalpha() and cell.islower():
+        return "code"
+
+    # 其他情况都认为是词组
+    return "phrase"
+
+
+def classify_row(parts: List[str]) -> List[str]:
+    """对一行的所有单元格分类，每个单元格只判断一次"""
+    return [classify_cell(cell) for cell in parts]
 
 
-def detect_column_types(data_lines: List[Tuple[int, str, str]]) -> Dict[int, str]:
+def sample_data_lines(
+    data_lines: List[Tuple[int, str, str]],
+    sample_size: int = COLUMN_DETECTION_SAMPLE_SIZE
+) -> List[Tuple[int, str, str]]:
+    """从数据行中等间隔抽取不超过 sample_size 行非空行"""
+    non_empty = [item for item in data_lines if item[1].strip()]
+    if sample_size <= 0 or len(non_empty) <= sample_size:
+        return non_empty
+
+    step = len(non_empty) / sample_size
+    return [non_empty[int(i * step)] for i in range(sample_size)]
+
+
+def detect_column_types(
+    data_lines: List[Tuple[int, str, str]],
+    sample_size: int = COLUMN_DETECTION_SAMPLE_SIZE
+) -> Dict[int, str]:
     """
     根据每行的内容特征识别每行的列类型
     返回一个字典，键为列索引，值为列类型（"phrase", "code", "weight"）
-    采用逐行分析，统计每列出现类型的频率，选择频率最高的类型
+    只分析等间隔抽样的最多 sample_size 行，统计每列出现类型的频率，选择频率最高的类型
     """
     if not data_lines:
         return {}
 
     column_stats = {}
 
-    # 收集所有非空行的数据
-    for _, line_content, _ in data_lines:
-        if not line_content.strip():
-            continue
-
-        parts = line_content.split('\t')
-
+    for _, line_content, _ in sample_data_lines(data_lines, sample_size):
         # 识别该行每个单元格的类型
-        cell_types = []
-        for cell in parts:
-            cell = cell.strip()
-            if not cell:
-                cell_types.append("unknown")
-                continue
-
-            # 检查是否为权重（整数）
-            if re.fullmatch(r'-?\d+', cell):
-                cell_types.append("weight")
-            # 检查是否为编码/拼音（全小写字母）
-            elif re.fullmatch(r'[a-z]+', cell):
-                cell_types.append("code")
-            # 其他情况都认为是词组
-            else:
-                cell_types.append("phrase")
+        cell_types = classify_row(line_content.split('\t'))
 
         # 为每列统计特征
         for i, cell_type in enumerate(cell_types):
@@ -81,32 +154,41 @@ def detect_column_types(data_lines: List[Tuple[int, str, str]]) -> Dict[int, str
     return column_types
 
 
+def declared_column_types(header_lines: List[str]) -> Optional[Dict[int, str]]:
+    """
+    '...' 之前是 Rime 码表文件头时，按声明的 columns（未声明时为 Rime 默认列）返回列类型
+    不是 Rime 文件头（没有 name 和 columns）时返回 None，由调用方抽样检测
+    """
+    try:
+        header = parse_header(header_lines)
+    except Exception:
+        return None
+
+    columns = header.get('columns')
+    if not isinstance(columns, list):
+        if 'name' not in header:
+            return None
+        columns = DEFAULT_COLUMNS
+
+    return {i: RIME_COLUMN_TYPES[name] for i, name in enumerate(columns) if name in RIME_COLUMN_TYPES}
+
+
 def analyze_row_pattern(parts: List[str]) -> Dict[int, str]:
     """
     分析单行的列模式，返回每个列索引对应的类型
     """
-    cell_types = {}
-    for i, cell in enumerate(parts):
-        cell = cell.strip()
-        if not cell:
-            cell_types[i] = "unknown"
-            continue
-
-        # 检查是否为权重（整数）
-        if re.fullmatch(r'-?\d+', cell):
-            cell_types[i] = "weight"
-        # 检查是否为编码/拼音（全小写字母）
-        elif re.fullmatch(r'[a-z]+', cell):
-            cell_types[i] = "code"
-        # 其他情况都认为是词组
-        else:
-            cell_types[i] = "phrase"
+    return dict(enumerate(classify_row(parts)))
 
-    return cell_types
 
+def validate_row_by_column_types(
+    parts: List[str],
+    column_types: Dict[int, str],
+    cell_types: Optional[List[str]] = None
+) -> List[str]:
+    """根据列类型验证行数据，cell_types 为该行已有的分类结果"""
+    if cell_types is None:
+        cell_types = classify_row(parts)
 
-def validate_row_by_column_types(parts: List[str], column_types: Dict[int, str]) -> List[str]:
-    """根据列类型验证行数据"""
     errors = []
 
     for col_idx, col_type in column_types.items():
@@ -114,29 +196,26 @@ def validate_row_by_column_types(parts: List[str], column_types: Dict[int, str])
             errors.append(f"列{col_idx}不存在")
             continue
 
-        cell = parts[col_idx].strip()
+        cell_type = cell_types[col_idx]
 
-        if not cell:
+        if cell_type == "unknown":
             errors.append(f"{col_type}列为空")
             continue
 
         if col_type == "weight":
-            if not re.fullmatch(r'-?\d+', cell):
-                errors.append(f"权重列不是整数: '{cell}'")
+            if cell_type != "weight":
+                errors.append(f"权重列不是整数: '{parts[col_idx].strip()}'")
         elif col_type == "code":
-            if not re.fullmatch(r'[a-z]+', cell):
-                errors.append(f"编码/拼音列不是小写英文字母: '{cell}'")
-        elif col_type == "phrase":
-            # 词组只需要非空即可
-            if not cell.strip():
-                errors.append(f"词组列为空")
+            if cell_type != "code":
+                errors.append(f"编码/拼音列不是小写英文字母: '{parts[col_idx].strip()}'")
 
     return errors
 
 
 def find_columns_by_type_for_row(
     parts: List[str],
-    column_types: Dict[int, str]
+    column_types: Dict[int, str],
+    cell_types: Optional[List[str]] = None
 ) -> Tuple[Optional[int], Optional[int]]:
     """
     根据列类型和行内容找到该行的词组列和权重列
@@ -156,10 +235,11 @@ def find_columns_by_type_for_row(
 
     # 如果统计类型找不到，尝试分析该行的模式
     if phrase_col is None or weight_col is None:
-        row_pattern = analyze_row_pattern(parts)
+        if cell_types is None:
+            cell_types = classify_row(parts)
 
         # 在行模式中寻找词组和权重
-        for col_idx, cell_type in row_pattern.items():
+        for col_idx, cell_type in enumerate(cell_types):
             if cell_type == "phrase" and phrase_col is None:
                 phrase_col = col_idx
             elif cell_type == "weight" and weight_col is None:
@@ -168,13 +248,77 @@ def find_columns_by_type_for_row(
     return phrase_col, weight_col
 
 
+def resolve_row_columns(
+    parts: List[str],
+    column_types: Dict[int, str]
+) -> Tuple[Optional[int], Optional[int], List[str]]:
+    """
+    对一行只分类一次，据此完成验证并确定词组列和权重列
+    返回 (phrase_col, weight_col, errors)
+    """
+    cell_types = classify_row(parts)
+    errors = validate_row_by_column_types(parts, column_types, cell_types)
+    phrase_col, weight_col = find_columns_by_type_for_row(parts, column_types, cell_types)
+
+    if phrase_col is None:
+        # 尝试查找包含汉字的列作为词组列
+        for col_idx, cell in enumerate(parts):
+            if cell_types[col_idx] != "unknown" and has_han(cell):
+                phrase_col = col_idx
+                break
+
+    return phrase_col, weight_col, errors
+
+
+def parse_weight_row(
+    line_num: int,
+    line_content: str,
+    column_types: Dict[int, str]
+) -> Optional[Tuple[str, str]]:
+    """从一行数据中取出 (词组, 权重)，无效行打印警告并返回 None"""
+    if not line_content.strip():
+        return None
+
+    parts = line_content.split('\t')
+
+    # 跳过没有足够列的行
+    if len(parts) < 2:
+        print(f"警告: 第{line_num+1}行列数不足，已跳过")
+        return None
+
+    # 验证行数据并查找该行的词组列和权重列
+    phrase_col, weight_col, errors = PROFILER.timed("validation", resolve_row_columns, parts, column_types)
+    if errors:
+        print(f"警告: 第{line_num+1}行数据验证失败: {'; '.join(errors)}")
+
+    if phrase_col is None or weight_col is None:
+        print(f"警告: 第{line_num+1}行无法确定词组列或权重列，已跳过")
+        return None
+
+    phrase = parts[phrase_col].strip()
+    weight = parts[weight_col].strip() if weight_col < len(parts) else ""
+
+    # 验证词组和权重
+    if not phrase:
+        print(f"警告: 第{line_num+1}行词组列为空，已跳过")
+        return None
+
+    if not weight and weight != "0":  # 允许权重为0
+        print(f"警告: 第{line_num+1}行权重列为空，已跳过")
+        return None
+
+    return phrase, weight
+
+
 def load_file_with_column_detection(file_path: str) -> Tuple[
-    List[str], List[Tuple[int, str, str]], Dict[int, str], Dict[str, str], Dict[str, int]
+    List[str], List[Tuple[int, str, str]], Dict[int, str], Mapping[str, str], Mapping[str, int]
 ]:
     """加载文件并检测列类型"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        with PROFILER.stage("file_read", file=file_path) as record:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            record['rows'] = len(lines)
 
         # 查找注释结束标记
         comment_lines = []
@@ -196,79 +340,277 @@ def load_file_with_column_detection(file_path: str) -> Tuple[
             data_lines = [(i, lines[i].rstrip('\n'), lines[i]) for i in range(len(lines))]
             comment_lines = []
 
-        # 检测列类型（基于统计）
-        column_types = detect_column_types(data_lines)
+        # 优先使用文件头声明的列，否则基于抽样统计检测列类型
+        with PROFILER.stage("column_detection", file=file_path):
+            column_types = declared_column_types(comment_lines[:-1]) if found_marker else None
+            if column_types is None:
+                column_types = detect_column_types(data_lines)
         print(f"列类型检测结果: {column_types}")
 
         # 构建词组到权重的映射
         phrase_to_weight = {}
         phrase_to_index = {}  # 词组到行索引的映射
 
-        for line_num, line_content, _ in data_lines:
-            if not line_content.strip():
-                continue
+        with PROFILER.stage("mapping_build", file=file_path, rows=len(data_lines)):
+            for line_num, line_content, _ in data_lines:
+                entry = parse_weight_row(line_num, line_content, column_types)
+                if entry is None:
+                    continue
 
-            parts = line_content.split('\t')
+                phrase, weight = entry
+                phrase_to_weight[phrase] = weight
+                phrase_to_index[phrase] = line_num
 
-            # 跳过没有足够列的行
-            if len(parts) < 2:
-                print(f"警告: 第{line_num+1}行列数不足，已跳过")
-                continue
+            # 打包为紧凑存储，词组到行索引的映射是同一张表上的视图
+            store = WeightStore(phrase_to_weight, phrase_to_index)
 
-            # 验证行数据
-            errors = validate_row_by_column_types(parts, column_types)
-            if errors:
-                print(f"警告: 第{line_num+1}行数据验证失败: {'; '.join(errors)}")
-
-            # 查找该行的词组列和权重列
-            phrase_col, weight_col = find_columns_by_type_for_row(parts, column_types)
-
-            if phrase_col is None:
-                # 尝试查找包含汉字的列作为词组列
-                for col_idx, cell in enumerate(parts):
-                    cell = cell.strip()
-                    if cell and re.search(r'[\u4e00-\u9fff]', cell):
-                        phrase_col = col_idx
-                        break
-
-            if weight_col is None:
-                # 尝试查找纯数字的列作为权重列
-                for col_idx, cell in enumerate(parts):
-                    cell = cell.strip()
-                    if cell and re.fullmatch(r'-?\d+', cell):
-                        weight_col = col_idx
-                        break
-
-            if phrase_col is None or weight_col is None:
-                print(f"警告: 第{line_num+1}行无法确定词组列或权重列，已跳过")
-                continue
+        return comment_lines, data_lines, column_types, store, store.line_index()
 
-            phrase = parts[phrase_col].strip()
-            weight = parts[weight_col].strip() if weight_col < len(parts) else ""
+    except Exception as e:
+        print(f"加载文件时发生错误: {str(e)}")
+        return [], [], {}, {}, {}
 
-            # 验证词组和权重
-            if not phrase:
-                print(f"警告: 第{line_num+1}行词组列为空，已跳过")
+
+def scan_file_layout(
+    file_path: str,
+    sample_size: int = COLUMN_DETECTION_SAMPLE_SIZE
+) -> Tuple[int, Dict[int, str]]:
+    """
+    第一遍流式扫描：定位'...'注释结束标记，并确定列类型
+    文件头是 Rime 码表头时直接使用声明的列，不再读取正文；
+    否则用蓄水池抽样检测列类型，内存中只保留抽样行
+    返回 (第一个数据行的行号, 列类型)
+    """
+    rng = random.Random(0)  # 固定种子，保证同一文件的检测结果稳定
+    marker_line = -1
+    header_lines = []
+    sample = []
+    seen = 0
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            line_content = line.rstrip('\n')
+
+            if marker_line < 0 and line_content.strip() == '...':
+                marker_line = i
+                column_types = declared_column_types(header_lines) if header_lines is not None else None
+                if column_types is not None:
+                    return marker_line + 1, column_types
+
+                # 标记之前的都是注释行，丢弃已抽取的样本
+                sample = []
+                seen = 0
                 continue
 
-            if not weight and weight != "0":  # 允许权重为0
-                print(f"警告: 第{line_num+1}行权重列为空，已跳过")
+            if marker_line < 0 and header_lines is not None:
+                header_lines.append(line)
+                if len(header_lines) > HEADER_MAX_LINES:
+                    header_lines = None
+
+            if not line_content.strip():
                 continue
 
-            phrase_to_weight[phrase] = weight
-            phrase_to_index[phrase] = line_num
+            seen += 1
+            if len(sample) < sample_size:
+                sample.append((i, line_content, line))
+            else:
+                j = rng.randrange(seen)
+                if j < sample_size:
+                    sample[j] = (i, line_content, line)
+
+    sample.sort()
+    return marker_line + 1, detect_column_types(sample, sample_size)
 
-        return comment_lines, data_lines, column_types, phrase_to_weight, phrase_to_index
+
+def load_weight_mapping(file_path: str) -> Tuple[Dict[int, str], Mapping[str, str]]:
+    """流式加载文件，只构建词组到权重的映射，不保留行内容；映射保存在紧凑的 WeightStore 中"""
+    try:
+        with PROFILER.stage("column_detection", file=file_path):
+            data_start, column_types = scan_file_layout(file_path)
+        print(f"列类型检测结果: {column_types}")
+
+        phrase_to_weight = {}
+        with PROFILER.stage("mapping_build", file=file_path) as record, \
+                open(file_path, 'r', encoding='utf-8') as f:
+            rows = 0
+            for line_num, line in enumerate(f):
+                if line_num < data_start:
+                    continue
+
+                rows += 1
+                entry = parse_weight_row(line_num, line.rstrip('\n'), column_types)
+                if entry is not None:
+                    phrase_to_weight[entry[0]] = entry[1]
+            record['rows'] = rows
+
+            # 打包为紧凑存储，释放解析时的临时字典
+            store = WeightStore(phrase_to_weight)
+
+        return column_types, store
 
     except Exception as e:
         print(f"加载文件时发生错误: {str(e)}")
-        return [], [], {}, {}, {}
+        return {}, {}
+
+
+def patch_weight_line(
+    line_num: int,
+    original_line: str,
+    column_types: Dict[int, str],
+    mapping: Mapping[str, str],
+    stats: Dict[str, Any],
+    file_label: str,
+    map_by_weight: bool = False
+) -> Optional[str]:
+    """
+    按映射替换单行数据的权重
+    map_by_weight 为 True 时映射的键是原权重而不是词组（用于按数值整体缩放权重）
+    返回替换后的行；行无需修改时返回 None，统计结果累加到 stats 中
+    """
+    line_content = original_line.rstrip('\n')
+
+    # 跳过空行
+    if not line_content.strip():
+        return None
+
+    stats['data_lines'] += 1
+
+    # 检查分隔符
+    if '\t' not in line_content:
+        print(f"警告: {file_label}第{line_num+1}行未找到Tab分隔符，已跳过: {line_content}")
+        stats['error_count'] += 1
+        return None
+
+    # 分割行
+    parts = line_content.split('\t')
+
+    # 验证行数据并查找该行的词组列和权重列
+    phrase_col, weight_col, errors = PROFILER.timed("validation", resolve_row_columns, parts, column_types)
+    if errors:
+        print(f"警告: {file_label}第{line_num+1}行数据验证失败: {'; '.join(errors)}")
+
+    if phrase_col is None:
+        print(f"警告: {file_label}第{line_num+1}行词组列不存在，已跳过")
+        stats['error_count'] += 1
+        return None
+
+    if weight_col is None:
+        print(f"警告: {file_label}第{line_num+1}行权重列不存在，已跳过")
+        stats['error_count'] += 1
+        return None
+
+    phrase = parts[phrase_col].strip()
+
+    # 提取原始权重
+    original_weight = parts[weight_col].strip() if weight_col < len(parts) else ""
+
+    new_weight = mapping.get(original_weight if map_by_weight else phrase)
+    if new_weight is None:
+        # 未找到，保持原样
+        stats['not_found_count'] += 1
+        return None
+
+    # 如果权重相同，不需要修改
+    if original_weight == new_weight:
+        return None
+
+    # 替换权重列并重新构建行
+    parts[weight_col] = new_weight
+
+    # 记录被修改的原始行内容
+    stats['modified_lines'].append(line_content)
+    stats['changes'].append((line_num, phrase, weight_col, original_weight, new_weight))
+    stats['updated_count'] += 1
+
+    return '\t'.join(parts) + '\n'
+
+
+def iter_patched_lines(
+    file_path: str,
+    data_start: int,
+    column_types: Dict[int, str],
+    mapping: Mapping[str, str],
+    stats: Dict[str, Any],
+    file_label: str,
+    map_by_weight: bool = False,
+    only_lines: Optional[Set[int]] = None
+) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """
+    逐行产出 (行号, 原始行, 替换后的行或 None)，注释行原样产出
+    指定 only_lines 时只检查这些行，其余行不验证、原样产出
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_num, original_line in enumerate(f):
+            if line_num < data_start or (only_lines is not None and line_num not in only_lines):
+                yield line_num, original_line, None
+            else:
+                yield line_num, original_line, patch_weight_line(
+                    line_num, original_line, column_types, mapping, stats, file_label, map_by_weight
+                )
+
+
+def stream_rewrite_weights(
+    target_file: str,
+    mapping: Mapping[str, str],
+    file_label: str,
+    map_by_weight: bool = False,
+    only_lines: Optional[Set[int]] = None
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    以流水线方式读取、替换目标文件的权重，写入同目录下的临时文件
+    直到出现第一处修改才创建临时文件，没有修改时不产生任何写入
+    返回 (统计信息, 临时文件路径)；没有修改时临时文件路径为 None
+    """
+    with PROFILER.stage("column_detection", file=target_file):
+        data_start, column_types = scan_file_layout(target_file)
+    print(f"列类型检测结果: {column_types}")
+
+    stats = {
+        'data_lines': 0,
+        'updated_count': 0,
+        'not_found_count': 0,
+        'error_count': 0,
+        'modified_lines': [],
+        'changes': []
+    }
+
+    temp_path = None
+    out = None
+
+    try:
+        with PROFILER.stage("rewrite", file=target_file) as record:
+            for line_num, original_line, new_line in iter_patched_lines(
+                target_file, data_start, column_types, mapping, stats, file_label, map_by_weight, only_lines
+            ):
+                if out is None:
+                    if new_line is None:
+                        continue
+
+                    # 第一处修改：创建临时文件并补写之前未修改的行
+                    fd, temp_path = mkstemp_for(target_file)
+                    out = os.fdopen(fd, 'w', encoding='utf-8')
+                    with open(target_file, 'r', encoding='utf-8') as src:
+                        out.writelines(itertools.islice(src, line_num))
+
+                out.write(original_line if new_line is None else new_line)
+            record['rows'] = stats['data_lines']
+    except BaseException:
+        if out is not None:
+            out.close()
+            os.remove(temp_path)
+        raise
+
+    if out is not None:
+        out.close()
+
+    return stats, temp_path
 
 
 def create_update_record(
     record_dir: str,
     script_name: str,
     timestamp: str,
+    target_file: str,
     target_file_name: str,
     updated_count: int,
     not_found_count: int,
@@ -276,17 +618,34 @@ def create_update_record(
     direction: str,
     source_file_name: str,
     modified_lines: List[str],
-    original_content: str
+    changes: List[Tuple[int, str, int, str, str]]
 ) -> Optional[str]:
-    """创建更新记录文件，不再生成单独的备份文件"""
+    """
+    创建更新记录文件，不再保存原文件的完整内容
+    修改的行以压缩补丁形式追加到历史文件，可用 --restore 恢复任意历史版本
+    """
     try:
         # 确保记录目录存在
         os.makedirs(record_dir, exist_ok=True)
 
+        # 修改的行以压缩补丁形式追加到历史文件
+        history_file = append_history_patch(
+            record_dir, target_file, timestamp, direction, source_file_name, changes
+        )
+
         # 记录文件名 - 使用Python文件名_log_时间戳
-        record_file = os.path.join(record_dir, f"{script_name}_log_{timestamp}.txt")
+        # 同一秒内有多个记录（如并行同步）时追加序号，用独占模式创建避免互相覆盖
+        suffix = 0
+        while True:
+            name = f"{script_name}_log_{timestamp}" + (f"_{suffix}" if suffix else "") + ".txt"
+            record_file = os.path.join(record_dir, name)
+            try:
+                record = open(record_file, 'x', encoding='utf-8')
+                break
+            except FileExistsError:
+                suffix += 1
 
-        with open(record_file, 'w', encoding='utf-8') as f:
+        with record as f:
             f.write(f"# 权重更新日志 - {timestamp}\n")
             f.write("*" * 30 + "\n\n")
 
@@ -301,9 +660,12 @@ def create_update_record(
             if direction == "用拖入文件替换基础文件":
                 f.write(f"源文件: {source_file_name}\n")
                 f.write(f"目标文件: phrase_weight.txt\n")
-            else:
+            elif direction == "用基础文件替换拖入文件":
                 f.write(f"源文件: phrase_weight.txt\n")
                 f.write(f"目标文件: {source_file_name}\n")
+            else:
+                f.write(f"源文件: {source_file_name}\n")
+                f.write(f"目标文件: {target_file_name}\n")
 
             f.write("\n" + "*" * 30 + "\n\n")
 
@@ -317,12 +679,11 @@ def create_update_record(
             else:
                 f.write("本次更新没有修改任何行。\n")
 
-            f.write("\n" + "*" * 30 + "\n\n")
-
-            # 第三部分：原文件内容（作为备份）
-            f.write("## 此处为原文件内容（更新前）\n")
-            f.write("-" * 40 + "\n")
-            f.write(original_content)
+            # 第三部分：历史补丁位置及恢复方法
+            if history_file:
+                f.write("\n" + "*" * 30 + "\n\n")
+                f.write(f"## 历史补丁: {history_file}\n")
+                f.write(f"恢复到更新前的版本: --restore {target_file} --to {timestamp}\n")
 
         return record_file
 
@@ -331,329 +692,765 @@ def create_update_record(
         return None
 
 
+def commit_weight_rewrite(
+    target_file: str,
+    temp_path: str,
+    stats: Dict[str, Any],
+    record_dir: str,
+    target_file_name: str,
+    direction: str,
+    source_file_name: str
+) -> bool:
+    """用临时文件原子替换目标文件，成功后写入更新记录和历史补丁"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+
+    try:
+        with PROFILER.stage("commit", file=target_file):
+            os.replace(temp_path, target_file)
+    except Exception as e:
+        print(f"写入文件时发生错误: {str(e)}")
+        os.remove(temp_path)
+        return False
+
+    # 创建更新记录（不再生成单独的备份文件）
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    with PROFILER.stage("log_writing", file=target_file, rows=stats['updated_count']):
+        record_file = create_update_record(
+            record_dir, script_name, timestamp, target_file, target_file_name,
+            stats['updated_count'], stats['not_found_count'], stats['error_count'],
+            direction, source_file_name,
+            stats['modified_lines'], stats['changes']
+        )
+
+    if record_file:
+        print(f"更新记录已保存到: {record_file}")
+
+    return True
+
+
+def print_rewrite_stats(stats: Dict[str, Any]) -> None:
+    """打印替换统计"""
+    print(f"替换了 {stats['updated_count']} 行数据")
+    print(f"未找到匹配的词组: {stats['not_found_count']} 个")
+    print(f"处理错误: {stats['error_count']} 行")
+
+
+def sync_file_weights(
+    target_file: str,
+    mapping: Mapping[str, str],
+    record_dir: str,
+    file_label: str,
+    target_file_name: str,
+    direction: str,
+    source_file_name: str,
+    map_by_weight: bool = False,
+    only_lines: Optional[Set[int]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    用映射中的权重更新目标文件，有修改时原子替换并写入更新记录
+    指定 only_lines 时只检查这些行（增量同步）
+    返回统计信息（rewritten 表示文件是否被改写），失败时返回 None
+    """
+    try:
+        stats, temp_path = stream_rewrite_weights(target_file, mapping, file_label, map_by_weight, only_lines)
+    except Exception as e:
+        print(f"处理{file_label}时发生错误: {str(e)}")
+        return None
+
+    if not stats['data_lines']:
+        print(f"错误: {file_label}中没有数据行")
+        return None
+
+    stats['rewritten'] = False
+
+    if temp_path is None:
+        print(f"{file_label}权重无变化，未改写: {target_file}")
+        print_rewrite_stats(stats)
+        return stats
+
+    if not commit_weight_rewrite(
+        target_file, temp_path, stats, record_dir,
+        target_file_name, direction, source_file_name
+    ):
+        return None
+
+    stats['rewritten'] = True
+    print(f"成功更新{file_label}: {target_file}")
+    print_rewrite_stats(stats)
+    return stats
+
+
 def replace_weights_direction1(
     drag_in_file: str,
-    base_mapping: Dict[str, str],
+    base_mapping: Mapping[str, str],
     record_dir: str
 ) -> bool:
     """方向1：用基础文件替换拖入文件中的权重"""
     print("\n正在执行替换方向1：用基础文件替换拖入文件中的权重")
 
-    # 解析拖入文件
-    drag_in_comment_lines, drag_in_data_lines, drag_in_column_types, drag_in_mapping, _ = \
-        load_file_with_column_detection(drag_in_file)
+    stats = sync_file_weights(
+        drag_in_file, base_mapping, record_dir, "拖入文件",
+        os.path.basename(drag_in_file), "用基础文件替换拖入文件", "phrase_weight.txt"
+    )
+    return stats is not None
 
-    if not drag_in_data_lines:
-        print("错误: 拖入文件中没有数据行")
-        return False
 
-    # 处理数据行
-    updated_lines = []
-    updated_count = 0
-    not_found_count = 0
-    error_count = 0
-    modified_lines = []
-
-    for line_num, line_content, original_line in drag_in_data_lines:
-        # 跳过空行
-        if not line_content.strip():
-            updated_lines.append(original_line)
-            continue
+def replace_weights_direction2(
+    drag_in_file: str,
+    base_file: str,
+    record_dir: str
+) -> bool:
+    """
+    方向2：用拖入文件替换基础文件中的权重
+    基础文件只流式改写，不需要预先加载的基础映射
+    """
+    print("\n正在执行替换方向2：用拖入文件替换基础文件中的权重")
 
-        # 检查分隔符
-        if '\t' not in line_content:
-            print(f"警告: 拖入文件第{line_num+1}行未找到Tab分隔符，已跳过: {line_content}")
-            updated_lines.append(original_line)
-            error_count += 1
-            continue
+    # 加载拖入文件（只保留词组到权重的映射）
+    _, drag_in_mapping = load_weight_mapping(drag_in_file)
 
-        # 分割行
-        parts = line_content.split('\t')
+    if not drag_in_mapping:
+        print("错误: 拖入文件中没有有效数据，无法继续")
+        return False
 
-        # 跳过没有足够列的行
-        if len(parts) < 2:
-            print(f"警告: 拖入文件第{line_num+1}行列数不足，已跳过")
-            updated_lines.append(original_line)
-            error_count += 1
-            continue
+    print(f"拖入文件中词组数量: {len(drag_in_mapping)}")
 
-        # 验证行数据
-        errors = validate_row_by_column_types(parts, drag_in_column_types)
-        if errors:
-            print(f"警告: 拖入文件第{line_num+1}行数据验证失败: {'; '.join(errors)}")
+    stats = sync_file_weights(
+        base_file, drag_in_mapping, record_dir, "基础文件",
+        "phrase_weight.txt", "用拖入文件替换基础文件", os.path.basename(drag_in_file)
+    )
+    return stats is not None
 
-        # 查找该行的词组列和权重列
-        phrase_col, weight_col = find_columns_by_type_for_row(parts, drag_in_column_types)
 
-        if phrase_col is None:
-            # 尝试查找包含汉字的列作为词组列
-            for col_idx, cell in enumerate(parts):
-                cell = cell.strip()
-                if cell and re.search(r'[\u4e00-\u9fff]', cell):
-                    phrase_col = col_idx
-                    break
+def load_merge_policy(spec: str, base_file: str, drag_in_file: str) -> MergePolicy:
+    """
+    按名称取得冲突解决函数：max/min 取较大/较小值，prefer-newer 取修改时间较新的文件中的值，
+    sum 把两边相对共同快照的变化量都累加上去，快照中没有的词组无从计算变化量，不做处理；
+    其他名称按 模块:函数 导入自定义函数
+    """
+    if spec == 'max':
+        return lambda phrase, ancestor, base, target: max(base, target)
+    if spec == 'min':
+        return lambda phrase, ancestor, base, target: min(base, target)
+    if spec == 'sum':
+        return lambda phrase, ancestor, base, target: None if ancestor is None else base + target - ancestor
+    if spec == 'prefer-newer':
+        base_newer = os.path.getmtime(base_file) >= os.path.getmtime(drag_in_file)
+        return lambda phrase, ancestor, base, target: base if base_newer else target
+
+    module_name, _, func_name = spec.partition(':')
+    if not module_name or not func_name:
+        raise ValueError(f"未知的合并策略: {spec}，可用 {', '.join(MERGE_POLICIES)} 或 模块:函数")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def parse_int_weight(weight: Optional[str]) -> Optional[int]:
+    try:
+        return int(weight) if weight is not None else None
+    except ValueError:
+        return None
 
-        if weight_col is None:
-            # 尝试查找纯数字的列作为权重列
-            for col_idx, cell in enumerate(parts):
-                cell = cell.strip()
-                if cell and re.fullmatch(r'-?\d+', cell):
-                    weight_col = col_idx
-                    break
 
-        if phrase_col is None:
-            print(f"警告: 拖入文件第{line_num+1}行词组列不存在，已跳过")
-            updated_lines.append(original_line)
-            error_count += 1
+def three_way_merge(
+    base_mapping: Mapping[str, str],
+    target_mapping: Mapping[str, str],
+    ancestor_mapping: Mapping[str, str],
+    policy: MergePolicy
+) -> Tuple[Dict[str, str], List[Tuple[str, Optional[str], str, str, Optional[str]]]]:
+    """
+    对两个文件中都有的词组做三方合并：只有一边相对共同快照改动过时取改动的一边，
+    两边都改动过（或没有快照）且不相同时为冲突，按策略解决；权重不是整数或策略无法解决的冲突保持原样
+    返回 (词组 -> 合并后的权重, 冲突列表)，冲突为 (词组, 快照权重, 基础文件权重, 拖入文件权重, 结果)
+    """
+    merged = {}
+    conflicts = []
+    for phrase, target_weight in target_mapping.items():
+        base_weight = base_mapping.get(phrase)
+        if base_weight is None:
             continue
 
-        if weight_col is None:
-            print(f"警告: 拖入文件第{line_num+1}行权重列不存在，已跳过")
-            updated_lines.append(original_line)
-            error_count += 1
+        ancestor_weight = ancestor_mapping.get(phrase)
+        if base_weight == target_weight or ancestor_weight == target_weight:
+            merged[phrase] = base_weight
+            continue
+        if ancestor_weight == base_weight:
+            merged[phrase] = target_weight
             continue
 
-        phrase = parts[phrase_col].strip()
-
-        # 提取原始权重
-        original_weight = parts[weight_col].strip() if weight_col < len(parts) else ""
-
-        # 在基础文件中查找
-        if phrase in base_mapping:
-            new_weight = base_mapping[phrase]
+        base_int, target_int = parse_int_weight(base_weight), parse_int_weight(target_weight)
+        result = None
+        if base_int is not None and target_int is not None:
+            resolved = policy(phrase, parse_int_weight(ancestor_weight), base_int, target_int)
+            if resolved is not None:
+                result = str(resolved)
+                merged[phrase] = result
+        conflicts.append((phrase, ancestor_weight, base_weight, target_weight, result))
+    return merged, conflicts
 
-            # 如果权重相同，不需要修改
-            if original_weight == new_weight:
-                updated_lines.append(original_line)
-                continue
 
-            # 替换权重列
-            parts[weight_col] = new_weight
+def merge_snapshot_path(drag_in_file: str, base_file: str) -> str:
+    """
+    上次合并后两个文件共同状态的快照，保存在拖入文件的编译表缓存目录中
+    文件名带有基础文件绝对路径的哈希，同一拖入文件与不同基础文件合并时各用各的快照
+    """
+    base_key = hashlib.sha256(os.path.normcase(os.path.abspath(base_file)).encode('utf-8')).hexdigest()[:16]
+    return cache_path_for(drag_in_file, f"merge_snapshot.{base_key}")
 
-            # 重新构建行
-            updated_line = '\t'.join(parts) + '\n'
-            updated_lines.append(updated_line)
 
-            # 记录被修改的原始行内容
-            modified_lines.append(line_content)
-            updated_count += 1
-        else:
-            # 未找到，保持原样
-            updated_lines.append(original_line)
-            not_found_count += 1
+def load_merge_snapshot(drag_in_file: str, base_file: str) -> Optional[Mapping[str, str]]:
+    snapshot_file = merge_snapshot_path(drag_in_file, base_file)
+    if not os.path.exists(snapshot_file):
+        return None
+    # 旧版本格式或已损坏的快照，按没有快照处理
+    try:
+        table = CompiledTable(snapshot_file)
+    except CORRUPT_TABLE_ERRORS:
+        return None
+    try:
+        return WeightStore.from_compiled(table)
+    except CORRUPT_TABLE_ERRORS:
+        return None
+    finally:
+        table.close()
 
-    # 读取原始拖入文件内容用于记录
-    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
 
+def write_merge_conflicts(
+    record_dir: str,
+    drag_in_file: str,
+    policy_spec: str,
+    conflicts: List[Tuple[str, Optional[str], str, str, Optional[str]]]
+) -> Optional[str]:
+    """把全部冲突写入记录目录，返回冲突记录文件路径"""
     try:
-        # 读取原始拖入文件内容
-        with open(drag_in_file, 'r', encoding='utf-8') as f:
-            original_content = f.read()
+        os.makedirs(record_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        script_name = os.path.splitext(os.path.basename(__file__))[0]
+        conflict_file = os.path.join(record_dir, f"{script_name}_merge_conflicts_{timestamp}.txt")
+        with open(conflict_file, 'w', encoding='utf-8') as f:
+            f.write(f"# 三方合并冲突 - {timestamp}\n")
+            f.write(f"# 拖入文件: {os.path.basename(drag_in_file)}\n")
+            f.write(f"# 合并策略: {policy_spec}\n")
+            f.write("# 词组\t共同快照\t基础文件\t拖入文件\t合并结果\n")
+            for phrase, ancestor, base, target, result in conflicts:
+                f.write(f"{phrase}\t{ancestor or ''}\t{base}\t{target}\t{result if result is not None else '未解决'}\n")
+        return conflict_file
     except Exception as e:
-        print(f"警告: 读取拖入文件失败: {str(e)}")
-        original_content = "无法读取原文件内容"
+        print(f"写入冲突记录时发生错误: {str(e)}")
+        return None
+
+
+def merge_weights(
+    drag_in_file: str,
+    base_file: str,
+    record_dir: str,
+    policy_spec: str = 'max',
+    ancestor_file: Optional[str] = None
+) -> bool:
+    """
+    三方合并：以共同快照为参照合并基础文件和拖入文件的权重，一次运行同时更新两个文件
+    共同快照默认使用上次合并时保存的快照，也可以用 ancestor_file 指定；两者都没有时
+    所有不同的权重都按冲突处理（sum 策略无法计算变化量，不执行合并）。合并成功后保存新的共同快照
+    """
+    print(f"\n正在执行三方合并（策略: {policy_spec}）")
 
-    # 写入更新后的拖入文件
     try:
-        with open(drag_in_file, 'w', encoding='utf-8') as f:
-            # 写入注释行
-            for line in drag_in_comment_lines:
-                f.write(line)
+        policy = load_merge_policy(policy_spec, base_file, drag_in_file)
+    except (ValueError, ImportError, AttributeError) as e:
+        print(f"错误: 无法加载合并策略 '{policy_spec}': {e}")
+        return False
 
-            # 写入数据行
-            for line in updated_lines:
-                f.write(line)
+    _, base_mapping = load_weight_mapping(base_file)
+    _, target_mapping = load_weight_mapping(drag_in_file)
+    if not base_mapping or not target_mapping:
+        print("错误: 基础文件或拖入文件中没有有效数据，无法继续")
+        return False
 
-        print(f"成功更新拖入文件: {drag_in_file}")
-        print(f"替换了 {updated_count} 行数据")
-        print(f"未找到匹配的词组: {not_found_count} 个")
-        print(f"处理错误: {error_count} 行")
+    if ancestor_file:
+        _, ancestor_mapping = load_weight_mapping(ancestor_file)
+        print(f"共同快照: {ancestor_file}")
+    else:
+        ancestor_mapping = load_merge_snapshot(drag_in_file, base_file)
+        if ancestor_mapping is None:
+            if policy_spec == 'sum':
+                print("错误: sum 策略需要共同快照，请用 --ancestor 指定，"
+                      "否则两个文件中不同的权重会被直接相加")
+                return False
+            ancestor_mapping = {}
+            print("没有共同快照，两个文件中不同的权重都按冲突处理")
+        else:
+            print(f"共同快照: 上次合并时保存的快照（{len(ancestor_mapping)} 个词组）")
+
+    merged, conflicts = three_way_merge(base_mapping, target_mapping, ancestor_mapping, policy)
+    base_changes = {phrase: weight for phrase, weight in merged.items() if base_mapping[phrase] != weight}
+    target_changes = {phrase: weight for phrase, weight in merged.items() if target_mapping[phrase] != weight}
+    unresolved = sum(1 for conflict in conflicts if conflict[4] is None)
+    print(f"共有词组: {len(merged) + unresolved} 个，冲突 {len(conflicts)} 个（未解决 {unresolved} 个）")
+    print(f"基础文件需更新 {len(base_changes)} 个词组，拖入文件需更新 {len(target_changes)} 个词组")
+
+    if conflicts:
+        print(f"冲突（前 {MERGE_CONFLICT_SHOW_LIMIT} 个）: 词组 快照 基础 拖入 -> 结果")
+        for phrase, ancestor, base, target, result in conflicts[:MERGE_CONFLICT_SHOW_LIMIT]:
+            print(f"  {phrase}\t{ancestor or '-'}\t{base}\t{target}\t-> {result if result is not None else '未解决'}")
+        conflict_file = write_merge_conflicts(record_dir, drag_in_file, policy_spec, conflicts)
+        if conflict_file:
+            print(f"冲突记录已保存到: {conflict_file}")
+
+    direction = f"三方合并（策略: {policy_spec}）"
+    success = True
+    for target_file, changes, file_label, target_name, source_name in (
+        (base_file, base_changes, "基础文件", "phrase_weight.txt", os.path.basename(drag_in_file)),
+        (drag_in_file, target_changes, "拖入文件", os.path.basename(drag_in_file), "phrase_weight.txt"),
+    ):
+        if not changes:
+            print(f"{file_label}权重无变化，未改写: {target_file}")
+            continue
+        print(f"\n--- {file_label} ---")
+        if sync_file_weights(target_file, changes, record_dir, file_label, target_name, direction, source_name) is None:
+            success = False
 
-        # 创建更新记录（不再生成单独的备份文件）
-        script_name = os.path.splitext(os.path.basename(__file__))[0]
-        record_file = create_update_record(
-            record_dir, script_name, timestamp, os.path.basename(drag_in_file),
-            updated_count, not_found_count, error_count,
-            "用基础文件替换拖入文件", "phrase_weight.txt",
-            modified_lines, original_content
-        )
+    if success:
+        # 两个文件的共有词组现在权重一致，作为下次合并的共同快照
+        stat = os.stat(drag_in_file)
+        write_compiled_table(merge_snapshot_path(drag_in_file, base_file), merged,
+                             stat.st_size, stat.st_mtime_ns, file_digest(drag_in_file))
+    return success
 
-        if record_file:
-            print(f"更新记录已保存到: {record_file}")
 
-        return True
+# 并行同步时各工作进程共享的基础映射，由进程池初始化函数设置
+_worker_base_mapping: Mapping[str, str] = {}
 
-    except Exception as e:
-        print(f"写入拖入文件时发生错误: {str(e)}")
-        return False
 
+def _init_sync_worker(base_mapping: Mapping[str, str], profile: bool = False) -> None:
+    """工作进程初始化：每个进程只接收一次基础映射，需要时在进程内开始统计各阶段"""
+    global _worker_base_mapping
+    _worker_base_mapping = base_mapping
+    if profile:
+        PROFILER.reset()
+        PROFILER.start()
 
-def replace_weights_direction2(
-    drag_in_file: str,
-    base_file: str,
+
+def _sync_table_worker(
+    table_file: str,
     record_dir: str
-) -> bool:
-    """方向2：用拖入文件替换基础文件中的权重"""
-    print("\n正在执行替换方向2：用拖入文件替换基础文件中的权重")
+) -> Tuple[str, Optional[Dict[str, Any]], str, List[Dict[str, Any]]]:
+    """在工作进程中同步一个码表，输出和阶段统计收集起来交给主进程按顺序打印、合并"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        stats = sync_file_weights(
+            table_file, _worker_base_mapping, record_dir, "码表文件",
+            os.path.basename(table_file), "用基础文件替换拖入文件", "phrase_weight.txt"
+        )
 
-    # 加载拖入文件
-    drag_in_comment_lines, drag_in_data_lines, drag_in_column_types, drag_in_mapping, _ = \
-        load_file_with_column_detection(drag_in_file)
+    if stats is not None:
+        # 修改明细已写入更新记录，不必传回主进程
+        stats = {key: value for key, value in stats.items() if key not in ('modified_lines', 'changes')}
 
-    if not drag_in_mapping:
-        print("错误: 拖入文件中没有有效数据，无法继续")
+    return table_file, stats, output.getvalue(), PROFILER.take_records()
+
+
+def sync_import_tables(
+    dict_file: str,
+    base_mapping: Mapping[str, str],
+    record_dir: str,
+    jobs: Optional[int] = None
+) -> bool:
+    """
+    非交互的批量方向1同步：用基础映射更新 dict_file 的 import_tables 中的每个码表
+    各码表在独立进程中并行处理，最后输出一份汇总
+    """
+    main_dict = load_dict(dict_file)
+    if not main_dict.import_tables:
+        print(f"错误: {dict_file} 中没有 import_tables")
         return False
 
-    print(f"拖入文件中词组数量: {len(drag_in_mapping)}")
+    tables, missing = list_import_tables(main_dict)
+
+    jobs = jobs or os.cpu_count() or 1
+    print(f"正在用 {min(jobs, len(tables))} 个进程同步 {len(tables)} 个码表...")
+
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(jobs, len(tables)) or 1,
+        initializer=_init_sync_worker,
+        initargs=(base_mapping, PROFILER.enabled)
+    ) as executor:
+        futures = [executor.submit(_sync_table_worker, table, record_dir) for table in tables]
+        for future in futures:
+            table_file, stats, output, records = future.result()
+            results[table_file] = stats
+            PROFILER.add_records(records, worker=True)
+            print(f"\n--- {os.path.basename(table_file)} ---")
+            print(output, end='')
+
+    print_sync_summary(tables, results)
+    return all(results.get(table) is not None for table in tables) and not missing
+
+
+def list_import_tables(main_dict: RimeDict) -> Tuple[List[str], List[str]]:
+    """主词库递归导入的全部码表（不含主词库本身），返回 (码表路径, 不存在的码表路径)"""
+    tables = []
+    missing = []
+    for table in main_dict.iter_tables():
+        for path in table.missing_imports():
+            print(f"警告: 码表文件不存在，已跳过: {path}")
+            missing.append(path)
+        if table is not main_dict:
+            tables.append(table.path)
+    return tables, missing
+
+
+def print_sync_summary(tables: List[str], results: Dict[str, Optional[Dict[str, Any]]]) -> None:
+    """打印批量同步的汇总"""
+    totals = {'updated_count': 0, 'not_found_count': 0, 'error_count': 0}
+    print("\n" + "=" * 60)
+    print("同步汇总:")
+    for table_file in tables:
+        stats = results.get(table_file)
+        name = os.path.basename(table_file)
+        if stats is None:
+            print(f"  {name}: 失败")
+            continue
+        for key in totals:
+            totals[key] += stats[key]
+        state = "已改写" if stats['rewritten'] else "无变化"
+        print(f"  {name}: 替换 {stats['updated_count']} 行，未找到 {stats['not_found_count']} 个，"
+              f"错误 {stats['error_count']} 行（{state}）")
+    print(f"  合计: 替换 {totals['updated_count']} 行，未找到 {totals['not_found_count']} 个，"
+          f"错误 {totals['error_count']} 行")
+    print("=" * 60)
 
-    # 加载基础文件
-    base_comment_lines, base_data_lines, base_column_types, base_mapping, _ = \
-        load_file_with_column_detection(base_file)
 
-    if not base_data_lines:
-        print("错误: 基础文件中没有数据行")
+def read_base_rows(
+    base_file: str,
+    journal: Optional[Dict[str, Any]]
+) -> Tuple[Dict[str, Any], int]:
+    """
+    计算基础文件每个数据行的哈希，哈希与日志中相同的行直接复用上次的解析结果，
+    只验证新增或修改的行；文件头有变化时重新检测列类型并验证全部行
+    返回 (新的基础文件日志, 重新验证的行数)
+    """
+    with open(base_file, 'r', encoding='utf-8') as f:
+        lines = [line.rstrip('\n') for line in f]
+
+    layout = None
+    if journal is not None:
+        data_start = journal['data_start']
+        if data_start <= len(lines) and row_hash('\n'.join(lines[:data_start])) == journal['header_hash']:
+            layout = data_start, {int(col): col_type for col, col_type in journal['column_types'].items()}
+    known = {}
+    if layout is None:
+        layout = scan_file_layout(base_file)
+    else:
+        known = {hash_value: (phrase, weight) for hash_value, phrase, weight in journal['rows']}
+    data_start, column_types = layout
+
+    rows = []
+    parsed = 0
+    for line_num in range(data_start, len(lines)):
+        hash_value = row_hash(lines[line_num])
+        entry = known.get(hash_value)
+        if entry is None:
+            parsed += 1
+            entry = parse_weight_row(line_num, lines[line_num], column_types) or (None, None)
+        rows.append((hash_value, entry[0], entry[1]))
+
+    return {
+        'data_start': data_start,
+        'header_hash': row_hash('\n'.join(lines[:data_start])),
+        'column_types': column_types,
+        'rows': rows,
+    }, parsed
+
+
+def journal_mapping(journal: Dict[str, Any]) -> Dict[str, str]:
+    """按文件顺序由日志中的行得到词组到权重的映射，与 load_weight_mapping 一样后出现的行优先"""
+    return {phrase: weight for _, phrase, weight in journal['rows'] if phrase is not None}
+
+
+def build_row_index(table_file: str) -> Dict[str, List[int]]:
+    """扫描码表，建立 词组 -> 行号 的索引；警告已在同步时输出过，这里不再重复"""
+    data_start, column_types = scan_file_layout(table_file)
+    index: Dict[str, List[int]] = {}
+    with contextlib.redirect_stdout(io.StringIO()), open(table_file, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f):
+            if line_num < data_start:
+                continue
+            entry = parse_weight_row(line_num, line.rstrip('\n'), column_types)
+            if entry is not None:
+                index.setdefault(entry[0], []).append(line_num)
+    return index
+
+
+def incremental_sync_tables(dict_file: str, base_file: str, record_dir: str) -> bool:
+    """
+    按同步日志增量执行批量方向1同步：只验证基础文件中变化的行，
+    码表自上次同步后未被改动时只改写权重有变化的词组所在的行，否则整表同步并重建索引
+    """
+    main_dict = load_dict(dict_file)
+    if not main_dict.import_tables:
+        print(f"错误: {dict_file} 中没有 import_tables")
         return False
 
-    # 处理数据行
-    updated_lines = []
-    updated_count = 0
-    not_found_count = 0
-    error_count = 0
-    modified_lines = []
-
-    for line_num, line_content, original_line in base_data_lines:
-        # 跳过空行
-        if not line_content.strip():
-            updated_lines.append(original_line)
-            continue
+    tables, missing = list_import_tables(main_dict)
 
-        # 检查分隔符
-        if '\t' not in line_content:
-            print(f"警告: 基础文件第{line_num+1}行未找到Tab分隔符，已跳过: {line_content}")
-            updated_lines.append(original_line)
-            error_count += 1
-            continue
+    base_journal = load_journal(base_file)
+    with PROFILER.stage("load_base", file=base_file) as record:
+        base_digest = file_digest(base_file).hex()
+        if base_journal is not None and base_journal.get('digest') == base_digest:
+            new_base, parsed = base_journal, 0
+        else:
+            new_base, parsed = read_base_rows(base_file, base_journal)
+        base_mapping = journal_mapping(new_base)
+        record['rows'] = len(new_base['rows'])
 
-        # 分割行
-        parts = line_content.split('\t')
+    delta = None
+    if base_journal is None:
+        print(f"基础文件中词组数量: {len(base_mapping)}（没有同步日志，全部码表完整同步）")
+    else:
+        old_mapping = journal_mapping(base_journal)
+        delta = {phrase: weight for phrase, weight in base_mapping.items() if old_mapping.get(phrase) != weight}
+        print(f"基础文件中词组数量: {len(base_mapping)}，重新验证 {parsed} 行，权重变化的词组 {len(delta)} 个")
+
+    results = {}
+    for table_file in tables:
+        print(f"\n--- {os.path.basename(table_file)} ---")
+        journal = load_journal(table_file)
+        incremental = (
+            delta is not None and journal is not None
+            and journal.get('base_digest') == base_journal['digest']
+            and signature_matches(journal, table_file)
+        )
 
-        # 跳过没有足够列的行
-        if len(parts) < 2:
-            print(f"警告: 基础文件第{line_num+1}行列数不足，已跳过")
-            updated_lines.append(original_line)
-            error_count += 1
-            continue
+        if incremental:
+            index = journal['index']
+            line_nums = {line_num for phrase in delta for line_num in index.get(phrase, ())}
+            if line_nums:
+                stats = sync_file_weights(
+                    table_file, delta, record_dir, "码表文件", os.path.basename(table_file),
+                    "用基础文件替换拖入文件", "phrase_weight.txt", only_lines=line_nums
+                )
+            else:
+                print(f"码表文件没有受影响的行，未改写: {table_file}")
+                stats = {'updated_count': 0, 'not_found_count': 0, 'error_count': 0, 'rewritten': False}
+        else:
+            if journal is not None:
+                print("码表文件或基础文件与同步日志不一致，完整同步")
+            stats = sync_file_weights(
+                table_file, base_mapping, record_dir, "码表文件", os.path.basename(table_file),
+                "用基础文件替换拖入文件", "phrase_weight.txt"
+            )
+            index = build_row_index(table_file) if stats is not None else None
+
+        results[table_file] = stats
+        if stats is not None:
+            with PROFILER.stage("journal_writing", file=table_file):
+                save_journal(table_file, {
+                    'signature': file_signature(table_file),
+                    'base_digest': base_digest,
+                    'index': index,
+                })
+
+    with PROFILER.stage("journal_writing", file=base_file, rows=len(new_base['rows'])):
+        save_journal(base_file, {**new_base, 'digest': base_digest})
+
+    print_sync_summary(tables, results)
+    return all(results.get(table) is not None for table in tables) and not missing
+
+
+def history_key(target_file: str) -> str:
+    """
+    区分历史补丁所属文件的键：仓库内的文件用相对于仓库根目录的路径（以 / 分隔），
+    在不同机器上共用记录目录时保持一致；仓库外的文件用绝对路径
+    """
+    path = os.path.normcase(os.path.abspath(target_file))
+    try:
+        relative = os.path.relpath(path, os.path.normcase(REPO_ROOT))
+    except ValueError:
+        # Windows 上不在同一个盘符
+        return path
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        return path
+    return relative.replace(os.sep, '/')
 
-        # 验证行数据
-        errors = validate_row_by_column_types(parts, base_column_types)
-        if errors:
-            print(f"警告: 基础文件第{line_num+1}行数据验证失败: {'; '.join(errors)}")
 
-        # 查找该行的词组列和权重列
-        phrase_col, weight_col = find_columns_by_type_for_row(parts, base_column_types)
+def history_file_path(record_dir: str, target_file: str) -> str:
+    """
+    目标文件对应的历史补丁文件路径
+    文件名带有 history_key 的哈希，不同目录下的同名文件（如 cn_dicts/others.dict.yaml 与 others.dict.yaml）各有各的补丁链
+    """
+    key_digest = hashlib.sha256(history_key(target_file).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(record_dir, HISTORY_DIR_NAME, f"{os.path.basename(target_file)}.{key_digest}.history.gz")
 
-        if phrase_col is None:
-            # 尝试查找包含汉字的列作为词组列
-            for col_idx, cell in enumerate(parts):
-                cell = cell.strip()
-                if cell and re.search(r'[\u4e00-\u9fff]', cell):
-                    phrase_col = col_idx
-                    break
 
-        if weight_col is None:
-            # 尝试查找纯数字的列作为权重列
-            for col_idx, cell in enumerate(parts):
-                cell = cell.strip()
-                if cell and re.fullmatch(r'-?\d+', cell):
-                    weight_col = col_idx
-                    break
+def legacy_history_file_path(record_dir: str, target_file: str) -> str:
+    """旧版本只按文件名保存的历史补丁文件路径，同名文件的补丁混在一起"""
+    return os.path.join(record_dir, HISTORY_DIR_NAME, f"{os.path.basename(target_file)}.history.gz")
 
-        if phrase_col is None:
-            print(f"警告: 基础文件第{line_num+1}行词组列不存在，已跳过")
-            updated_lines.append(original_line)
-            error_count += 1
-            continue
 
-        if weight_col is None:
-            print(f"警告: 基础文件第{line_num+1}行权重列不存在，已跳过")
-            updated_lines.append(original_line)
-            error_count += 1
-            continue
+def append_history_patch(
+    record_dir: str,
+    target_file: str,
+    timestamp: str,
+    direction: str,
+    source_file_name: str,
+    changes: List[Tuple[int, str, int, str, str]]
+) -> Optional[str]:
+    """
+    把本次修改的行作为一条压缩补丁追加到历史文件
+    每条补丁是一行 JSON，单独压缩为一个 gzip 成员，追加时无需读取已有历史
+    changes 中每项为 (行号, 词组, 权重列, 旧权重, 新权重)，可以是只能顺序迭代的文件记录：
+    逐行压缩到临时文件后再整体追加，内存占用与修改的行数无关，中途失败也不会留下残缺的补丁
+    """
+    try:
+        history_file = history_file_path(record_dir, target_file)
+        os.makedirs(os.path.dirname(history_file), exist_ok=True)
+
+        header = {
+            'time': timestamp,
+            'file': history_key(target_file),
+            'direction': direction,
+            'source': source_file_name,
+        }
+        with tempfile.TemporaryFile() as buffer:
+            with gzip.GzipFile(fileobj=buffer, mode='wb') as member, \
+                    io.TextIOWrapper(member, encoding='utf-8') as out:
+                # 与 json.dumps 整个补丁的结果逐字节相同，rows 放在最后
+                out.write(json.dumps(header, ensure_ascii=False, separators=(',', ':'))[:-1] + ',"rows":[')
+                for i, change in enumerate(changes):
+                    out.write((',' if i else '') + json.dumps(list(change), ensure_ascii=False, separators=(',', ':')))
+                out.write(']}\n')
+            buffer.seek(0)
+            with open(history_file, 'ab') as f:
+                shutil.copyfileobj(buffer, f)
+
+        return history_file
 
-        phrase = parts[phrase_col].strip()
+    except Exception as e:
+        print(f"写入历史补丁时发生错误: {str(e)}")
+        return None
 
-        # 提取原始权重
-        original_weight = parts[weight_col].strip() if weight_col < len(parts) else ""
 
-        # 在拖入文件中查找
-        if phrase in drag_in_mapping:
-            new_weight = drag_in_mapping[phrase]
+def read_history_patches(record_dir: str, target_file: str) -> List[Dict[str, Any]]:
+    """
+    按时间顺序读取目标文件的全部历史补丁
+    旧版本按文件名保存的补丁排在前面一并读取，其中可能混有其他目录下同名文件的补丁，
+    恢复时靠逐行比较词组跳过不属于该文件的行
+    """
+    patches = []
+    legacy_file = legacy_history_file_path(record_dir, target_file)
+    for history_file in (legacy_file, history_file_path(record_dir, target_file)):
+        if not os.path.exists(history_file):
+            continue
+        if history_file == legacy_file:
+            print(f"注意: 同时读取旧版本按文件名保存的历史补丁 {legacy_file}，其中可能含有其他目录下同名文件的记录")
+        with gzip.open(history_file, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    patches.append(json.loads(line))
 
-            # 如果权重相同，不需要修改
-            if original_weight == new_weight:
-                updated_lines.append(original_line)
-                continue
+    return patches
 
-            # 替换权重列
-            parts[weight_col] = new_weight
 
-            # 重新构建行
-            updated_line = '\t'.join(parts) + '\n'
-            updated_lines.append(updated_line)
+def print_history(target_file: str, record_dir: str) -> None:
+    """列出目标文件的历史版本"""
+    target_file_name = os.path.basename(target_file)
+    patches = read_history_patches(record_dir, target_file)
 
-            # 记录被修改的原始行内容
-            modified_lines.append(line_content)
-            updated_count += 1
-        else:
-            # 未找到，保持原样
-            updated_lines.append(original_line)
-            not_found_count += 1
+    if not patches:
+        print(f"没有找到 {target_file_name} 的历史记录")
+        return
 
-    # 读取原始基础文件内容用于记录
-    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    print(f"{target_file_name} 共有 {len(patches)} 条历史记录:")
+    for patch in patches:
+        print(f"  {patch['time']}  修改 {len(patch['rows'])} 行  {patch['direction']}  源文件: {patch['source']}")
 
-    try:
-        # 读取原始基础文件内容
-        with open(base_file, 'r', encoding='utf-8') as f:
-            original_content = f.read()
-    except Exception as e:
-        print(f"警告: 读取基础文件失败: {str(e)}")
-        original_content = "无法读取原文件内容"
 
-    # 写入更新后的基础文件
-    try:
-        with open(base_file, 'w', encoding='utf-8') as f:
-            # 写入注释行
-            for line in base_comment_lines:
-                f.write(line)
+def restore_file_version(
+    target_file: str,
+    record_dir: str,
+    timestamp: str,
+    output_file: Optional[str] = None
+) -> bool:
+    """
+    恢复目标文件到时间戳为 timestamp 的那次更新之前的版本
+    从新到旧依次撤销该时间点及之后的补丁；同一行被多次修改时取最早一次的旧权重，
+    因此只需对当前文件做一遍流式改写
+    未指定 output_file 时原地恢复，并把恢复本身也记为一条补丁
+    """
+    target_file_name = os.path.basename(target_file)
+    patches = read_history_patches(record_dir, target_file)
+    undo_patches = [patch for patch in patches if patch['time'] >= timestamp]
+
+    if not undo_patches:
+        print(f"错误: {target_file_name} 在 {timestamp} 及之后没有历史记录")
+        return False
 
-            # 写入数据行
-            for line in updated_lines:
-                f.write(line)
+    # 行号 -> (当前应为的词组, 权重列, 当前应为的权重, 恢复后的权重)
+    restore_rows = {}
+    for patch in reversed(undo_patches):
+        for line_num, phrase, weight_col, old_weight, new_weight in patch['rows']:
+            if line_num in restore_rows:
+                phrase, _, new_weight, _ = restore_rows[line_num]
+            restore_rows[line_num] = (phrase, weight_col, new_weight, old_weight)
+
+    # 词组列按与 patch_weight_line 相同的方式确定，保证与补丁中记录的词组可比
+    _, column_types = scan_file_layout(target_file)
+    changes = []
+    skipped = []
+
+    def iter_restored_lines(src) -> Iterator[str]:
+        for line_num, line in enumerate(src):
+            if line_num not in restore_rows:
+                yield line
+                continue
 
-        print(f"成功更新基础文件: {base_file}")
-        print(f"替换了 {updated_count} 行数据")
-        print(f"未找到匹配的词组: {not_found_count} 个")
-        print(f"处理错误: {error_count} 行")
+            recorded_phrase, weight_col, current, old_weight = restore_rows[line_num]
+            parts = line.rstrip('\n').split('\t')
+            if weight_col >= len(parts):
+                print(f"警告: 第{line_num+1}行列数不足，无法恢复")
+                skipped.append(line_num)
+                yield line
+                continue
 
-        # 创建更新记录（不再生成单独的备份文件）
-        script_name = os.path.splitext(os.path.basename(__file__))[0]
-        record_file = create_update_record(
-            record_dir, script_name, timestamp, "phrase_weight.txt",
-            updated_count, not_found_count, error_count,
-            "用拖入文件替换基础文件", os.path.basename(drag_in_file),
-            modified_lines, original_content
-        )
+            # 补丁之后插入或删除过行时，行号对应的已是别的词组，不能按行号写回旧权重
+            phrase_col, _, _ = resolve_row_columns(parts, column_types)
+            phrase = parts[phrase_col].strip() if phrase_col is not None else ""
+            if phrase != recorded_phrase:
+                print(f"警告: 第{line_num+1}行当前词组 '{phrase}' 与历史记录 '{recorded_phrase}' 不一致，已跳过")
+                skipped.append(line_num)
+                yield line
+                continue
 
-        if record_file:
-            print(f"更新记录已保存到: {record_file}")
+            if parts[weight_col].strip() != current:
+                print(f"警告: 第{line_num+1}行当前权重 '{parts[weight_col].strip()}' "
+                      f"与历史记录 '{current}' 不一致，仍按历史记录恢复")
 
-        return True
+            changes.append((line_num, phrase, weight_col, parts[weight_col].strip(), old_weight))
+            parts[weight_col] = old_weight
+            yield '\t'.join(parts) + '\n'
 
+    destination = output_file or target_file
+    try:
+        with atomic_write(destination) as out, open(target_file, 'r', encoding='utf-8') as src:
+            out.writelines(iter_restored_lines(src))
     except Exception as e:
-        print(f"写入基础文件时发生错误: {str(e)}")
+        print(f"恢复文件时发生错误: {str(e)}")
         return False
 
+    print(f"已撤销 {len(undo_patches)} 条补丁，恢复了 {len(changes)} 行")
+    if skipped:
+        print(f"有 {len(skipped)} 行与历史记录不符未恢复，行号: {', '.join(str(n + 1) for n in skipped[:20])}"
+              + (" ……" if len(skipped) > 20 else ""))
+    print(f"恢复结果已写入: {destination}")
+
+    if output_file is None and changes:
+        now = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        append_history_patch(
+            record_dir, target_file, now, f"恢复到 {timestamp} 之前的版本", target_file_name, changes
+        )
+
+    return True
+
 
 def get_file_path() -> str:
     """获取用户输入的文件路径"""
@@ -671,8 +1468,103 @@ def get_file_path() -> str:
     return file_path
 
 
-def main() -> None:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """解析命令行参数；不带参数时进入交互模式"""
+    parser = argparse.ArgumentParser(description="文件权重更新工具")
+    parser.add_argument('--record-dir', default=DEFAULT_RECORD_DIR,
+                        help="更新记录和历史补丁的保存目录")
+    parser.add_argument('--history', metavar='FILE',
+                        help="列出文件的权重更新历史")
+    parser.add_argument('--restore', metavar='FILE',
+                        help="按历史补丁恢复文件的旧版本，需配合 --to 使用")
+    parser.add_argument('--to', metavar='TIMESTAMP',
+                        help="恢复到该时间戳那次更新之前的版本")
+    parser.add_argument('--output', metavar='FILE',
+                        help="恢复结果另存为该文件，默认原地恢复")
+    parser.add_argument('--sync-all', metavar='DICT_FILE',
+                        help="非交互模式：用基础文件并行更新该词库 import_tables 中的全部码表")
+    parser.add_argument('--base', default="phrase_weight.txt",
+                        help="基础文件，默认为 phrase_weight.txt")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="并行同步的进程数，默认为CPU核数")
+    parser.add_argument('--merge', metavar='FILE',
+                        help="非交互模式：三方合并基础文件和该文件的权重，同时更新两个文件")
+    parser.add_argument('--ancestor', metavar='FILE',
+                        help="三方合并的共同快照，默认使用上次合并时保存的快照")
+    parser.add_argument('--policy', default='max',
+                        help="三方合并的冲突解决策略: max（默认）、min、prefer-newer、sum，或 模块:函数；"
+                             "sum 需要共同快照（--ancestor 或上次合并保存的快照）")
+    parser.add_argument('--incremental', action='store_true',
+                        help="与 --sync-all 一起使用：按同步日志只处理基础文件中变化的行，首次运行时完整同步并建立日志")
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="统计各阶段的耗时、行数和内存峰值，以 JSON 记录追加到该文件，不指定文件时输出到标准错误")
+
+    args = parser.parse_args(argv)
+    if args.restore and not args.to:
+        parser.error("--restore 需要同时指定 --to")
+    if args.incremental and not args.sync_all:
+        parser.error("--incremental 需要同时指定 --sync-all")
+    if args.ancestor and not args.merge:
+        parser.error("--ancestor 需要同时指定 --merge")
+
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
     """主函数"""
+    args = parse_args(argv)
+    if args.profile is None:
+        run(args)
+        return
+
+    PROFILER.start()
+    try:
+        run(args)
+    finally:
+        PROFILER.write(args.profile, script=os.path.basename(__file__),
+                       argv=sys.argv[1:] if argv is None else argv)
+
+
+def run(args: argparse.Namespace) -> None:
+    """按命令行参数执行；没有指定非交互操作时进入交互模式"""
+    record_dir = args.record_dir
+
+    if args.history:
+        print_history(args.history, record_dir)
+        return
+
+    if args.restore:
+        restore_file_version(args.restore, record_dir, args.to, args.output)
+        return
+
+    if args.merge:
+        for file_path in (args.merge, args.base):
+            if not os.path.exists(file_path):
+                print(f"错误: 文件 '{file_path}' 不存在")
+                sys.exit(1)
+        if not merge_weights(args.merge, args.base, record_dir, args.policy, args.ancestor):
+            sys.exit(1)
+        return
+
+    if args.sync_all:
+        if not os.path.exists(args.base):
+            print(f"错误: 基础文件 '{args.base}' 不存在")
+            sys.exit(1)
+        if args.incremental:
+            if not incremental_sync_tables(args.sync_all, args.base, record_dir):
+                sys.exit(1)
+            return
+        with PROFILER.stage("load_base", file=args.base) as record:
+            base_mapping = load_cached_table(
+                args.base, "weight_mapping", lambda file_path: load_weight_mapping(file_path)[1],
+                WeightStore.from_compiled
+            )
+            record['rows'] = len(base_mapping)
+        print(f"基础文件中词组数量: {len(base_mapping)}")
+        if not sync_import_tables(args.sync_all, base_mapping, record_dir, args.jobs):
+            sys.exit(1)
+        return
+
     print("=" * 60)
     print("文件权重更新工具")
     print("程序名称: 智能文件权重同步器")
@@ -713,12 +1605,14 @@ def main() -> None:
 
     # 加载基础文件
     print("\n正在加载基础文件...")
-    base_comment_lines, base_data_lines, base_column_types, base_mapping, base_indices = \
-        load_file_with_column_detection(base_file)
+    with PROFILER.stage("load_base", file=base_file) as record:
+        base_mapping = load_cached_table(
+            base_file, "weight_mapping", lambda file_path: load_weight_mapping(file_path)[1],
+            WeightStore.from_compiled
+        )
+        record['rows'] = len(base_mapping)
     print(f"基础文件中词组数量: {len(base_mapping)}")
 
-    # 设置记录文件保存目录
-    record_dir = r"D:\OneDrive\Backup\RimeSync\update_record"
     print(f"备份或更新日志文件将保存到: {record_dir}")
 
     # 文件处理计数
@@ -735,13 +1629,14 @@ def main() -> None:
         print("请选择替换方向:")
         print("  1. 用基础文件(phrase_weight.txt)替换拖入文件中的权重 (默认)")
         print("  2. 用拖入文件替换基础文件(phrase_weight.txt)中的权重")
+        print("  3. 三方合并，同时更新两个文件（冲突时取较大的权重）")
         print("  (输入q或连续两个回车退出)")
 
         direction = 1  # 默认方向为1
         direction_empty_count = 0
 
         while True:
-            choice = input("请选择 (1/2，回车默认为1): ").strip()
+            choice = input("请选择 (1/2/3，回车默认为1): ").strip()
 
             if choice.lower() == 'q':
                 print("\n用户输入q，程序退出。")
@@ -761,8 +1656,11 @@ def main() -> None:
                 elif choice == '2':
                     direction = 2
                     break
+                elif choice == '3':
+                    direction = 3
+                    break
                 else:
-                    print("输入错误，请输入1或2，或直接回车使用默认值1")
+                    print("输入错误，请输入1、2或3，或直接回车使用默认值1")
 
         # 获取拖入文件路径
         print("\n请拖入文件或输入文件路径 (输入q或连续两个回车退出):")
@@ -801,8 +1699,15 @@ def main() -> None:
         # 根据选择的方向执行相应的替换操作
         if direction == 1:
             success = replace_weights_direction1(file_path, base_mapping, record_dir)
-        else:
+        elif direction == 2:
             success = replace_weights_direction2(file_path, base_file, record_dir)
+        else:
+            success = merge_weights(file_path, base_file, record_dir)
+            # 合并会改写基础文件，重新加载基础映射供之后的方向1使用
+            base_mapping = load_cached_table(
+                base_file, "weight_mapping", lambda file_path: load_weight_mapping(file_path)[1],
+                WeightStore.from_compiled
+            )
 
         if success:
             print(f"\n✓ 文件处理成功！")
@@ -0,0 +1,179 @@
+"""
+权重缩放：把一个码表的全部权重映射到参考码表的权重分布上，用于统一 rime_ice、8105、41448
+与五笔码表之间尺度不同的权重，再通过 replace_weight.py 的逐行改写写回，只改权重列。
+
+缩放方法:
+    quantile  分位数映射：按权重在本表中的分位数取参考表同一分位数的权重，排序不变
+    log       对数映射：log(1+权重) 线性映射到参考表的对数区间后还原
+    minmax    线性映射：本表的最小、最大值对应参考表的最小、最大值
+
+安装了 NumPy 时整表一次向量化计算，否则退回纯 Python 实现，两者结果相同。
+相同的原权重总是映射到相同的新权重，因此按原权重改写，同一词组出现多次时也不会混淆。
+
+用法:
+    python rescale_weight.py 8105.dict.yaml --reference wubi.user.dict.yaml
+    python rescale_weight.py 41448.dict.yaml --reference phrase_weight.txt --method log --dry-run
+"""
+import argparse
+import bisect
+import math
+import os
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from profiling import PROFILER
+from replace_weight import DEFAULT_RECORD_DIR, parse_weight_row, scan_file_layout, sync_file_weights
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+METHODS = ('quantile', 'log', 'minmax')
+
+
+def load_weights(file_path: str) -> Tuple[List[int], Dict[str, int]]:
+    """
+    流式读取文件中全部数据行的权重（同一词组出现多次时每行都计入）
+    返回 (权重列表, 原权重文本到整数的映射)；权重不是整数的行不参与缩放
+    """
+    data_start, column_types = scan_file_layout(file_path)
+    weights = []
+    raw_values: Dict[str, int] = {}
+    with PROFILER.stage("file_read", file=file_path) as record, \
+            open(file_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f):
+            if line_num < data_start:
+                continue
+            entry = parse_weight_row(line_num, line.rstrip('\n'), column_types)
+            if entry is None:
+                continue
+            raw = entry[1]
+            value = raw_values.get(raw)
+            if value is None:
+                try:
+                    value = raw_values[raw] = int(raw)
+                except ValueError:
+                    continue
+            weights.append(value)
+        record['rows'] = len(weights)
+    return weights, raw_values
+
+
+def _interpolate(sorted_values: Sequence[float], p: float) -> float:
+    """已排序序列的 p 分位数，按线性插值计算（与 numpy.quantile 的默认方式相同）"""
+    position = p * (len(sorted_values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _rescale_python(values: List[int], source: List[int], reference: List[int], method: str) -> List[float]:
+    """纯 Python 实现：values 为本表中互不相同的权重（已排序），返回对应的新权重"""
+    source = sorted(source)
+    reference = sorted(reference)
+
+    if method == 'quantile':
+        n = len(source)
+        result = []
+        for value in values:
+            # 中位秩：相同权重取其所在区间的中点，保证相同权重映射到同一分位数
+            less = bisect.bisect_left(source, value)
+            equal = bisect.bisect_right(source, value) - less
+            result.append(_interpolate(reference, (less + equal / 2) / n))
+        return result
+
+    if method == 'log':
+        transform, inverse = (lambda x: math.log1p(max(x, 0))), math.expm1
+    else:
+        transform, inverse = (lambda x: x), (lambda x: x)
+
+    low, high = transform(source[0]), transform(source[-1])
+    ref_low, ref_high = transform(reference[0]), transform(reference[-1])
+    if high == low:
+        return [inverse((ref_low + ref_high) / 2)] * len(values)
+    scale = (ref_high - ref_low) / (high - low)
+    return [inverse(ref_low + (transform(value) - low) * scale) for value in values]
+
+
+def _rescale_numpy(values: List[int], source: List[int], reference: List[int], method: str) -> List[float]:
+    """NumPy 实现：整表一次向量化计算，参数和返回值与 _rescale_python 相同"""
+    values_array = np.asarray(values, dtype=np.float64)
+    source_array = np.sort(np.asarray(source, dtype=np.float64))
+    reference_array = np.asarray(reference, dtype=np.float64)
+
+    if method == 'quantile':
+        less = np.searchsorted(source_array, values_array, side='left')
+        equal = np.searchsorted(source_array, values_array, side='right') - less
+        return np.quantile(reference_array, (less + equal / 2) / len(source_array)).tolist()
+
+    if method == 'log':
+        transform, inverse = (lambda x: np.log1p(np.maximum(x, 0))), np.expm1
+    else:
+        transform, inverse = (lambda x: x), (lambda x: x)
+
+    transformed = transform(values_array)
+    low, high = transform(source_array[[0, -1]])
+    ref_low, ref_high = transform(np.array([reference_array.min(), reference_array.max()]))
+    if high == low:
+        return inverse(np.full(len(values_array), (ref_low + ref_high) / 2)).tolist()
+    return inverse(ref_low + (transformed - low) * ((ref_high - ref_low) / (high - low))).tolist()
+
+
+def build_rescale_mapping(
+    source: List[int],
+    raw_values: Dict[str, int],
+    reference: List[int],
+    method: str
+) -> Dict[str, str]:
+    """计算 原权重文本 -> 新权重文本 的映射，新权重四舍五入为整数"""
+    values = sorted(set(raw_values.values()))
+    rescale = _rescale_numpy if np is not None else _rescale_python
+    with PROFILER.stage("rescale", method=method, rows=len(source)):
+        new_values = dict(zip(values, rescale(values, source, reference, method)))
+    return {raw: str(int(round(new_values[value]))) for raw, value in raw_values.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="按参考码表的权重分布缩放码表权重")
+    parser.add_argument('target', help="要缩放权重的码表或权重文件")
+    parser.add_argument('--reference', required=True, help="提供目标权重分布的参考文件")
+    parser.add_argument('--method', choices=METHODS, default='quantile',
+                        help="缩放方法: quantile 分位数映射（默认）、log 对数映射、minmax 线性映射")
+    parser.add_argument('--record-dir', default=DEFAULT_RECORD_DIR, help="更新记录和历史补丁的保存目录")
+    parser.add_argument('--dry-run', action='store_true', help="只打印缩放前后的权重对照，不改写文件")
+    args = parser.parse_args(argv)
+
+    for file_path in (args.target, args.reference):
+        if not os.path.exists(file_path):
+            print(f"错误: 文件不存在: {file_path}")
+            sys.exit(1)
+
+    source, raw_values = load_weights(args.target)
+    reference, _ = load_weights(args.reference)
+    if not source or not reference:
+        print("错误: 目标文件或参考文件中没有整数权重，无法缩放")
+        sys.exit(1)
+
+    print(f"目标文件: {len(source)} 行，权重 {min(source)} ~ {max(source)}")
+    print(f"参考文件: {len(reference)} 行，权重 {min(reference)} ~ {max(reference)}")
+    print(f"缩放方法: {args.method}{'' if np is not None else '（未安装 NumPy，使用纯 Python 实现）'}")
+
+    mapping = build_rescale_mapping(source, raw_values, reference, args.method)
+
+    if args.dry_run:
+        for raw, value in sorted(raw_values.items(), key=lambda item: item[1]):
+            print(f"{raw}\t{mapping[raw]}")
+        return
+
+    stats = sync_file_weights(
+        args.target, mapping, args.record_dir, "目标文件", os.path.basename(args.target),
+        f"按参考文件的权重分布缩放（{args.method}）", os.path.basename(args.reference),
+        map_by_weight=True
+    )
+    if stats is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
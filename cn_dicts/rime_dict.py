@@ -0,0 +1,382 @@
+"""
+Rime 词库文件（*.dict.yaml）读取工具
+
+文件头只用到 YAML 的一个小子集（映射、列表、行内列表、带引号的字符串、注释），
+这里用一个简单的缩进解析器读取，不依赖第三方 YAML 库。
+
+load_dict 打开一个码表的导入图：递归跟随 import_tables，按文件头声明的 columns
+产出带来源码表的 DictEntry，各码表正文在首次访问时才读取。
+"""
+import os
+from array import array
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, TextIO, Tuple, Union
+
+
+def _strip_comment(line: str) -> str:
+    """去掉不在引号内、位于行首或空白之后的 # 注释"""
+    quote = None
+    for i, ch in enumerate(line):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ('"', "'"):
+            quote = ch
+        elif ch == '#' and (i == 0 or line[i - 1] in ' \t'):
+            return line[:i].rstrip()
+    return line.rstrip()
+
+
+def _parse_scalar(text: str) -> Any:
+    """解析标量：带引号的字符串、行内列表、整数、布尔值，其余按字符串处理"""
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in ('"', "'"):
+        return text[1:-1]
+    if text.startswith('[') and text.endswith(']'):
+        inner = text[1:-1].strip()
+        return [_parse_scalar(item) for item in inner.split(',')] if inner else []
+    if text in ('true', 'false'):
+        return text == 'true'
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def _split_key(content: str) -> Optional[Tuple[str, str]]:
+    """拆分 "键: 值"，不是映射项时返回 None"""
+    if content.startswith(('"', "'")):
+        return None
+    key, sep, rest = content.partition(':')
+    if not sep or (rest and not rest.startswith((' ', '\t'))):
+        return None
+    return key.strip(), rest.strip()
+
+
+def _parse_block(lines: List[Tuple[int, str]], i: int, indent: int) -> Tuple[Any, int]:
+    """从第 i 行开始解析缩进为 indent 的块，返回 (值, 下一行位置)"""
+    if lines[i][1].startswith('-'):
+        return _parse_list(lines, i, indent)
+    return _parse_mapping(lines, i, indent)
+
+
+def _parse_value(lines: List[Tuple[int, str]], i: int, indent: int, rest: str) -> Tuple[Any, int]:
+    """解析键或列表项后面的值，值为空时读取下面缩进更深的块"""
+    if rest:
+        return _parse_scalar(rest), i
+    if i < len(lines):
+        child_indent, child = lines[i]
+        if child_indent > indent or (child_indent == indent and child.startswith('-')):
+            return _parse_block(lines, i, child_indent)
+    return None, i
+
+
+def _parse_mapping(lines: List[Tuple[int, str]], i: int, indent: int) -> Tuple[Dict[str, Any], int]:
+    result = {}
+    while i < len(lines) and lines[i][0] >= indent:
+        if lines[i][0] > indent:
+            # 多行的行内列表、| 块文本等不支持的续行，跳过
+            i += 1
+            continue
+        if lines[i][1].startswith('-'):
+            break
+        pair = _split_key(lines[i][1])
+        if pair is None:
+            i += 1
+            continue
+        key, rest = pair
+        result[key], i = _parse_value(lines, i + 1, indent, rest)
+    return result, i
+
+
+def _parse_list(lines: List[Tuple[int, str]], i: int, indent: int) -> Tuple[List[Any], int]:
+    result = []
+    while i < len(lines) and lines[i][0] == indent and lines[i][1].startswith('-'):
+        content = lines[i][1][1:].lstrip()
+        if not content:
+            item, i = _parse_value(lines, i + 1, indent, "")
+        elif _split_key(content) is not None:
+            # "- 键: 值" 开头的映射项，后续键与第一个键对齐
+            item_indent = indent + len(lines[i][1]) - len(content)
+            lines[i] = (item_indent, content)
+            item, i = _parse_mapping(lines, i, item_indent)
+        else:
+            item, i = _parse_scalar(content), i + 1
+        result.append(item)
+    return result, i
+
+
+def parse_header(text_lines: List[str]) -> Dict[str, Any]:
+    """解析文件头文本行（'---' 与 '...' 之间的部分）"""
+    lines = []
+    for raw in text_lines:
+        content = _strip_comment(raw.rstrip('\n'))
+        if not content.strip() or content.strip() == '---':
+            continue
+        lines.append((len(content) - len(content.lstrip()), content.strip()))
+
+    if not lines:
+        return {}
+
+    header, _ = _parse_mapping(lines, 0, lines[0][0])
+    return header
+
+
+def read_header_lines(f: TextIO) -> Optional[List[str]]:
+    """从文件开头读到 '...' 结束标记，返回标记之前的行；没有标记时返回 None"""
+    header_lines = []
+    for line in f:
+        if line.strip() == '...':
+            return header_lines
+        header_lines.append(line)
+    return None
+
+
+def read_schema(schema_file: str) -> Dict[str, Any]:
+    """读取 *.schema.yaml 方案文件（整个文件都是 YAML）"""
+    with open(schema_file, 'r', encoding='utf-8') as f:
+        return parse_header(f.readlines())
+
+
+def read_dict_header(dict_file: str) -> Dict[str, Any]:
+    """读取 *.dict.yaml 的文件头，没有 '...' 结束标记时返回空字典"""
+    with open(dict_file, 'r', encoding='utf-8') as f:
+        header_lines = read_header_lines(f)
+    return parse_header(header_lines) if header_lines is not None else {}
+
+
+def resolve_table_path(base_dir: str, table_name: str) -> str:
+    """
+    按 Rime 的规则把 import_tables 中的码表名解析为文件路径：
+    嵌套导入的码表也相对于最外层词库所在的目录 base_dir，而不是导入它的码表所在的目录
+    """
+    return os.path.join(base_dir, f"{table_name}.dict.yaml")
+
+
+# 文件头未声明 columns 时 Rime 使用的默认列
+DEFAULT_COLUMNS = ['text', 'code', 'weight']
+
+
+def column_indexes(columns: List[str]) -> Tuple[int, Optional[int], Optional[int], Optional[int]]:
+    """返回 text、code、weight、stem 各列的位置，未声明的列为 None（text 缺省为第0列）"""
+    def index_of(name: str) -> Optional[int]:
+        return columns.index(name) if name in columns else None
+
+    text_col = index_of('text')
+    return (0 if text_col is None else text_col), index_of('code'), index_of('weight'), index_of('stem')
+
+
+def _cell(parts: List[str], col: Optional[int]) -> str:
+    return parts[col] if col is not None and col < len(parts) else ""
+
+
+class DictEntry(NamedTuple):
+    """码表中的一个词条，weight 为空或不是整数时为 None，source 为所在码表的文件路径"""
+    text: str
+    code: str
+    weight: Optional[int]
+    stem: str
+    source: str
+    line_num: int
+
+
+def _parse_weight(weight: str) -> Optional[int]:
+    try:
+        return int(weight)
+    except ValueError:
+        return None
+
+
+# EntryTable 中表示没有权重的值，以及 array('i') 能保存的权重范围
+_NO_WEIGHT = -2 ** 31
+_WEIGHT_MAX = 2 ** 31 - 1
+
+
+class EntryTable(Sequence[DictEntry]):
+    """
+    一个码表全部词条的紧凑存储，按下标或迭代访问时才生成 DictEntry
+    词组、编码、造词码依次以 UTF-8 写入同一个 bytearray（各后跟一个 \\0），
+    权重和行号存入 array，每个词条不再保留单独的元组、字符串和整数对象
+    """
+
+    __slots__ = ('source', '_strings', '_offsets', '_weights', '_lines', '_big_weights')
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self._strings = bytearray()
+        self._offsets = array('I', [0])
+        self._weights = array('i')
+        self._lines = array('I')
+        # 超出 32 位范围的权重
+        self._big_weights: Dict[int, int] = {}
+
+    def append(self, entry: DictEntry) -> None:
+        index = len(self._lines)
+        self._strings += f"{entry.text}\0{entry.code}\0{entry.stem}\0".encode('utf-8')
+        self._offsets.append(len(self._strings))
+        weight = entry.weight
+        if weight is None:
+            self._weights.append(_NO_WEIGHT)
+        elif _NO_WEIGHT < weight <= _WEIGHT_MAX:
+            self._weights.append(weight)
+        else:
+            self._weights.append(0)
+            self._big_weights[index] = weight
+        self._lines.append(entry.line_num)
+
+    def _weight(self, index: int) -> Optional[int]:
+        if self._big_weights and index in self._big_weights:
+            return self._big_weights[index]
+        weight = self._weights[index]
+        return None if weight == _NO_WEIGHT else weight
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[DictEntry, List[DictEntry]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("词条下标超出范围")
+        start, end = self._offsets[index], self._offsets[index + 1] - 1
+        text, code, stem = self._strings[start:end].decode('utf-8').split('\0')
+        return DictEntry(text, code, self._weight(index), stem, self.source, self._lines[index])
+
+    def __iter__(self) -> Iterator[DictEntry]:
+        if not self._lines:
+            return
+        # 整块解码后按 \0 切分，比逐条解码快得多
+        fields = self._strings[:-1].decode('utf-8').split('\0')
+        for index, line_num in enumerate(self._lines):
+            yield DictEntry(fields[3 * index], fields[3 * index + 1], self._weight(index),
+                            fields[3 * index + 2], self.source, line_num)
+
+
+class RimeDict:
+    """
+    一个 *.dict.yaml 码表及其 import_tables 组成的导入图
+    文件头在首次访问属性时读取，码表正文在首次访问 entries 时才加载；
+    同一个导入图中的码表按绝对路径共享，被多次导入的码表只读取一次
+    """
+
+    def __init__(
+        self,
+        path: str,
+        registry: Optional[Dict[str, 'RimeDict']] = None,
+        base_dir: Optional[str] = None
+    ) -> None:
+        self.path = os.path.abspath(path)
+        # Rime 按用户目录解析 import_tables，导入图中的码表都相对于最外层码表所在目录
+        self.base_dir = base_dir or os.path.dirname(self.path)
+        self._registry = {} if registry is None else registry
+        self._registry.setdefault(self.path, self)
+        self._header: Optional[Dict[str, Any]] = None
+        self._entries: Optional[EntryTable] = None
+
+    def __repr__(self) -> str:
+        loaded = "已加载" if self._entries is not None else "未加载"
+        return f"<RimeDict {self.name} {loaded}>"
+
+    @property
+    def header(self) -> Dict[str, Any]:
+        if self._header is None:
+            self._header = read_dict_header(self.path)
+        return self._header
+
+    @property
+    def name(self) -> str:
+        return str(self.header.get('name') or os.path.basename(self.path))
+
+    @property
+    def columns(self) -> List[str]:
+        return self.header.get('columns') or DEFAULT_COLUMNS
+
+    @property
+    def sort(self) -> str:
+        return self.header.get('sort') or 'by_weight'
+
+    @property
+    def encoder(self) -> Dict[str, Any]:
+        return self.header.get('encoder') or {}
+
+    @property
+    def import_tables(self) -> List[str]:
+        """import_tables 中各码表的文件路径"""
+        return [resolve_table_path(self.base_dir, str(name)) for name in self.header.get('import_tables') or []]
+
+    @property
+    def imports(self) -> List['RimeDict']:
+        """直接导入的码表，文件不存在的码表会被跳过"""
+        tables = []
+        for path in self.import_tables:
+            if os.path.exists(path):
+                tables.append(self._registry.get(path) or RimeDict(path, self._registry, self.base_dir))
+        return tables
+
+    def missing_imports(self) -> List[str]:
+        """import_tables 中不存在的码表文件"""
+        return [path for path in self.import_tables if not os.path.exists(path)]
+
+    def iter_tables(self, _seen: Optional[Set[str]] = None) -> Iterator['RimeDict']:
+        """深度优先遍历导入图：先产出自身，再依次递归产出导入的码表，每个码表只产出一次"""
+        seen = set() if _seen is None else _seen
+        if self.path in seen:
+            return
+        seen.add(self.path)
+        yield self
+        for table in self.imports:
+            yield from table.iter_tables(seen)
+
+    def iter_body(self) -> Iterator[DictEntry]:
+        """流式读取本码表的正文，不缓存结果；文件头尚未读取时顺便解析"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            header_lines = read_header_lines(f)
+            if header_lines is None:
+                self._header = {}
+                return
+            if self._header is None:
+                self._header = parse_header(header_lines)
+
+            text_col, code_col, weight_col, stem_col = column_indexes(self.columns)
+            for line_num, line in enumerate(f, len(header_lines) + 1):
+                line = line.rstrip('\n')
+                if not line.strip() or line.startswith('#'):
+                    continue
+                parts = line.split('\t')
+                yield DictEntry(
+                    _cell(parts, text_col),
+                    _cell(parts, code_col),
+                    _parse_weight(_cell(parts, weight_col)),
+                    _cell(parts, stem_col),
+                    self.path,
+                    line_num,
+                )
+
+    @property
+    def entries(self) -> EntryTable:
+        """本码表（不含导入的码表）的全部词条，首次访问时加载到紧凑的 EntryTable 中"""
+        if self._entries is None:
+            entries = EntryTable(self.path)
+            for entry in self.iter_body():
+                entries.append(entry)
+            self._entries = entries
+        return self._entries
+
+    @property
+    def loaded(self) -> bool:
+        return self._entries is not None
+
+    def unload(self) -> None:
+        """释放已加载的正文，下次访问 entries 时重新读取"""
+        self._entries = None
+
+    def iter_entries(self) -> Iterator[DictEntry]:
+        """按导入图顺序产出自身及全部导入码表的词条，已加载的码表直接使用缓存"""
+        for table in self.iter_tables():
+            yield from (table.entries if table.loaded else table.iter_body())
+
+
+def load_dict(path: str) -> RimeDict:
+    """打开一个码表的导入图，文件头和正文都在首次访问时才读取"""
+    return RimeDict(path)
@@ -0,0 +1,70 @@
+"""
+增量同步日志：为基础文件和每个同步过的码表保存逐行哈希，下次同步时只处理变化的行
+
+日志保存在文件同目录的 .table_cache 目录下（<文件名>.journal.json），内容为 JSON：
+    基础文件  每个数据行的 (行哈希, 词组, 权重)、文件头哈希和列类型，以及文件的 sha256；
+              下次同步时哈希未变的行直接复用上次的解析结果，只验证新增或修改的行
+    码表文件  文件的大小和修改时间、上次同步时基础文件的 sha256，以及 词组 -> 行号 的索引；
+              码表自上次同步后没有被改动、且上次用的正是日志中的基础文件版本时，
+              只改写受影响的行，否则整表同步并重建索引
+日志损坏或版本不符时视为不存在，退回完整同步。
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+from table_cache import CACHE_DIR_NAME
+
+JOURNAL_VERSION = 1
+
+
+def journal_path_for(file_path: str) -> str:
+    file_dir = os.path.dirname(os.path.abspath(file_path))
+    return os.path.join(file_dir, CACHE_DIR_NAME, f"{os.path.basename(file_path)}.journal.json")
+
+
+def row_hash(line: str) -> str:
+    """一行内容（不含换行符）的 64 位哈希"""
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def file_signature(file_path: str) -> Dict[str, int]:
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def signature_matches(journal: Dict[str, Any], file_path: str) -> bool:
+    """文件自写入日志后是否未被改动（大小和修改时间都相同）"""
+    return journal.get('signature') == file_signature(file_path)
+
+
+def load_journal(file_path: str) -> Optional[Dict[str, Any]]:
+    """读取文件的同步日志，不存在或无法读取时返回 None"""
+    journal_file = journal_path_for(file_path)
+    if not os.path.exists(journal_file):
+        return None
+    try:
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(journal, dict) or journal.get('version') != JOURNAL_VERSION:
+        return None
+    return journal
+
+
+def save_journal(file_path: str, journal: Dict[str, Any]) -> None:
+    """写入同步日志，先写临时文件再原子替换"""
+    journal_file = journal_path_for(file_path)
+    os.makedirs(os.path.dirname(journal_file), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(journal_file))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({**journal, 'version': JOURNAL_VERSION}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, journal_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
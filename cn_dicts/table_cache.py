@@ -0,0 +1,264 @@
+"""
+编译表缓存：把 Tab 分隔的文本表（单字编码表、词语权重表等）编译成可内存映射的二进制文件
+
+缓存文件保存在源文件同目录的 .table_cache 目录下，以源文件的大小、修改时间和内容哈希作为键，
+源文件变化后下次加载时自动重建。文件头还记录解析函数所在脚本的哈希，解析逻辑改动后旧缓存同样失效。
+
+二进制格式（小端）：
+    文件头   magic(8) 版本(I) 源文件大小(Q) 源文件修改时间ns(q) 源文件sha256(32) 解析器sha256(32) 条目数(I)
+             编译表总字节数(Q)
+    键偏移   (条目数+1) 个 uint32
+    值偏移   (条目数+1) 个 uint32
+    键数据   按 UTF-8 字节序排序的键，每个键后跟一个 \0
+    值数据   与键一一对应的值，每个值后跟一个 \0
+偏移量指向每项的起始字节，整表加载时按 \0 整块切分，单键查找时按偏移二分
+打开时核对文件长度与文件头记录的总字节数，截断或写了一半的缓存视为无效，重新解析源文件
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from atomic_file import mkstemp_for
+
+CACHE_DIR_NAME = ".table_cache"
+CACHE_MAGIC = b"RIMETBL\0"
+CACHE_VERSION = 3
+
+HEADER = struct.Struct("<8sIQq32s32sIQ")
+# 文件头中源文件修改时间的位置，内容哈希一致而修改时间变化时原地更新
+MTIME_FIELD = struct.Struct("<q")
+MTIME_OFFSET = struct.calcsize("<8sIQ")
+# 不对应解析函数的编译表（如合并快照）使用的解析器哈希
+NO_PARSER = bytes(32)
+
+# 打开或转换编译表时表明文件已损坏的异常，一律按缓存未命中处理
+CORRUPT_TABLE_ERRORS = (OSError, ValueError, struct.error, IndexError, TypeError, UnicodeDecodeError)
+
+
+def file_digest(file_path: str) -> bytes:
+    """计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def parser_digest(build: Callable) -> bytes:
+    """
+    解析函数的标识：函数限定名加上其所在脚本内容的 sha256
+    脚本改动后哈希随之变化，由旧解析逻辑生成的缓存不会再被使用；无法定位脚本时退回到函数的字节码
+    """
+    digest = hashlib.sha256(getattr(build, '__qualname__', repr(build)).encode('utf-8'))
+    module_file = getattr(sys.modules.get(getattr(build, '__module__', None)), '__file__', None)
+    if module_file and os.path.exists(module_file):
+        digest.update(file_digest(module_file))
+    elif hasattr(build, '__code__'):
+        digest.update(build.__code__.co_code)
+    return digest.digest()
+
+
+def cache_path_for(source_file: str, kind: str) -> str:
+    """源文件对应的缓存文件路径，kind 区分同一源文件的不同解析方式"""
+    source_dir = os.path.dirname(os.path.abspath(source_file))
+    return os.path.join(source_dir, CACHE_DIR_NAME, f"{os.path.basename(source_file)}.{kind}.tbl")
+
+
+class CompiledTable:
+    """内存映射的编译表，按键二分查找，无需解析整个表"""
+
+    def __init__(self, cache_file: str):
+        with open(cache_file, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, version, self.source_size, self.source_mtime_ns,
+             self.source_digest, self.parser_digest, self.count, total_size) = HEADER.unpack_from(self._mm, 0)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                raise ValueError(f"不是有效的编译表文件: {cache_file}")
+            offset_size = (self.count + 1) * 4
+            if total_size != len(self._mm) or HEADER.size + 2 * offset_size > total_size:
+                raise ValueError(f"编译表文件不完整: {cache_file}")
+        except BaseException:
+            self._mm.close()
+            raise
+
+        self._key_offsets = memoryview(self._mm)[HEADER.size:HEADER.size + offset_size].cast('I')
+        value_start = HEADER.size + offset_size
+        self._value_offsets = memoryview(self._mm)[value_start:value_start + offset_size].cast('I')
+        self._keys_start = value_start + offset_size
+        self._values_start = self._keys_start + self._key_offsets[self.count]
+        if self._values_start + self._value_offsets[self.count] != total_size:
+            self.close()
+            raise ValueError(f"编译表文件不完整: {cache_file}")
+
+    def close(self) -> None:
+        self._key_offsets.release()
+        self._value_offsets.release()
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _key_bytes(self, i: int) -> bytes:
+        start = self._keys_start + self._key_offsets[i]
+        return self._mm[start:self._keys_start + self._key_offsets[i + 1] - 1]
+
+    def _value(self, i: int) -> str:
+        start = self._values_start + self._value_offsets[i]
+        return self._mm[start:self._values_start + self._value_offsets[i + 1] - 1].decode('utf-8')
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """二分查找单个键"""
+        target = key.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._key_bytes(lo) == target:
+            return self._value(lo)
+        return default
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        for i in range(self.count):
+            yield self._key_bytes(i).decode('utf-8'), self._value(i)
+
+    def columns(self) -> Tuple[List[str], List[str]]:
+        """整块解码全部键和值，比逐条解码快得多"""
+        if not self.count:
+            return [], []
+        values_end = self._values_start + self._value_offsets[self.count]
+        keys = self._mm[self._keys_start:self._values_start - 1].decode('utf-8').split('\0')
+        values = self._mm[self._values_start:values_end - 1].decode('utf-8').split('\0')
+        return keys, values
+
+    def to_dict(self) -> Dict[str, str]:
+        return dict(zip(*self.columns()))
+
+
+def write_compiled_table(
+    cache_file: str,
+    table: Mapping[str, str],
+    source_size: int,
+    source_mtime_ns: int,
+    source_digest: bytes,
+    parser: bytes = NO_PARSER
+) -> None:
+    """
+    把字典写成编译表，先写临时文件并落盘再原子替换，中途崩溃不会留下不完整的编译表；
+    parser 为生成该表的解析函数的 parser_digest
+    """
+    encoded = sorted((key.encode('utf-8'), value.encode('utf-8')) for key, value in table.items())
+
+    key_offsets = array('I', [0])
+    value_offsets = array('I', [0])
+    for key, value in encoded:
+        key_offsets.append(key_offsets[-1] + len(key) + 1)
+        value_offsets.append(value_offsets[-1] + len(value) + 1)
+
+    total_size = HEADER.size + 4 * (len(key_offsets) + len(value_offsets)) + key_offsets[-1] + value_offsets[-1]
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    fd, temp_path = mkstemp_for(cache_file)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, source_size, source_mtime_ns,
+                                source_digest, parser, len(encoded), total_size))
+            f.write(key_offsets.tobytes())
+            f.write(value_offsets.tobytes())
+            f.write(b"".join(key + b"\0" for key, _ in encoded))
+            f.write(b"".join(value + b"\0" for _, value in encoded))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, cache_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def refresh_source_mtime(cache_file: str, source_mtime_ns: int) -> None:
+    """原地更新编译表文件头中记录的源文件修改时间，更新失败（如目录只读）时下次仍按内容哈希校验"""
+    try:
+        with open(cache_file, 'r+b') as f:
+            f.seek(MTIME_OFFSET)
+            f.write(MTIME_FIELD.pack(source_mtime_ns))
+    except OSError:
+        pass
+
+
+def open_cached_table(source_file: str, kind: str, parser: Optional[bytes] = None) -> Optional[CompiledTable]:
+    """
+    打开与源文件匹配的编译表，缓存不存在或已过期时返回 None
+    大小和修改时间都一致时直接使用；只有修改时间变化时再比较内容哈希，哈希一致时更新记录的修改时间，
+    之后的加载不必再计算哈希。指定 parser 时，解析器哈希不一致的缓存也视为过期
+    """
+    cache_file = cache_path_for(source_file, kind)
+    if not os.path.exists(cache_file):
+        return None
+
+    try:
+        table = CompiledTable(cache_file)
+    except CORRUPT_TABLE_ERRORS:
+        return None
+
+    if parser is not None and table.parser_digest != parser:
+        table.close()
+        return None
+
+    stat = os.stat(source_file)
+    if table.source_size == stat.st_size and table.source_mtime_ns == stat.st_mtime_ns:
+        return table
+
+    if table.source_size == stat.st_size and table.source_digest == file_digest(source_file):
+        refresh_source_mtime(cache_file, stat.st_mtime_ns)
+        return table
+
+    table.close()
+    return None
+
+
+def load_cached_table(
+    source_file: str,
+    kind: str,
+    build: Callable[[str], Mapping[str, str]],
+    convert: Callable[[CompiledTable], Mapping[str, str]] = CompiledTable.to_dict
+) -> Mapping[str, str]:
+    """
+    加载源文件对应的表：有有效缓存时用 convert 把编译表转换为映射，否则调用 build 解析源文件并重建缓存
+    缓存与 build 的 parser_digest 绑定，build 返回空表时视为读取失败，不写缓存；
+    缓存损坏导致转换失败时同样重建
+    """
+    if not os.path.exists(source_file):
+        return build(source_file)
+
+    parser = parser_digest(build)
+    table = open_cached_table(source_file, kind, parser)
+    if table is not None:
+        try:
+            return convert(table)
+        except CORRUPT_TABLE_ERRORS as e:
+            print(f"警告: 编译表缓存已损坏，重新解析源文件: {e}")
+        finally:
+            table.close()
+
+    # 先记录解析前的文件状态，解析期间文件被修改时下次会重新校验
+    stat = os.stat(source_file)
+    digest = file_digest(source_file)
+    result = build(source_file)
+
+    if result:
+        try:
+            write_compiled_table(cache_path_for(source_file, kind), result,
+                                 stat.st_size, stat.st_mtime_ns, digest, parser)
+        except Exception as e:
+            print(f"警告: 写入编译表缓存失败: {e}")
+
+    return result
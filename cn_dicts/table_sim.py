@@ -0,0 +1,226 @@
+"""
+table_translator 离线模拟：用 wubi.dict.yaml 及其 import_tables 建立 拼写 -> 编码 的前缀树，
+按 Rime table_translator 的方式对一串按键给出候选列表，修改词库或权重后不必重新部署就能查看效果。
+
+拼写由方案 speller/algebra 中的 derive/xform/erase 规则从编码推导：wubi 方案用 derive 把
+第2至4码替换为 z，因此 z 在这些位置上是万能键。encoder/exclude_patterns 只影响自动编码，
+wubi.user 中仍有 zz 开头的真实编码（符号等）：derive 保留原拼写，这些编码按原样可以查到，
+同时也与推导出的万能键拼写落在同一节点上，两者的候选按权重混排，与 Rime 的表现相同。
+
+排序与 table_translator 一致：先是拼写与输入完全相同的候选，再是补全（enable_completion）
+得到的候选，补全按剩余码长从短到长；同一剩余码长内按权重从高到低，权重相同时按载入顺序。
+
+用法:
+    python table_sim.py aa                 # 显示一页候选
+    python table_sim.py azd ggzz --limit 20
+    python table_sim.py --no-completion a
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Pattern, Set, Tuple
+
+from code_index import Candidate, CodeIndex, build_code_index
+from rime_dict import read_schema
+
+DEFAULT_DICT_FILE = os.path.join("..", "wubi.dict.yaml")
+DEFAULT_SCHEMA_FILE = os.path.join("..", "wubi.schema.yaml")
+
+# 方案未设置 menu/page_size 时 Rime 的默认每页候选数
+DEFAULT_PAGE_SIZE = 5
+
+ALGEBRA_PATTERN = re.compile(r'^(derive|xform|erase)/(.*?)(?<!\\)/(?:(.*?)(?<!\\)/)?$')
+
+# 编译后的拼写规则: (操作, 正则, 替换串)
+AlgebraRule = Tuple[str, Pattern, str]
+
+
+class SimCandidate(NamedTuple):
+    text: str
+    code: str
+    weight: int
+    source: str
+    remaining: int  # 补全的剩余码长，完全匹配为0
+
+
+def compile_algebra(rules: List[str]) -> List[AlgebraRule]:
+    """把 speller/algebra 编译成 (操作, 正则, 替换串)，不支持的规则（如 xlit、abbrev）打印警告后跳过"""
+    compiled = []
+    for rule in rules:
+        match = ALGEBRA_PATTERN.match(str(rule))
+        if not match:
+            print(f"警告: 不支持的拼写规则，已跳过: {rule}", file=sys.stderr)
+            continue
+        op, pattern, replacement = match.groups()
+        # Rime 的替换串用 $1 引用分组
+        replacement = re.sub(r'\$(\d)', r'\\g<\1>', replacement or "")
+        compiled.append((op, re.compile(pattern), replacement))
+    return compiled
+
+
+def spellings_of(code: str, algebra: List[AlgebraRule]) -> Set[str]:
+    """按拼写规则依次变换编码，返回全部拼写；derive 保留原拼写，xform 替换，erase 删除"""
+    spellings = {code}
+    for op, pattern, replacement in algebra:
+        result = set()
+        for spelling in spellings:
+            if op == 'erase':
+                if not pattern.search(spelling):
+                    result.add(spelling)
+                continue
+            changed = pattern.sub(replacement, spelling)
+            if op == 'derive':
+                result.add(spelling)
+                if changed:
+                    result.add(changed)
+            elif changed:
+                result.add(changed)
+        spellings = result
+    return spellings
+
+
+class TrieNode:
+    __slots__ = ('children', 'codes')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, 'TrieNode'] = {}
+        self.codes: List[str] = []  # 拼写恰好到此结束的真实编码
+
+
+class SpellingTrie:
+    """拼写前缀树，每个节点记录拼写到此结束的真实编码，候选从编码索引中取"""
+
+    def __init__(self, index: CodeIndex, algebra: List[AlgebraRule]) -> None:
+        self.index = index
+        self.root = TrieNode()
+        self.spelling_count = 0
+        for code in index.codes():
+            for spelling in spellings_of(code, algebra):
+                self._insert(spelling, code)
+        # 各编码的候选按权重排好后缓存，查询时不再排序
+        self._candidates: Dict[str, List[Candidate]] = {code: index.candidates(code) for code in index.codes()}
+
+    def _insert(self, spelling: str, code: str) -> None:
+        node = self.root
+        for ch in spelling:
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = TrieNode()
+            node = child
+        if not node.codes:
+            self.spelling_count += 1
+        node.codes.append(code)
+
+    def find(self, spelling: str) -> Optional[TrieNode]:
+        node = self.root
+        for ch in spelling:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def candidates(self, code: str) -> List[Candidate]:
+        return self._candidates.get(code, [])
+
+
+def iter_levels(node: TrieNode) -> Iterator[List[TrieNode]]:
+    """按层产出 node 之下的子孙节点，第 n 层对应剩余码长 n"""
+    level = list(node.children.values())
+    while level:
+        yield level
+        level = [child for parent in level for child in parent.children.values()]
+
+
+class TableTranslatorSimulator:
+    """按 table_translator 的规则给出一串按键对应的候选"""
+
+    def __init__(self, trie: SpellingTrie, enable_completion: bool = True) -> None:
+        self.trie = trie
+        self.enable_completion = enable_completion
+
+    def _collect(self, nodes: List[TrieNode], remaining: int, seen: Set[str]) -> List[SimCandidate]:
+        """合并若干节点上的候选，按权重从高到低、载入顺序排列；同一真实编码只取一次"""
+        merged = []
+        for node in nodes:
+            for code in node.codes:
+                if code in seen:
+                    continue
+                seen.add(code)
+                merged.extend((candidate, code) for candidate in self.trie.candidates(code))
+        merged.sort(key=lambda item: (-item[0][1], item[0][3]))
+        return [SimCandidate(phrase, code, weight, source, remaining)
+                for (phrase, weight, source, _), code in merged]
+
+    def query(self, keys: str, limit: Optional[int] = None) -> List[SimCandidate]:
+        """返回按键 keys 的候选列表，limit 为最多返回的候选数（不限制时补全会遍历整棵子树）"""
+        node = self.trie.find(keys)
+        if node is None:
+            return []
+
+        seen: Set[str] = set()
+        result = self._collect([node], 0, seen)
+        if not self.enable_completion:
+            return result[:limit] if limit is not None else result
+
+        for remaining, level in enumerate(iter_levels(node), 1):
+            if limit is not None and len(result) >= limit:
+                break
+            result.extend(self._collect(level, remaining, seen))
+        return result[:limit] if limit is not None else result
+
+
+def build_simulator(
+    dict_file: str = DEFAULT_DICT_FILE,
+    schema_file: Optional[str] = DEFAULT_SCHEMA_FILE
+) -> Tuple[TableTranslatorSimulator, Dict[str, object]]:
+    """读取词库和方案建立模拟器，返回 (模拟器, 方案中用到的设置)"""
+    schema = read_schema(schema_file) if schema_file and os.path.exists(schema_file) else {}
+    speller = schema.get('speller') or {}
+    translator = schema.get('translator') or {}
+    menu = schema.get('menu') or {}
+
+    algebra = compile_algebra(speller.get('algebra') or [])
+    trie = SpellingTrie(build_code_index(dict_file), algebra)
+    enable_completion = translator.get('enable_completion', True)
+    settings = {
+        'algebra': len(algebra),
+        'enable_completion': enable_completion,
+        'page_size': menu.get('page_size') or DEFAULT_PAGE_SIZE,
+    }
+    return TableTranslatorSimulator(trie, enable_completion), settings
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="table_translator 离线模拟")
+    parser.add_argument('keys', nargs='+', help="按键序列，可指定多个")
+    parser.add_argument('--dict', default=DEFAULT_DICT_FILE, help="主词库文件，默认为 ../wubi.dict.yaml")
+    parser.add_argument('--schema', default=DEFAULT_SCHEMA_FILE,
+                        help="方案文件，用于读取拼写规则和补全设置，默认为 ../wubi.schema.yaml")
+    parser.add_argument('--limit', type=int, default=None, help="最多显示的候选数，默认为方案的每页候选数")
+    parser.add_argument('--no-completion', action='store_true', help="关闭补全，只显示完全匹配的候选")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    simulator, settings = build_simulator(args.dict, args.schema)
+    if args.no_completion:
+        simulator.enable_completion = False
+    limit = args.limit or settings['page_size']
+    print(f"已载入 {len(simulator.trie.index)} 个编码、{simulator.trie.spelling_count} 个拼写，"
+          f"耗时 {time.perf_counter() - start:.2f} 秒", file=sys.stderr)
+
+    for keys in args.keys:
+        start = time.perf_counter()
+        candidates = simulator.query(keys, limit)
+        elapsed = (time.perf_counter() - start) * 1e6
+        print(f"{keys}  （{elapsed:.0f} 微秒）")
+        if not candidates:
+            print("  无候选")
+        for i, candidate in enumerate(candidates, 1):
+            completion = f"  ~{candidate.code[len(keys):]}" if candidate.remaining else ""
+            print(f"  {i}. {candidate.text}\t{candidate.code}\t{candidate.weight}\t{candidate.source}{completion}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,519 @@
+"""
+语料新词发现：在大规模语料中找出五笔词库中还没有的高频多字词组，按词频、内部凝固度（点互信息）
+和左右邻字的信息熵打分，输出可直接交给 wubi.encoded.py 文件批量处理模式的词组列表，
+以及 词组\\t权重 格式的权重文件（可并入 phrase_weight.txt，编码时按词频填写权重）。
+
+统计分两遍流式扫描，内存占用与语料大小无关：
+    第一遍  单字精确计数，2 至 max_len 字的片段先在内存中按批精确计数，再批量写入固定大小的
+            Count-Min Sketch（保守更新），每个不同的片段每批只哈希一次
+    第二遍  只对估计次数达到阈值、且不在词库中的片段精确计数并记录左右邻字；
+            候选数超过上限时淘汰估计次数较低的一半，并提高阈值；前缀估计次数不足时跳过更长的片段
+只统计连续汉字片段，标点、字母、换行都视为词的边界。
+语料与 corpus_count.py 一样切成以换行结尾的块，两遍都按块分给多个进程并行扫描：
+第一遍各进程的 sketch 逐元素相加（保守更新的计数器仍不低于真实次数），第二遍各进程的候选片段按词组合并。
+
+用法:
+    python word_discovery.py corpus.txt                                 # 输出 new_words.txt
+    python word_discovery.py corpus1.txt corpus2.txt --min-count 20 --max-len 5
+    python word_discovery.py corpus.txt --update-base                   # 同时把权重并入 phrase_weight.txt
+    python word_discovery.py corpus.txt --jobs 8 --profile
+之后运行 wubi.encoded.py，把 new_words.txt 拖入即可批量编码。
+"""
+import argparse
+import collections
+import concurrent.futures
+import math
+import operator
+import os
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from atomic_file import atomic_write
+from cjk_chars import HAN_RUN_PATTERN
+from corpus_count import DEFAULT_CHUNK_SIZE, DEFAULT_DICT_FILE, CorpusChunk, load_phrases, plan_chunks, read_chunk
+from profiling import PROFILER
+
+DEFAULT_OUTPUT_FILE = "new_words.txt"
+DEFAULT_WEIGHT_FILE = "new_words_weight.txt"
+DEFAULT_BASE_FILE = "phrase_weight.txt"
+
+# Count-Min Sketch 的默认宽度（每行计数器个数，取2的幂）和行数，默认约占 16 MiB
+DEFAULT_SKETCH_WIDTH = 1 << 20
+DEFAULT_SKETCH_DEPTH = 4
+
+# 第二遍扫描时最多同时保留的候选片段数
+DEFAULT_MAX_CANDIDATES = 200000
+
+# 第一遍在内存中精确计数的不同片段数达到该值时，批量写入 sketch 并清空
+SKETCH_BATCH_SIZE = 1 << 19
+
+# 第二遍记住的估计次数不足的片段数上限；阈值只升不降，这些片段之后不会再成为候选，超过上限时清空重记
+REJECTED_CACHE_SIZE = 1 << 20
+
+# 第二个 CRC32 哈希的初值
+SECOND_HASH_SEED = 0x9e3779b9
+
+
+class CountMinSketch:
+    """
+    固定内存的近似计数，估计值只会偏大
+    各行的位置由两个 CRC32 双重哈希得到（第 k 行取 h1 + k*h2），每个片段只需计算两次哈希
+    """
+
+    def __init__(self, width: int = DEFAULT_SKETCH_WIDTH, depth: int = DEFAULT_SKETCH_DEPTH) -> None:
+        if width & (width - 1):
+            raise ValueError("Count-Min Sketch 的宽度必须是2的幂")
+        self.width = width
+        self.depth = depth
+        self.mask = width - 1
+        self.offsets = [row * width for row in range(depth)]
+        self.table = array('I', bytes(4 * width * depth))
+
+    def _slots(self, key: str) -> List[int]:
+        data = key.encode('utf-8')
+        first, second = zlib.crc32(data), zlib.crc32(data, SECOND_HASH_SEED) | 1
+        mask = self.mask
+        return [offset + ((first + row * second) & mask) for row, offset in enumerate(self.offsets)]
+
+    def add(self, key: str, count: int = 1) -> None:
+        """保守更新：只把计数器提高到当前最小值加 count，减小高估"""
+        slots = self._slots(key)
+        table = self.table
+        current = min(map(table.__getitem__, slots)) + count
+        for slot in slots:
+            if table[slot] < current:
+                table[slot] = current
+
+    def add_counts(self, counts: Mapping[str, int]) -> None:
+        """批量写入一批片段的精确次数，与逐个调用 add 相同，只是省去每个片段的方法调用"""
+        table, mask, crc32 = self.table, self.mask, zlib.crc32
+        rows = list(enumerate(self.offsets))
+        get = table.__getitem__
+        for key, count in counts.items():
+            data = key.encode('utf-8')
+            first, second = crc32(data), crc32(data, SECOND_HASH_SEED) | 1
+            slots = [offset + ((first + row * second) & mask) for row, offset in rows]
+            current = min(map(get, slots)) + count
+            for slot in slots:
+                if table[slot] < current:
+                    table[slot] = current
+
+    def merge(self, other: 'CountMinSketch') -> None:
+        """逐元素相加另一部分语料的 sketch，两者的宽度和行数必须相同"""
+        self.table = array('I', map(operator.add, self.table, other.table))
+
+    def estimate(self, key: str) -> int:
+        return min(map(self.table.__getitem__, self._slots(key)))
+
+
+class CandidateStats:
+    __slots__ = ('count', 'left', 'right', 'left_edges', 'right_edges')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.left: Dict[str, int] = {}
+        self.right: Dict[str, int] = {}
+        self.left_edges = 0   # 左边是词的边界（片段开头）的次数
+        self.right_edges = 0
+
+
+class NewWord(NamedTuple):
+    text: str
+    count: int
+    pmi: float
+    left_entropy: float
+    right_entropy: float
+
+
+def count_run_grams(run: str, max_len: int, counts: collections.Counter) -> None:
+    """把一个汉字片段中 2 至 max_len 字的全部子片段计入 counts，切片和计数都在 C 层完成"""
+    length = len(run)
+    for n in range(2, min(max_len, length) + 1):
+        counts.update(map(run.__getitem__, map(slice, range(length - n + 1), range(n, length + 1))))
+
+
+def sketch_chunks(
+    chunks: List[CorpusChunk],
+    max_len: int,
+    width: int,
+    depth: int
+) -> Tuple[collections.Counter, int, CountMinSketch]:
+    """第一遍扫描一组语料块，返回 (单字计数, 总字数, sketch)"""
+    sketch = CountMinSketch(width, depth)
+    char_counts: collections.Counter = collections.Counter()
+    gram_counts: collections.Counter = collections.Counter()
+    total = 0
+    for chunk in chunks:
+        for run in HAN_RUN_PATTERN.findall(read_chunk(chunk)):
+            total += len(run)
+            char_counts.update(run)
+            count_run_grams(run, max_len, gram_counts)
+            if len(gram_counts) >= SKETCH_BATCH_SIZE:
+                sketch.add_counts(gram_counts)
+                gram_counts.clear()
+    sketch.add_counts(gram_counts)
+    return char_counts, total, sketch
+
+
+def split_tasks(corpus_files: List[str], jobs: int, chunk_size: int) -> List[List[CorpusChunk]]:
+    """把语料块轮流分给 jobs 个任务，每个进程只处理一个任务，结果只需合并 jobs 次"""
+    chunks = list(plan_chunks(corpus_files, chunk_size))
+    return [tasks for tasks in (chunks[k::jobs] for k in range(jobs)) if tasks]
+
+
+def count_sketch(
+    corpus_files: List[str],
+    max_len: int,
+    width: int = DEFAULT_SKETCH_WIDTH,
+    depth: int = DEFAULT_SKETCH_DEPTH,
+    jobs: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Tuple[Dict[str, int], int, CountMinSketch]:
+    """第一遍：单字精确计数，2 至 max_len 字的片段计入 sketch，返回 (单字计数, 总字数, sketch)"""
+    jobs = jobs or os.cpu_count() or 1
+    tasks = split_tasks(corpus_files, jobs, chunk_size)
+    if len(tasks) <= 1:
+        char_counts, total, sketch = sketch_chunks(tasks[0] if tasks else [], max_len, width, depth)
+        return dict(char_counts), total, sketch
+
+    char_counts: collections.Counter = collections.Counter()
+    total = 0
+    sketch = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = [executor.submit(sketch_chunks, task, max_len, width, depth) for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            task_chars, task_total, task_sketch = future.result()
+            char_counts.update(task_chars)
+            total += task_total
+            if sketch is None:
+                sketch = task_sketch
+            else:
+                sketch.merge(task_sketch)
+    return dict(char_counts), total, sketch
+
+
+def evict_candidates(
+    candidates: Dict[str, CandidateStats],
+    estimates: Dict[str, int],
+    threshold: int
+) -> int:
+    """淘汰估计次数较低的一半候选，返回提高后的阈值"""
+    ranked = sorted(estimates, key=estimates.get)
+    dropped = ranked[:len(ranked) // 2]
+    threshold = max(threshold, estimates[dropped[-1]] + 1)
+    for gram in dropped:
+        del candidates[gram]
+        del estimates[gram]
+    return threshold
+
+
+def collect_chunks(
+    chunks: List[CorpusChunk],
+    max_len: int,
+    sketch: CountMinSketch,
+    known: Set[str],
+    min_count: int,
+    max_candidates: int = DEFAULT_MAX_CANDIDATES
+) -> Tuple[Dict[str, CandidateStats], Dict[str, int], int]:
+    """
+    第二遍扫描一组语料块，返回 (候选片段, 候选的估计次数, 最终阈值)
+    片段的出现次数不会超过它去掉末字后的前缀，前缀的估计次数低于阈值时不再查看更长的片段
+    """
+    candidates: Dict[str, CandidateStats] = {}
+    estimates: Dict[str, int] = {}
+    rejected: Set[str] = set()
+    threshold = min_count
+    for chunk in chunks:
+        for run in HAN_RUN_PATTERN.findall(read_chunk(chunk)):
+            length = len(run)
+            for i in range(length - 1):
+                for n in range(2, min(max_len, length - i) + 1):
+                    gram = run[i:i + n]
+                    stats = candidates.get(gram)
+                    if stats is None:
+                        if gram in rejected:
+                            break
+                        if gram in known:
+                            continue
+                        estimate = sketch.estimate(gram)
+                        if estimate < threshold:
+                            if len(rejected) >= REJECTED_CACHE_SIZE:
+                                rejected.clear()
+                            rejected.add(gram)
+                            break
+                        stats = candidates[gram] = CandidateStats()
+                        estimates[gram] = estimate
+                    stats.count += 1
+                    if i:
+                        stats.left[run[i - 1]] = stats.left.get(run[i - 1], 0) + 1
+                    else:
+                        stats.left_edges += 1
+                    if i + n < length:
+                        stats.right[run[i + n]] = stats.right.get(run[i + n], 0) + 1
+                    else:
+                        stats.right_edges += 1
+
+            if len(candidates) > max_candidates:
+                # 之后只接受估计次数更高的片段
+                threshold = evict_candidates(candidates, estimates, threshold)
+                print(f"警告: 候选片段超过 {max_candidates} 个，阈值提高到 {threshold}", file=sys.stderr)
+    return candidates, estimates, threshold
+
+
+# 第二遍并行扫描时各工作进程共享的 sketch 和词库，由进程池初始化函数设置
+_worker_sketch: Optional[CountMinSketch] = None
+_worker_known: Set[str] = set()
+
+
+def _init_collect_worker(sketch: CountMinSketch, known: Set[str]) -> None:
+    """工作进程初始化：每个进程只接收一次 sketch 和词库"""
+    global _worker_sketch, _worker_known
+    _worker_sketch, _worker_known = sketch, known
+
+
+def _collect_chunks_worker(
+    chunks: List[CorpusChunk],
+    max_len: int,
+    min_count: int,
+    max_candidates: int
+) -> Tuple[Dict[str, CandidateStats], Dict[str, int], int]:
+    return collect_chunks(chunks, max_len, _worker_sketch, _worker_known, min_count, max_candidates)
+
+
+def merge_candidates(
+    candidates: Dict[str, CandidateStats],
+    estimates: Dict[str, int],
+    other: Dict[str, CandidateStats],
+    other_estimates: Dict[str, int],
+    threshold: int
+) -> None:
+    """把另一组语料块的候选并入 candidates，估计次数低于阈值的片段不再并入"""
+    for gram, stats in other.items():
+        if other_estimates[gram] < threshold:
+            continue
+        merged = candidates.get(gram)
+        if merged is None:
+            candidates[gram] = stats
+            estimates[gram] = other_estimates[gram]
+            continue
+        merged.count += stats.count
+        merged.left_edges += stats.left_edges
+        merged.right_edges += stats.right_edges
+        for neighbors, other_neighbors in ((merged.left, stats.left), (merged.right, stats.right)):
+            for char, count in other_neighbors.items():
+                neighbors[char] = neighbors.get(char, 0) + count
+
+
+def collect_candidates(
+    corpus_files: List[str],
+    max_len: int,
+    sketch: CountMinSketch,
+    known: Set[str],
+    min_count: int,
+    max_candidates: int = DEFAULT_MAX_CANDIDATES,
+    jobs: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, CandidateStats]:
+    """第二遍：对估计次数不低于阈值的新片段精确计数，并记录左右邻字"""
+    jobs = jobs or os.cpu_count() or 1
+    tasks = split_tasks(corpus_files, jobs, chunk_size)
+    if len(tasks) <= 1:
+        return collect_chunks(tasks[0] if tasks else [], max_len, sketch, known, min_count, max_candidates)[0]
+
+    candidates: Dict[str, CandidateStats] = {}
+    estimates: Dict[str, int] = {}
+    threshold = min_count
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=len(tasks),
+        initializer=_init_collect_worker,
+        initargs=(sketch, known)
+    ) as executor:
+        futures = [executor.submit(_collect_chunks_worker, task, max_len, min_count, max_candidates)
+                   for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            task_candidates, task_estimates, task_threshold = future.result()
+            threshold = max(threshold, task_threshold)
+            merge_candidates(candidates, estimates, task_candidates, task_estimates, threshold)
+            if len(candidates) > max_candidates:
+                threshold = evict_candidates(candidates, estimates, threshold)
+                print(f"警告: 候选片段超过 {max_candidates} 个，阈值提高到 {threshold}", file=sys.stderr)
+    return candidates
+
+
+def neighbor_entropy(neighbors: Dict[str, int], edges: int) -> float:
+    """邻字分布的信息熵；每次出现在边界上都视为一个不同的邻字"""
+    total = sum(neighbors.values()) + edges
+    if not total:
+        return 0.0
+    entropy = -sum(count / total * math.log(count / total) for count in neighbors.values())
+    return entropy + edges / total * math.log(total)
+
+
+def min_pmi(
+    gram: str,
+    count: int,
+    char_counts: Dict[str, int],
+    sketch: CountMinSketch,
+    total: int
+) -> float:
+    """所有切分方式中最小的点互信息 log(p(词) / (p(左半)p(右半)))，衡量片段内部的凝固程度"""
+    def part_count(part: str) -> int:
+        if len(part) == 1:
+            return char_counts.get(part, 0)
+        return sketch.estimate(part)
+
+    best = math.inf
+    for split in range(1, len(gram)):
+        left, right = part_count(gram[:split]), part_count(gram[split:])
+        if left and right:
+            best = min(best, math.log(count * total / (left * right)))
+    return best if best != math.inf else 0.0
+
+
+def score_candidates(
+    candidates: Dict[str, CandidateStats],
+    char_counts: Dict[str, int],
+    sketch: CountMinSketch,
+    total: int,
+    min_count: int,
+    min_pmi_value: float,
+    min_entropy: float
+) -> List[NewWord]:
+    """按阈值筛选候选，结果按出现次数从高到低排列"""
+    words = []
+    for gram, stats in candidates.items():
+        if stats.count < min_count:
+            continue
+        pmi = min_pmi(gram, stats.count, char_counts, sketch, total)
+        if pmi < min_pmi_value:
+            continue
+        left = neighbor_entropy(stats.left, stats.left_edges)
+        right = neighbor_entropy(stats.right, stats.right_edges)
+        if min(left, right) < min_entropy:
+            continue
+        words.append(NewWord(gram, stats.count, pmi, left, right))
+
+    # 较长的词已经入选时，次数几乎相同的子片段只是它的一部分，不单独作为新词
+    selected = {word.text: word for word in words}
+    for word in words:
+        for n in range(2, len(word.text)):
+            for i in range(len(word.text) - n + 1):
+                part = selected.get(word.text[i:i + n])
+                if part is not None and part.count <= word.count * 1.1:
+                    del selected[part.text]
+    return sorted(selected.values(), key=lambda word: (-word.count, word.text))
+
+
+def write_lines_atomically(file_path: str, lines: List[str]) -> None:
+    """先写临时文件再原子替换，保留原文件的权限"""
+    with atomic_write(file_path) as f:
+        f.writelines(f"{line}\n" for line in lines)
+
+
+def update_base_weights(base_file: str, words: List[NewWord]) -> int:
+    """把基础文件中还没有的新词及其次数追加到基础文件，返回追加的词组数"""
+    lines = []
+    existing = set()
+    if os.path.exists(base_file):
+        with open(base_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines.append(line.rstrip('\n'))
+                existing.add(line.split('\t', 1)[0].strip())
+    added = [f"{word.text}\t{word.count}" for word in words if word.text not in existing]
+    if added:
+        write_lines_atomically(base_file, lines + added)
+    return len(added)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="语料新词发现")
+    parser.add_argument('corpus', nargs='+', help="UTF-8 纯文本语料文件，可指定多个")
+    parser.add_argument('--dict', nargs='+', default=[DEFAULT_DICT_FILE],
+                        help="已有词库，连同 import_tables 一起载入，其中的词组不作为新词，默认为 ../wubi.dict.yaml")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE,
+                        help="新词列表（每行一个词组，供文件批量处理模式使用），默认为 new_words.txt")
+    parser.add_argument('--weights', default=DEFAULT_WEIGHT_FILE,
+                        help="新词权重文件（词组\\t次数），默认为 new_words_weight.txt")
+    parser.add_argument('--update-base', action='store_true',
+                        help="把新词的权重追加到基础文件 phrase_weight.txt 中（已有的词组不变）")
+    parser.add_argument('--base', default=DEFAULT_BASE_FILE, help="基础文件，默认为 phrase_weight.txt")
+    parser.add_argument('--max-len', type=int, default=4, help="新词的最大字数，默认为4")
+    parser.add_argument('--min-count', type=int, default=10, help="最少出现次数，默认为10")
+    parser.add_argument('--min-pmi', type=float, default=3.0, help="最小点互信息（内部凝固度），默认为3.0")
+    parser.add_argument('--min-entropy', type=float, default=1.0, help="左右邻字信息熵的最小值，默认为1.0")
+    parser.add_argument('--max-candidates', type=int, default=DEFAULT_MAX_CANDIDATES,
+                        help="第二遍扫描时最多保留的候选片段数，默认为200000")
+    parser.add_argument('--sketch-width', type=int, default=DEFAULT_SKETCH_WIDTH,
+                        help="Count-Min Sketch 每行的计数器个数（2的幂），越大估计越准、内存越多")
+    parser.add_argument('--jobs', type=int, default=None, help="并行扫描的进程数，默认为CPU核数")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="每个语料块的字节数，默认为 8 MiB")
+    parser.add_argument('--top', type=int, default=20, help="屏幕上列出的新词数")
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="统计各阶段的耗时、行数和内存峰值，以 JSON 记录追加到该文件，不指定文件时输出到标准错误")
+    args = parser.parse_args(argv)
+    if args.max_len < 2:
+        parser.error("--max-len 至少为2")
+    return args
+
+
+def run(args: argparse.Namespace) -> None:
+    for file_path in args.dict + args.corpus:
+        if not os.path.exists(file_path):
+            print(f"错误: 文件不存在: {file_path}")
+            sys.exit(1)
+
+    with PROFILER.stage("load_phrases") as record:
+        known = set(load_phrases(args.dict))
+        record['rows'] = len(known)
+    print(f"词库中已有 {len(known)} 个词组")
+
+    with PROFILER.stage("count_sketch") as record:
+        char_counts, total, sketch = count_sketch(args.corpus, args.max_len, args.sketch_width,
+                                                  jobs=args.jobs, chunk_size=args.chunk_size)
+        record['rows'] = total
+    print(f"语料共 {total} 个汉字，{len(char_counts)} 个不同的字")
+
+    with PROFILER.stage("collect_candidates") as record:
+        candidates = collect_candidates(args.corpus, args.max_len, sketch, known,
+                                        args.min_count, args.max_candidates, args.jobs, args.chunk_size)
+        record['rows'] = len(candidates)
+    print(f"候选片段: {len(candidates)} 个")
+
+    with PROFILER.stage("scoring", rows=len(candidates)):
+        words = score_candidates(candidates, char_counts, sketch, total,
+                                 args.min_count, args.min_pmi, args.min_entropy)
+
+    with PROFILER.stage("write_output", rows=len(words)):
+        write_lines_atomically(args.output, [word.text for word in words])
+        write_lines_atomically(args.weights, [f"{word.text}\t{word.count}" for word in words])
+        if args.update_base:
+            added = update_base_weights(args.base, words)
+            print(f"已向 {args.base} 追加 {added} 个词组的权重")
+
+    print(f"\n发现新词 {len(words)} 个（前 {args.top} 个）:")
+    print("词组\t次数\t凝固度\t左熵\t右熵")
+    for word in words[:args.top]:
+        print(f"{word.text}\t{word.count}\t{word.pmi:.2f}\t{word.left_entropy:.2f}\t{word.right_entropy:.2f}")
+    print(f"\n新词列表已保存到: {args.output}")
+    print(f"新词权重已保存到: {args.weights}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.profile is None:
+        run(args)
+        return
+
+    PROFILER.start()
+    try:
+        run(args)
+    finally:
+        PROFILER.write(args.profile, script=os.path.basename(__file__),
+                       argv=sys.argv[1:] if argv is None else argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,21 @@ import sys
 import subprocess
 import re
 import datetime
+import argparse
+import functools
+import concurrent.futures
+
+from atomic_file import atomic_write
+from cjk_chars import extract_han
+from compact_store import WeightStore
+from profiling import PROFILER
+from rime_dict import load_dict
+from table_cache import load_cached_table
+
+# 批量编码时，待编码词组达到该数量才启用多进程
+BULK_ENCODE_THRESHOLD = 50000
+# 多进程编码时每块的词组数
+BULK_ENCODE_CHUNK_SIZE = 20000
 
 def read_single_char_codes(filename):
     """
@@ -31,13 +46,14 @@ def read_single_char_codes(filename):
 
 def read_phrase_weights(filename):
     """
-    读取词语权重表，返回字典：{词语: 权重}
-    如果词组出现多次，保留最大权重值
+    读取词语权重表，返回 {词语: 权重} 的紧凑只读映射（WeightStore）
+    如果词组出现多次，保留最大权重值；比较用的整数权重单独保存，不再重复解析字符串
     """
     phrase_weights = {}
+    max_weights = {}  # 词组 -> 当前保留权重的整数值，不是有效数字时为 None
     if not os.path.exists(filename):
         print(f"错误: 文件 {filename} 不存在！")
-        return phrase_weights
+        return WeightStore()
 
     try:
         with open(filename, 'r', encoding='utf-8') as f:
@@ -53,26 +69,99 @@ def read_phrase_weights(filename):
                     # 尝试转换为整数进行比较
                     try:
                         weight_int = int(weight_str)
+                        valid = True
                     except ValueError:
                         weight_int = 0
+                        valid = False
                         print(f"警告: 权重值 '{weight_str}' 不是有效数字，将按0处理")
 
-                    # 如果词组已存在，比较并保留最大值
-                    if phrase in phrase_weights:
-                        try:
-                            existing_weight = int(phrase_weights[phrase])
-                            if weight_int > existing_weight:
-                                phrase_weights[phrase] = weight_str
-                        except ValueError:
-                            # 如果现有权重无法转换，使用新的
-                            phrase_weights[phrase] = weight_str
-                    else:
+                    # 如果词组已存在，比较并保留最大值；现有权重不是有效数字时使用新的
+                    existing_weight = max_weights.get(phrase)
+                    if phrase not in max_weights or existing_weight is None or weight_int > existing_weight:
                         phrase_weights[phrase] = weight_str
+                        max_weights[phrase] = weight_int if valid else None
 
-        return phrase_weights
+        return WeightStore(phrase_weights)
     except Exception as e:
         print(f"读取文件 {filename} 时出错: {e}")
-        return phrase_weights
+        return WeightStore(phrase_weights)
+
+def compile_formula(formula):
+    """
+    把 Rime 编码公式编译成 (字序号, 码序号) 序列
+    大写字母表示第几个字：A-U 从前往后数，V-Z 从后往前数（Z 为最后一个字）
+    小写字母表示该字编码的第几码：a-u 从前往后数，v-z 从后往前数（z 为最后一码）
+    """
+    if len(formula) % 2 != 0:
+        raise ValueError(f"编码公式长度必须为偶数: {formula}")
+
+    def index_of(letter, first, last_forward):
+        if first <= letter <= last_forward:
+            return ord(letter) - ord(first)
+        return ord(letter) - ord(first) - 26
+
+    plan = []
+    for i in range(0, len(formula), 2):
+        char_letter, code_letter = formula[i], formula[i + 1]
+        if not ('A' <= char_letter <= 'Z' and 'a' <= code_letter <= 'z'):
+            raise ValueError(f"无效的编码公式: {formula}")
+        plan.append((index_of(char_letter, 'A', 'U'), index_of(code_letter, 'a', 'u')))
+    return tuple(plan)
+
+def compile_encoder_rules(rules):
+    """
+    编译 encoder.rules，返回 [(最短词长, 最长词长, 编码步骤), ...]
+    rules 的格式与 *.dict.yaml 中 encoder/rules 一致
+    """
+    compiled = []
+    for rule in rules:
+        if 'length_equal' in rule:
+            min_length = max_length = int(rule['length_equal'])
+        elif 'length_in_range' in rule:
+            min_length, max_length = (int(n) for n in rule['length_in_range'])
+        else:
+            raise ValueError(f"编码规则缺少 length_equal 或 length_in_range: {rule}")
+        compiled.append((min_length, max_length, compile_formula(rule['formula'])))
+    return compiled
+
+def apply_formula(plan, codes, pad=""):
+    """
+    按编码步骤从各字的编码中取码，codes 为词组中每个字的编码
+    字或码超出范围时，pad 为空则跳过（与 Rime 一致），否则用 pad 补位
+    """
+    length = len(codes)
+    result = []
+    for char_index, code_index in plan:
+        if -length <= char_index < length:
+            code = codes[char_index]
+            if -len(code) <= code_index < len(code):
+                result.append(code[code_index])
+                continue
+        if pad:
+            result.append(pad)
+    return "".join(result)
+
+def encode_with_rules(phrase, char_codes, compiled_rules, pad=""):
+    """按编译好的规则为词组编码，没有适用规则时返回空字符串"""
+    length = len(phrase)
+    for min_length, max_length, plan in compiled_rules:
+        if min_length <= length <= max_length:
+            codes = [char_codes.get(char, "") for char in phrase]
+            return apply_formula(plan, codes, pad)
+    return ""
+
+# 规则一至四对应的编码公式，缺码处用 x 补位，单字词另行处理
+LEGACY_RULE_FORMULAS = {
+    1: [{'length_equal': 2, 'formula': "AaAbBaBb"},
+        {'length_equal': 3, 'formula': "AaBaCaCb"},
+        {'length_in_range': [4, 100000], 'formula': "AaBaCaZa"}],
+    2: [{'length_equal': 2, 'formula': "AaAbBaBb"},
+        {'length_equal': 3, 'formula': "AaBaCaCb"},
+        {'length_in_range': [4, 100000], 'formula': "AaBaCaDa"}],
+    3: [{'length_in_range': [2, 100000], 'formula': "AaAbBaBb"}],
+    4: [{'length_in_range': [1, 100000], 'formula': "AaAbBaBb"}],
+}
+COMPILED_LEGACY_RULES = {rule: compile_encoder_rules(formulas) for rule, formulas in LEGACY_RULE_FORMULAS.items()}
 
 def get_first_code(char, char_codes):
     """获取汉字的第一码"""
@@ -97,33 +186,10 @@ def rule_standard_wubi(phrase, char_codes):
     - 四个汉字：各取第一码（共4码）
     - 五个及以上汉字：取前三个第一码和最后一个第一码（共4码）
     """
-    length = len(phrase)
-
-    if length == 1:
+    if len(phrase) == 1:
         # 单字词
         return char_codes.get(phrase, "xxxx")
-    elif length == 2:
-        # 两字词：各取前两码
-        code1 = get_first_two_codes(phrase[0], char_codes)
-        code2 = get_first_two_codes(phrase[1], char_codes)
-        return (code1 + code2)[:4]
-    elif length == 3:
-        # 三字词：取前两个第一码和第三个前两码
-        code1 = get_first_code(phrase[0], char_codes)
-        code2 = get_first_code(phrase[1], char_codes)
-        code3 = get_first_two_codes(phrase[2], char_codes)
-        return (code1 + code2 + code3)[:4]
-    elif length == 4:
-        # 四字词：各取第一码
-        codes = [get_first_code(char, char_codes) for char in phrase]
-        return "".join(codes)[:4]
-    else:
-        # 五字及以上：取前三个第一码和最后一个第一码
-        code1 = get_first_code(phrase[0], char_codes)
-        code2 = get_first_code(phrase[1], char_codes)
-        code3 = get_first_code(phrase[2], char_codes)
-        code_last = get_first_code(phrase[-1], char_codes)
-        return (code1 + code2 + code3 + code_last)[:4]
+    return encode_with_rules(phrase, char_codes, COMPILED_LEGACY_RULES[1], "x")
 
 def rule_one_code_per_char(phrase, char_codes):
     """
@@ -132,26 +198,10 @@ def rule_one_code_per_char(phrase, char_codes):
     - 三个汉字：取前两个第一码和第三个前两码（共4码）
     - 四个及以上汉字：每个汉字取第一码
     """
-    length = len(phrase)
-
-    if length == 1:
+    if len(phrase) == 1:
         # 单字词
         return char_codes.get(phrase, "xxxx")
-    elif length == 2:
-        # 两字词：各取前两码
-        code1 = get_first_two_codes(phrase[0], char_codes)
-        code2 = get_first_two_codes(phrase[1], char_codes)
-        return (code1 + code2)[:4]
-    elif length == 3:
-        # 三字词：取前两个第一码和第三个前两码
-        code1 = get_first_code(phrase[0], char_codes)
-        code2 = get_first_code(phrase[1], char_codes)
-        code3 = get_first_two_codes(phrase[2], char_codes)
-        return (code1 + code2 + code3)[:4]
-    else:
-        # 四字及以上：每个汉字取第一码
-        codes = [get_first_code(char, char_codes) for char in phrase]
-        return "".join(codes)[:4]
+    return encode_with_rules(phrase, char_codes, COMPILED_LEGACY_RULES[2], "x")
 
 def rule_first_two_chars_two_codes_rest_one(phrase, char_codes):
     """
@@ -160,65 +210,47 @@ def rule_first_two_chars_two_codes_rest_one(phrase, char_codes):
     - 三个汉字：前两个各取前两码，第三个取第一码（共5码，但最多取4码）
     - 四个汉字：前两个各取前两码，后面两个各取第一码（共6码，但最多取4码）
     - 五个及以上汉字：前两个各取前两码，后面每个取第一码（但最多取4码）
+    截取4码后只剩前两字的前两码，即公式 AaAbBaBb
     """
-    length = len(phrase)
-
-    if length == 1:
+    if len(phrase) == 1:
         # 单字词
         return char_codes.get(phrase, "xxxx")
-    elif length == 2:
-        # 两字词：各取前两码
-        code1 = get_first_two_codes(phrase[0], char_codes)
-        code2 = get_first_two_codes(phrase[1], char_codes)
-        return (code1 + code2)[:4]
-    else:
-        # 三字及以上：前两个各取前两码，后面的每个取第一码
-        code_parts = []
-
-        # 前两个字各取前两码
-        if length >= 1:
-            code_parts.append(get_first_two_codes(phrase[0], char_codes))
-        if length >= 2:
-            code_parts.append(get_first_two_codes(phrase[1], char_codes))
-
-        # 后面的字各取第一码
-        for i in range(2, length):
-            code_parts.append(get_first_code(phrase[i], char_codes))
-
-        # 合并并截取前4码
-        full_code = "".join(code_parts)
-        return full_code[:4]
+    return encode_with_rules(phrase, char_codes, COMPILED_LEGACY_RULES[3], "x")
 
 def rule_all_two_codes(phrase, char_codes):
     """
     规则四：每个字都取前两码编码规则
     - 每个汉字都取前两码，然后拼接，直到达到4码
+    - 单字词不足4码时用x补齐
     """
-    codes = []
-    total_length = 0
+    return encode_with_rules(phrase, char_codes, COMPILED_LEGACY_RULES[4], "x")
 
-    for char in phrase:
-        if total_length >= 4:
-            break
+# 规则六使用的词库文件，编码规则取自其 encoder/rules
+ENCODER_DICT_FILE = os.path.join("..", "wubi.dict.yaml")
 
-        two_codes = get_first_two_codes(char, char_codes)
+# 编译好的词库编码规则，首次使用规则六时加载
+_dict_encoder_rules = None
 
-        # 计算还能添加多少码
-        remaining = 4 - total_length
-        if len(two_codes) <= remaining:
-            codes.append(two_codes)
-            total_length += len(two_codes)
-        else:
-            # 只能添加部分码
-            codes.append(two_codes[:remaining])
-            total_length += remaining
+def load_dict_encoder_rules(dict_file=ENCODER_DICT_FILE):
+    """读取并编译词库文件头中的 encoder/rules"""
+    rules = load_dict(dict_file).encoder.get('rules', [])
+    if not rules:
+        raise ValueError(f"{dict_file} 中没有 encoder/rules")
+    return compile_encoder_rules(rules)
 
-    # 确保正好4码，如果不足用x补齐
-    result = "".join(codes)
-    if len(result) < 4:
-        result = result + "x" * (4 - len(result))
+def rule_dict_encoder(phrase, char_codes):
+    """
+    规则六：按 wubi.dict.yaml 的 encoder/rules 编码
+    与 Rime 部署时自动造词的结果一致，缺码时直接跳过而不补 x
+    """
+    global _dict_encoder_rules
+    if _dict_encoder_rules is None:
+        _dict_encoder_rules = load_dict_encoder_rules()
 
-    return result[:4]
+    if len(phrase) == 1:
+        # 单字词
+        return char_codes.get(phrase, "")
+    return encode_with_rules(phrase, char_codes, _dict_encoder_rules)
 
 def rule_free_coding(phrase, char_codes):
     """
@@ -236,7 +268,7 @@ def generate_wubi_code(phrase, char_codes, rule=1):
     Args:
         phrase: 待编码的词语
         char_codes: 单字编码字典
-        rule: 编码规则，1-5分别对应五种规则
+        rule: 编码规则，1-6分别对应六种规则
     """
     if rule == 1:
         return rule_standard_wubi(phrase, char_codes)
@@ -248,6 +280,8 @@ def generate_wubi_code(phrase, char_codes, rule=1):
         return rule_all_two_codes(phrase, char_codes)
     elif rule == 5:
         return rule_free_coding(phrase, char_codes)
+    elif rule == 6:
+        return rule_dict_encoder(phrase, char_codes)
     else:
         # 默认使用规则一
         return rule_standard_wubi(phrase, char_codes)
@@ -288,6 +322,25 @@ def clean_output_file(filename):
         except Exception as e:
             print(f"清理输出文件 {filename} 时出错: {e}")
 
+def commit_lines_atomically(filename, new_lines):
+    """
+    把原文件中的非空行和新行一起写入临时文件，再原子替换原文件
+    一次完成追加和去空行，失败时原文件保持不变，返回是否成功
+    """
+    try:
+        with atomic_write(filename) as out:
+            if os.path.exists(filename):
+                with open(filename, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            out.write(line.rstrip('\n') + '\n')
+            for line in new_lines:
+                out.write(line + '\n')
+        return True
+    except Exception as e:
+        print(f"写入文件 {filename} 时出错: {e}")
+        return False
+
 def open_file_with_default_app(filename):
     """
     使用默认程序打开文件
@@ -336,17 +389,21 @@ def select_encoding_rule():
     print("   用户为每个词组输入自定义编码")
     print("   编码可以是任意长度的字母")
     print("   支持词组包含汉字、字母、数字、标点等任意字符")
+    print()
+    print("6. 词库编码规则：")
+    print("   按 wubi.dict.yaml 中 encoder/rules 的公式编码")
+    print("   与 Rime 部署时自动生成的编码一致")
     print("=" * 50)
 
     while True:
         try:
-            choice = input("请输入选择的规则编号 (1-5): ").strip()
-            if choice in ['1', '2', '3', '4', '5']:
+            choice = input("请输入选择的规则编号 (1-6): ").strip()
+            if choice in ['1', '2', '3', '4', '5', '6']:
                 rule = int(choice)
                 print(f"已选择规则 {rule}")
                 return rule
             else:
-                print("输入错误，请输入1-5之间的数字")
+                print("输入错误，请输入1-6之间的数字")
         except KeyboardInterrupt:
             print("\n用户取消操作")
             sys.exit(0)
@@ -357,10 +414,8 @@ def extract_chinese_chars(text):
     """
     从文本中提取中文字符（忽略标点符号和其他字符）
     """
-    # 使用正则表达式匹配中文字符（包括中文标点）
-    # 这里匹配所有Unicode中文字符
-    chinese_chars = re.findall(r'[\u4e00-\u9fff]', text)
-    return ''.join(chinese_chars)
+    # 查表匹配所有 CJK 区块的汉字（含扩展A至I和兼容表意文字）
+    return extract_han(text)
 
 def check_all_chars_exist(phrase, char_codes):
     """
@@ -567,9 +622,216 @@ def interactive_input_mode(rule, char_codes, phrase_weights):
 
     return added_count, fail_count, output_filename
 
-def file_batch_mode(rule, char_codes, phrase_weights, input_file):
+def encode_phrase(phrase, rule, char_codes):
+    """
+    为单个词组生成编码，返回 (编码, 失败原因)
+    编码失败时编码为 None
+    """
+    # 检查词组中的所有汉字是否都存在于编码表中
+    if not check_all_chars_exist(phrase, char_codes):
+        return None, '包含未编码的汉字'
+
+    # 提取中文字符用于编码
+    chinese_chars = extract_chinese_chars(phrase)
+    if not chinese_chars:
+        return None, '不包含中文字符'
+
+    # 生成编码（只使用中文字符）
+    return generate_wubi_code(chinese_chars, char_codes, rule), None
+
+# 并行处理时工作进程共用的只读单字编码表，由进程池初始化函数设置
+_worker_char_codes = {}
+
+def _init_encode_worker(char_codes):
+    """
+    工作进程初始化：每个进程只接收一次单字编码表，之后的各块任务不再重复传送
+    Windows 上以 spawn 方式启动进程，编码表会序列化后传给每个工作进程；
+    只有 Linux 等使用 fork 的平台才直接继承父进程内存
+    """
+    global _worker_char_codes
+    _worker_char_codes = char_codes
+
+def _run_with_worker_codes(func, *args):
+    """在工作进程中调用 func，末尾补上进程共用的单字编码表"""
+    return func(*args, _worker_char_codes)
+
+def map_chunks_parallel(func, items, char_codes, *args, jobs=None, chunk_size=BULK_ENCODE_CHUNK_SIZE):
+    """
+    把 items 分块，以 func(*args, 块, char_codes) 在进程池中处理，按输入顺序拼接结果
+    只有一块或只用一个进程时直接在当前进程处理
+    """
+    jobs = jobs or os.cpu_count() or 1
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    if jobs <= 1 or len(chunks) <= 1:
+        return [result for chunk in chunks for result in func(*args, chunk, char_codes)]
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(jobs, len(chunks)),
+        initializer=_init_encode_worker,
+        initargs=(char_codes,)
+    ) as executor:
+        # map 按提交顺序返回结果
+        for chunk_results in executor.map(functools.partial(_run_with_worker_codes, func, *args), chunks):
+            results.extend(chunk_results)
+    return results
+
+def encode_chunk(rule, phrases, char_codes):
+    """编码一块词组"""
+    return [encode_phrase(phrase, rule, char_codes) for phrase in phrases]
+
+def encode_phrases_parallel(phrases, rule, char_codes, jobs=None, chunk_size=BULK_ENCODE_CHUNK_SIZE):
+    """
+    把词组分块后在进程池中编码，按输入顺序返回 [(编码, 失败原因), ...]
+    """
+    return map_chunks_parallel(encode_chunk, phrases, char_codes, rule, jobs=jobs, chunk_size=chunk_size)
+
+# 校验时尝试匹配的编码规则，规则六（与 Rime 一致）为准
+VERIFY_RULES = (6, 1, 2, 3, 4)
+
+# 校验全部 import_tables 时默认跳过的码表：wubi.long 存放多码、自定义码，编码本就不按规则推导
+VERIFY_SKIP_TABLES = ("wubi.long.dict.yaml",)
+
+# 自由编码的码表：规则五和交互模式写入的词条编码由用户决定，与规则六不一致的记为自定义码，
+# 其中的自定义码和缺字词条只列出而不影响退出状态
+VERIFY_CUSTOM_TABLES = ("wubi.user.dict.yaml",)
+
+# 按词长缓存的规则分组，见 group_verify_rules
+_verify_rule_groups = {}
+
+def group_verify_rules(length):
+    """
+    把 VERIFY_RULES 中对 length 字词组使用相同编码步骤和补位的规则归为一组
+    返回 [(编码步骤, 补位, 规则列表), ...]，同组规则推导出的编码必然相同，只需计算一次
+    没有适用编码步骤的规则（编码为空）的编码步骤为 None；只用于两字及以上的词组
+    """
+    global _dict_encoder_rules
+    if length not in _verify_rule_groups:
+        if _dict_encoder_rules is None:
+            _dict_encoder_rules = load_dict_encoder_rules()
+        groups = {}
+        for rule in VERIFY_RULES:
+            compiled_rules, pad = (_dict_encoder_rules, "") if rule == 6 else (COMPILED_LEGACY_RULES[rule], "x")
+            plan = next((plan for min_length, max_length, plan in compiled_rules
+                         if min_length <= length <= max_length), None)
+            groups.setdefault((plan, pad), []).append(rule)
+        _verify_rule_groups[length] = [(plan, pad, rules) for (plan, pad), rules in groups.items()]
+    return _verify_rule_groups[length]
+
+def derive_verify_codes(chinese_chars, char_codes):
+    """按 VERIFY_RULES 中的每条规则推导编码，返回 {规则: 编码}；chinese_chars 中的字都须在编码表中"""
+    if len(chinese_chars) == 1:
+        return {rule: generate_wubi_code(chinese_chars, char_codes, rule) for rule in VERIFY_RULES}
+
+    codes = [char_codes[char] for char in chinese_chars]
+    derived = {}
+    for plan, pad, rules in group_verify_rules(len(chinese_chars)):
+        code = apply_formula(plan, codes, pad) if plan is not None else ""
+        for rule in rules:
+            derived[rule] = code
+    return derived
+
+def verify_entry(text, code, char_codes, custom=False):
+    """
+    用单字编码表重新推导词条的编码并与现有编码比较
+    返回 (状态, 推导出的编码, 匹配的规则列表, 缺失的字)
+    状态：ok 一致，short 为推导编码的简码（前缀），mismatch 不一致，missing 含编码表中没有的字，
+    na 不含汉字、无从推导（英文、符号等自定义词条），
+    custom 自由编码码表（custom 为真）中与规则六不一致的自定义码
+    与批量编码相同，只用词组中的汉字推导编码，空格、字母和标点不参与
+    编码列为空的词条由 Rime 自动编码，视为一致
+    """
+    chinese_chars = extract_chinese_chars(text.strip())
+    if not chinese_chars:
+        return 'na', "", [], ""
+
+    missing_chars = "".join(dict.fromkeys(char for char in chinese_chars if char not in char_codes))
+    if missing_chars:
+        return 'missing', "", [], missing_chars
+
+    derived = derive_verify_codes(chinese_chars, char_codes)
+    expected = derived[6]
+    if not code:
+        return 'ok', expected, [6], ""
+
+    matched_rules = [rule for rule in VERIFY_RULES if derived[rule] == code]
+    if code == expected:
+        status = 'ok'
+    elif expected.startswith(code):
+        status = 'short'
+    elif custom:
+        status = 'custom'
+    else:
+        status = 'mismatch'
+    return status, expected, matched_rules, ""
+
+def verify_chunk(entries, char_codes):
+    """校验一块词条，entries 中每项为 (码表, 行号, 词组, 编码)"""
+    return [verify_entry(text, code, char_codes, table in VERIFY_CUSTOM_TABLES) for table, _, text, code in entries]
+
+def verify_dictionaries(dict_files, char_codes, jobs=None, report_file=None, show_limit=20):
+    """
+    重新推导各码表中每个词条的编码并报告不一致、缺字的词条及各词条匹配的规则
+    返回是否全部一致（简码和不含汉字的词条视为一致，VERIFY_CUSTOM_TABLES 中的码表不参与判断）
+    """
+    entries = []
+    with PROFILER.stage("file_read") as record:
+        for dict_file in dict_files:
+            for entry in load_dict(dict_file).iter_body():
+                entries.append((os.path.basename(dict_file), entry.line_num, entry.text, entry.code))
+        record['rows'] = len(entries)
+
+    with PROFILER.stage("encoding", rows=len(entries)):
+        results = map_chunks_parallel(verify_chunk, entries, char_codes, jobs=jobs)
+
+    # 按码表汇总
+    summary = {}
+    for (table, line_num, text, code), (status, expected, matched_rules, missing_chars) in zip(entries, results):
+        table_summary = summary.setdefault(table, {
+            'total': 0, 'ok': 0, 'short': 0, 'mismatch': 0, 'missing': 0, 'na': 0, 'custom': 0,
+            'rules': {}, 'problems': []
+        })
+        table_summary['total'] += 1
+        table_summary[status] += 1
+        for rule in matched_rules:
+            table_summary['rules'][rule] = table_summary['rules'].get(rule, 0) + 1
+        if status in ('mismatch', 'missing'):
+            table_summary['problems'].append((line_num, text, code, expected, status, matched_rules, missing_chars))
+
+    print("=" * 50)
+    print(f"共校验 {len(entries)} 个词条")
+    for table, table_summary in summary.items():
+        rules = "，".join(f"规则{rule} {count}" for rule, count in sorted(table_summary['rules'].items()))
+        print(f"\n{table}: 共 {table_summary['total']} 条，一致 {table_summary['ok']}，简码 {table_summary['short']}，"
+              f"不一致 {table_summary['mismatch']}，缺字 {table_summary['missing']}，无汉字 {table_summary['na']}"
+              + (f"，自定义码 {table_summary['custom']}（自由编码码表，不影响校验结果）"
+                 if table in VERIFY_CUSTOM_TABLES else ""))
+        print(f"  匹配规则: {rules or '无'}")
+        for line_num, text, code, expected, status, matched_rules, missing_chars in table_summary['problems'][:show_limit]:
+            if status == 'missing':
+                print(f"  行 {line_num+1}: {text}\t{code}  缺字: {missing_chars}")
+            else:
+                matched = "、".join(f"规则{rule}" for rule in matched_rules) or "无"
+                print(f"  行 {line_num+1}: {text}\t{code}  应为 {expected}  匹配: {matched}")
+        if len(table_summary['problems']) > show_limit:
+            print(f"  ……另有 {len(table_summary['problems']) - show_limit} 条，完整列表请使用 --report")
+
+    if report_file:
+        with PROFILER.stage("log_writing", rows=len(entries)), open(report_file, 'w', encoding='utf-8') as f:
+            f.write("# 码表\t行号\t词组\t编码\t推导编码\t状态\t匹配规则\t缺字\n")
+            for (table, line_num, text, code), (status, expected, matched_rules, missing_chars) in zip(entries, results):
+                rules = ",".join(str(rule) for rule in matched_rules)
+                f.write(f"{table}\t{line_num+1}\t{text}\t{code}\t{expected}\t{status}\t{rules}\t{missing_chars}\n")
+        print(f"\n完整校验结果已保存到: {report_file}")
+
+    print("=" * 50)
+    return all(not table_summary['problems'] for table, table_summary in summary.items()
+               if table not in VERIFY_CUSTOM_TABLES)
+
+def file_batch_mode(rule, char_codes, phrase_weights, input_file, jobs=None):
     """
     文件批量处理模式：对文件中的每一行进行编码
+    词组较多时在多个进程中并行编码
     """
     output_filename = "wubi.user.dict.yaml"
     fail_filename = "fail.txt"
@@ -607,94 +869,110 @@ def file_batch_mode(rule, char_codes, phrase_weights, input_file):
     skipped_count = 0
     success_records = []  # 存储成功记录
     fail_records = []     # 存储失败记录
+    new_output_lines = []  # 本批待写入输出文件的行
+    new_fail_lines = []    # 本批待写入失败文件的行
 
     print(f"\n开始处理文件: {input_file}")
     print("-" * 50)
 
     try:
-        with open(input_file, 'r', encoding='utf-8') as infile:
-            lines = infile.readlines()
+        with PROFILER.stage("file_read", file=input_file) as record:
+            with open(input_file, 'r', encoding='utf-8') as infile:
+                lines = infile.readlines()
+            record['rows'] = len(lines)
+
+        # 先按输入顺序筛出待编码的词组：已在词库或失败文件中的跳过，
+        # 文件内重复出现的词组只编码第一次，其余在合并时按第一次的结果跳过
+        with PROFILER.stage("classify", file=input_file, rows=len(lines)):
+            pending = []  # (行号, 词组, 类别)，类别为 "exists"/"failed"/"duplicate"/"new"
+            batch_phrases = set()
+            for line_num, line in enumerate(lines, 1):
+                line = line.strip()
+                total_lines += 1
 
-        # 逐行处理
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            total_lines += 1
+                # 跳过空行
+                if not line:
+                    continue
 
-            # 跳过空行
-            if not line:
-                continue
+                if line in existing_phrases:
+                    pending.append((line_num, line, "exists"))
+                elif line in existing_fail_phrases:
+                    pending.append((line_num, line, "failed"))
+                elif line in batch_phrases:
+                    pending.append((line_num, line, "duplicate"))
+                else:
+                    pending.append((line_num, line, "new"))
+                    batch_phrases.add(line)
+
+        # 编码去重后的词组，数量较多时分块并行处理，结果与输入顺序一致
+        phrases = [line for _, line, kind in pending if kind == "new"]
+        with PROFILER.stage("encoding", file=input_file, rows=len(phrases)):
+            if len(phrases) >= BULK_ENCODE_THRESHOLD:
+                results = iter(encode_phrases_parallel(phrases, rule, char_codes, jobs))
+            else:
+                results = iter([encode_phrase(phrase, rule, char_codes) for phrase in phrases])
+
+        # 按输入顺序合并结果并输出提示，结果先暂存在内存中
+        with PROFILER.stage("merge", file=input_file, rows=len(pending)):
+            for line_num, line, kind in pending:
+                # 重复词组按第一次出现时的结果判断：第一次编码成功时已加入词库，
+                # 失败时（不含汉字的词组同样在 check_all_chars_exist 处失败）已加入失败列表
+                if kind == "duplicate":
+                    if line in existing_phrases:
+                        kind = "exists"
+                    elif line in existing_fail_phrases:
+                        kind = "failed"
+
+                # 检查是否已存在于词库中
+                if kind == "exists":
+                    skipped_count += 1
+                    print(f"  行 {line_num}: 词组 '{line}' 已存在于词库中，跳过")
+                    continue
 
-            # 检查是否已存在于词库中
-            if line in existing_phrases:
-                skipped_count += 1
-                print(f"  行 {line_num}: 词组 '{line}' 已存在于词库中，跳过")
-                continue
+                # 检查是否已存在于失败文件中
+                if kind == "failed":
+                    skipped_count += 1
+                    print(f"  行 {line_num}: 词组 '{line}' 已在失败文件中，跳过")
+                    continue
 
-            # 检查是否已存在于失败文件中
-            if line in existing_fail_phrases:
-                skipped_count += 1
-                print(f"  行 {line_num}: 词组 '{line}' 已在失败文件中，跳过")
-                continue
+                code, reason = next(results)
 
-            # 检查词组中的所有汉字是否都存在于编码表中
-            if not check_all_chars_exist(line, char_codes):
-                # 保存到失败文件
-                try:
-                    with open(fail_filename, 'a', encoding='utf-8') as fail_file:
-                        fail_file.write(f"{line}\n")
+                if code is None:
                     fail_count += 1
-                    existing_fail_phrases.add(line)
-                    fail_records.append({'phrase': line, 'reason': '包含未编码的汉字'})
-                    print(f"  行 {line_num}: 词组 '{line}' 中包含未编码的汉字，保存到失败文件")
-                except Exception as e:
-                    print(f"  行 {line_num}: 错误: 无法写入失败文件: {e}")
-                continue
-
-            # 提取中文字符用于编码
-            chinese_chars = extract_chinese_chars(line)
-
-            # 如果没有中文字符，跳过
-            if not chinese_chars:
-                fail_count += 1
-                fail_records.append({'phrase': line, 'reason': '不包含中文字符'})
-                print(f"  行 {line_num}: 词组 '{line}' 中不包含中文字符，跳过")
-                continue
-
-            # 生成编码（只使用中文字符）
-            code = generate_wubi_code(chinese_chars, char_codes, rule)
+                    fail_records.append({'phrase': line, 'reason': reason})
+                    if reason == '包含未编码的汉字':
+                        # 暂存到失败列表，批次结束时统一写入失败文件
+                        new_fail_lines.append(line)
+                        existing_fail_phrases.add(line)
+                        print(f"  行 {line_num}: 词组 '{line}' 中包含未编码的汉字，保存到失败文件")
+                    else:
+                        print(f"  行 {line_num}: 词组 '{line}' 中不包含中文字符，跳过")
+                    continue
 
-            # 获取权重（使用最大权重）
-            weight = phrase_weights.get(line, "100")
-
-            # 追加到输出文件
-            try:
-                with open(output_filename, 'a', encoding='utf-8') as outfile:
-                    outfile.write(f"{line}\t{code}\t{weight}\n")
+                # 获取权重（使用最大权重）
+                weight = phrase_weights.get(line, "100")
 
+                # 暂存到输出列表，批次结束时统一写入输出文件
+                new_output_lines.append(f"{line}\t{code}\t{weight}")
                 added_count += 1
                 existing_phrases.add(line)
                 success_records.append({'phrase': line, 'code': code, 'weight': weight})
                 print(f"  ✓ 行 {line_num}: 已添加: {line} -> {code} (权重: {weight})")
 
-            except Exception as e:
-                print(f"  行 {line_num}: 错误: 无法写入输出文件: {e}")
-                # 保存到失败文件
-                try:
-                    with open(fail_filename, 'a', encoding='utf-8') as fail_file:
-                        fail_file.write(f"{line}\n")
-                    fail_count += 1
-                    existing_fail_phrases.add(line)
-                    fail_records.append({'phrase': line, 'reason': '文件写入错误'})
-                except Exception as e2:
-                    print(f"  行 {line_num}: 错误: 无法写入失败文件: {e2}")
-
-        # 清理输出文件，确保没有空行
-        if added_count > 0:
-            clean_output_file(output_filename)
-
-        # 清理失败文件，确保没有空行
-        if fail_count > 0:
-            clean_output_file(fail_filename)
+        # 整批一次性写入输出文件和失败文件
+        with PROFILER.stage("write_output", file=input_file, rows=len(new_output_lines) + len(new_fail_lines)):
+            if new_output_lines and not commit_lines_atomically(output_filename, new_output_lines):
+                # 输出文件写入失败，本批成功的词组全部转入失败文件
+                print(f"错误: 无法写入输出文件 {output_filename}，本批 {added_count} 个词组转入失败文件")
+                new_fail_lines.extend(record['phrase'] for record in success_records)
+                fail_records.extend({'phrase': record['phrase'], 'reason': '文件写入错误'}
+                                    for record in success_records)
+                fail_count += added_count
+                added_count = 0
+                success_records = []
+
+            if new_fail_lines and not commit_lines_atomically(fail_filename, new_fail_lines):
+                print(f"错误: 无法写入失败文件 {fail_filename}")
 
         # 生成记录文件
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -707,7 +985,7 @@ def file_batch_mode(rule, char_codes, phrase_weights, input_file):
 
         record_file = os.path.join(record_dir, f"{base_name}_processed_{timestamp}.txt")
 
-        with open(record_file, 'w', encoding='utf-8') as f:
+        with PROFILER.stage("log_writing", file=input_file), open(record_file, 'w', encoding='utf-8') as f:
             f.write(f"# 批量处理记录 - {timestamp}\n")
             f.write(f"# 源文件: {os.path.basename(input_file)}\n")
             f.write(f"# 编码规则: {rule}\n")
@@ -835,14 +1113,72 @@ def auto_mode(rule, char_codes, phrase_weights):
             print(f"  错误: {e}")
             fail_count += 1
 
-    # 清理输出文件，确保没有空行
-    if interactive_count > 0 or file_count > 0:
+    # 清理交互式追加的输出文件，确保没有空行（文件批量处理写入时已去除空行）
+    if interactive_count > 0:
         clean_output_file("wubi.user.dict.yaml")
 
     return interactive_count, file_count, fail_count
 
-def main():
+def parse_args(argv=None):
+    """解析命令行参数；不带参数时进入交互模式"""
+    parser = argparse.ArgumentParser(
+        description="五笔词库生成工具",
+        epilog="校验规则：按规则推导编码的码表（如 wubi.phrase、wubi.word）中存在不一致或缺字的词条时以状态 1 退出；"
+               f"自由编码的码表（{'、'.join(VERIFY_CUSTOM_TABLES)}）中与规则不一致的编码记为自定义码，只列出不影响退出状态；"
+               f"不指定文件时默认跳过不按规则编码的码表（{'、'.join(VERIFY_SKIP_TABLES)}），可用 --skip 修改")
+    parser.add_argument('--verify', nargs='*', metavar='DICT_FILE',
+                        help="校验码表中每个词条的编码，不指定文件时校验 wubi.dict.yaml 的全部 import_tables；"
+                             "按规则编码的码表存在不一致或缺字的词条时以非零状态退出")
+    parser.add_argument('--skip', nargs='*', metavar='TABLE', default=None,
+                        help="不指定文件校验时跳过的码表文件名，"
+                             f"默认为 {' '.join(VERIFY_SKIP_TABLES)}；只写 --skip 表示不跳过任何码表")
+    parser.add_argument('--report', metavar='FILE',
+                        help="把每个词条的校验结果写入该文件")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="并行处理的进程数，默认为CPU核数")
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="统计各阶段的耗时、行数和内存峰值，以 JSON 记录追加到该文件，不指定文件时输出到标准错误")
+    return parser.parse_args(argv)
+
+def verify_mode(dict_files, report_file=None, jobs=None, skip_tables=VERIFY_SKIP_TABLES):
+    """
+    非交互的校验模式，返回退出状态
+    不指定码表时校验 wubi.dict.yaml 的全部 import_tables，跳过 skip_tables 中的码表；显式指定的码表总会校验
+    """
+    if not dict_files:
+        main_dict = load_dict(ENCODER_DICT_FILE)
+        dict_files = [table.path for table in main_dict.iter_tables()
+                      if table is not main_dict and os.path.basename(table.path) not in skip_tables]
+
+    with PROFILER.stage("read_char_codes") as record:
+        char_codes = load_cached_table("86word-8105-better.txt", "char_codes", read_single_char_codes)
+        record['rows'] = len(char_codes)
+    if not char_codes:
+        print("错误: 无法读取单字编码表")
+        return 2
+
+    return 0 if verify_dictionaries(dict_files, char_codes, jobs, report_file) else 1
+
+def main(argv=None):
     """主函数"""
+    args = parse_args(argv)
+    if args.profile is None:
+        run(args)
+        return
+
+    PROFILER.start()
+    try:
+        run(args)
+    finally:
+        PROFILER.write(args.profile, script=os.path.basename(__file__),
+                       argv=sys.argv[1:] if argv is None else argv)
+
+def run(args):
+    """按命令行参数执行；没有指定 --verify 时进入交互模式"""
+    if args.verify is not None:
+        skip_tables = VERIFY_SKIP_TABLES if args.skip is None else args.skip
+        sys.exit(verify_mode(args.verify, args.report, args.jobs, skip_tables))
+
     print("五笔词库生成工具 - 自动判断输入模式")
     print("-" * 50)
 
@@ -871,7 +1207,9 @@ def main():
 
     # 读取单字编码表
     print("正在读取单字编码表...")
-    char_codes = read_single_char_codes("86word-8105-better.txt")
+    with PROFILER.stage("read_char_codes") as record:
+        char_codes = load_cached_table("86word-8105-better.txt", "char_codes", read_single_char_codes)
+        record['rows'] = len(char_codes)
     if not char_codes:
         print("错误: 无法读取单字编码表，程序终止")
         input("\n按Enter键退出...")
@@ -880,7 +1218,10 @@ def main():
 
     # 读取词语权重表（保留最大权重）
     print("正在读取词语权重表（保留最大权重）...")
-    phrase_weights = read_phrase_weights("phrase_weight.txt")
+    with PROFILER.stage("read_phrase_weights") as record:
+        phrase_weights = load_cached_table("phrase_weight.txt", "max_weights", read_phrase_weights,
+                                           WeightStore.from_compiled)
+        record['rows'] = len(phrase_weights)
     if not phrase_weights:
         print("警告: 词语权重表为空或无法读取，将使用默认权重100")
     else: